@@ -0,0 +1,188 @@
+"""
+Options and reporting of the benchmark suite.
+
+Each benchmark records its wall time and the time spent in the stages of
+the calculation. At the end of the session, the records are written to the
+JSON file given by `--benchmark-json` and compared against the records of a
+previous run given by `--benchmark-baseline`. The session fails if a stage
+became slower than the baseline by more than `--benchmark-tolerance`.
+"""
+
+import datetime
+import json
+import os
+import platform
+
+import pytest
+
+# Stages of the calculation, as timed by `BoundaryElementMethod`
+STAGES = {
+    "solve": "contact step",
+    "netcdf": "save results",
+    "histograms": "distributions",
+    "patches": "patch areas",
+    "deepzoom": "deep zoom",
+}
+
+# Stages shorter than this (in seconds) are too noisy to compare
+MIN_COMPARED_TIME = 0.05
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmark")
+    group.addoption(
+        "--benchmark-sizes",
+        default="256",
+        help="Comma-separated edge lengths of the topographies "
+        "(default: 256; e.g. 256,512,1024,2048,4096)",
+    )
+    group.addoption(
+        "--benchmark-json",
+        default=None,
+        help="Write the timings to this JSON file",
+    )
+    group.addoption(
+        "--benchmark-baseline",
+        default=None,
+        help="Compare the timings against this JSON file of a previous run",
+    )
+    group.addoption(
+        "--benchmark-tolerance",
+        type=float,
+        default=0.2,
+        help="Relative slowdown with respect to the baseline that is "
+        "reported as a regression (default: 0.2)",
+    )
+
+
+def pytest_configure(config):
+    config._benchmark_records = []
+
+
+@pytest.fixture(autouse=True)
+def _enable_db_access_for_all_benchmarks(db):
+    """The stand-ins of topobank (folders, analyses) live in the database."""
+
+
+@pytest.fixture
+def benchmark_record(request):
+    """
+    Append the timings of a benchmark to the session records. Call with
+    the wall time, the `muTimer.Timer` of the calculation and optionally a
+    dictionary mapping the recorded stages to timer sections (default:
+    the stages of `BoundaryElementMethod`).
+    """
+
+    def record(wall_time, timer, stages=STAGES, **parameters):
+        summary = timer.summary_dict()
+        sections, stages = stages, {}
+        for stage, name in sections.items():
+            # Sections may be nested, e.g. 'deep zoom' within others
+            entries = [
+                entry
+                for path, entry in summary.items()
+                if path.split("/")[-1] == name
+            ]
+            stages[stage] = dict(
+                total=sum(entry["total"] for entry in entries),
+                calls=sum(entry["calls"] for entry in entries),
+            )
+        request.config._benchmark_records.append(
+            dict(
+                name=request.node.name,
+                parameters=parameters,
+                wall_time=wall_time,
+                stages=stages,
+            )
+        )
+
+    return record
+
+
+def _machine():
+    return dict(
+        node=platform.node(),
+        machine=platform.machine(),
+        processor=platform.processor(),
+        python=platform.python_version(),
+        nb_cpus=os.cpu_count(),
+    )
+
+
+def _regressions(records, baseline, tolerance):
+    baseline = {record["name"]: record for record in baseline["benchmarks"]}
+    regressions = []
+    for record in records:
+        reference = baseline.get(record["name"])
+        if reference is None:
+            continue
+        times = dict(wall_time=(record["wall_time"], reference["wall_time"]))
+        for stage, entry in record["stages"].items():
+            if stage in reference["stages"]:
+                times[stage] = (entry["total"], reference["stages"][stage]["total"])
+        for stage, (time, reference_time) in times.items():
+            if (
+                reference_time >= MIN_COMPARED_TIME
+                and time > (1 + tolerance) * reference_time
+            ):
+                regressions.append((record["name"], stage, time, reference_time))
+    return regressions
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    records = config._benchmark_records
+    if not records:
+        return
+    filename = config.getoption("--benchmark-json")
+    if filename is not None:
+        with open(filename, "w") as f:
+            json.dump(
+                dict(
+                    datetime=datetime.datetime.now().isoformat(),
+                    machine=_machine(),
+                    benchmarks=records,
+                ),
+                f,
+                indent=2,
+            )
+    baseline_filename = config.getoption("--benchmark-baseline")
+    config._benchmark_regressions = []
+    if baseline_filename is not None:
+        with open(baseline_filename) as f:
+            baseline = json.load(f)
+        config._benchmark_regressions = _regressions(
+            records, baseline, config.getoption("--benchmark-tolerance")
+        )
+        if config._benchmark_regressions:
+            session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    records = config._benchmark_records
+    if not records:
+        return
+    terminalreporter.section("benchmarks")
+    header = None
+    for record in records:
+        stages = list(record["stages"])
+        if stages != header:
+            header = stages
+            terminalreporter.write_line(
+                f"{'benchmark':<60} {'wall':>8} "
+                + " ".join(f"{stage:>14}" for stage in stages)
+            )
+        terminalreporter.write_line(
+            f"{record['name']:<60} {record['wall_time']:8.3f} "
+            + " ".join(
+                f"{record['stages'][stage]['total']:14.3f}" for stage in stages
+            )
+        )
+    for name, stage, time, reference_time in getattr(
+        config, "_benchmark_regressions", []
+    ):
+        terminalreporter.write_line(
+            f"REGRESSION {name} {stage}: {time:.3f} s "
+            f"(baseline {reference_time:.3f} s)",
+            red=True,
+        )
@@ -0,0 +1,78 @@
+"""
+Benchmarks of the boundary element method on synthetic self-affine
+topographies. Run with
+
+    pytest benchmarks --benchmark-sizes 256,512,1024 --benchmark-json timings.json
+"""
+
+import time
+
+import numpy as np
+import pytest
+from muTimer import Timer
+from SurfaceTopography.Generation import fourier_synthesis
+from topobank.testing.factories import ManifestSetFactory
+from topobank.testing.utils import (AnalysisResultMock, DummyProgressRecorder,
+                                    FakeTopographyModel)
+
+from topobank_contact.workflows import BoundaryElementMethod
+
+# Hardness (in units of the contact modulus) of plastic calculations
+HARDNESS = 0.05
+
+MODES = {
+    "nsteps": dict(nsteps=5, pressures=None),
+    "pressures": dict(nsteps=None, pressures=[1e-3, 1e-2]),
+}
+
+
+def pytest_generate_tests(metafunc):
+    if "size" in metafunc.fixturenames:
+        sizes = [
+            int(size) for size in metafunc.config.getoption("--benchmark-sizes").split(",")
+        ]
+        metafunc.parametrize("size", sizes)
+
+
+def _topography(size, periodic):
+    # Fixed seed, such that runs are comparable
+    np.random.seed(size)
+    return fourier_synthesis(
+        (size, size),
+        (1.0, 1.0),
+        0.8,
+        rms_height=0.1,
+        unit="µm",
+        periodic=periodic,
+    ).detrend("center")
+
+
+@pytest.mark.parametrize("mode", MODES.keys())
+@pytest.mark.parametrize("hardness", [None, HARDNESS])
+@pytest.mark.parametrize("substrate", ["periodic", "nonperiodic"])
+def test_boundary_element_method(size, substrate, hardness, mode, benchmark_record):
+    periodic = substrate == "periodic"
+    topography = FakeTopographyModel(
+        _topography(size, periodic), is_periodic=periodic
+    )
+    timer = Timer()
+    start = time.perf_counter()
+    result = BoundaryElementMethod(
+        substrate=substrate, hardness=hardness, **MODES[mode]
+    ).topography_implementation(
+        AnalysisResultMock(topography, folder=ManifestSetFactory()),
+        progress_recorder=DummyProgressRecorder(),
+        timer=timer,
+    )
+    wall_time = time.perf_counter() - start
+
+    assert len(result["mean_pressures"]) > 0
+    benchmark_record(
+        wall_time,
+        timer,
+        size=size,
+        substrate=substrate,
+        hardness=hardness,
+        mode=mode,
+        nb_iterations=int(np.sum(result["nb_iterations"])),
+    )
@@ -0,0 +1,59 @@
+"""
+Benchmarks of the contact patch analysis against SurfaceTopography's
+`assign_patch_numbers_area`, on contact masks of self-affine topographies at
+different fractional contact areas.
+"""
+
+import time
+
+import numpy as np
+import pytest
+from muTimer import Timer
+from SurfaceTopography.Generation import fourier_synthesis
+from SurfaceTopography.Uniform.GeometryAnalysis import (
+    assign_patch_numbers_area, patch_areas)
+
+from topobank_contact.patches import patch_statistics
+
+STAGES = {
+    "patch_statistics": "patch statistics",
+    "surfacetopography": "assign patch numbers",
+}
+
+
+def pytest_generate_tests(metafunc):
+    if "size" in metafunc.fixturenames:
+        sizes = [
+            int(size) for size in metafunc.config.getoption("--benchmark-sizes").split(",")
+        ]
+        metafunc.parametrize("size", sizes)
+
+
+@pytest.mark.parametrize("contact_area", [0.05, 0.2, 0.5])
+@pytest.mark.parametrize("periodic", [True, False])
+def test_patch_statistics(size, periodic, contact_area, benchmark_record):
+    np.random.seed(size)
+    heights = fourier_synthesis(
+        (size, size), (1.0, 1.0), 0.8, rms_height=0.1, periodic=periodic
+    ).heights()
+    mask = heights > np.quantile(heights, 1 - contact_area)
+    pressure = np.where(mask, heights, 0.0)
+
+    timer = Timer()
+    start = time.perf_counter()
+    with timer("patch statistics"):
+        statistics = patch_statistics(mask, periodic, pressure=pressure)
+    with timer("assign patch numbers"):
+        areas = patch_areas(assign_patch_numbers_area(mask, periodic)[1])
+    wall_time = time.perf_counter() - start
+
+    np.testing.assert_array_equal(np.sort(statistics["nb_pts"]), np.sort(areas))
+    benchmark_record(
+        wall_time,
+        timer,
+        stages=STAGES,
+        size=size,
+        periodic=periodic,
+        contact_area=contact_area,
+        nb_patches=len(areas),
+    )
@@ -7,3 +7,10 @@ def test_api():
         reverse("topobank_contact:card-contact-mechanics", kwargs=dict(workflow="abc"))
         == "/plugins/contact/card/contact-mechanics/abc"
     )
+    assert (
+        reverse(
+            "topobank_contact:deepzoom",
+            kwargs=dict(analysis_id=13, step=2, field="gap"),
+        )
+        == "/plugins/contact/deepzoom/13/2/gap"
+    )
@@ -0,0 +1,79 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from topobank_contact.arena import SharedArena, pickled_nbytes
+
+
+def _fill_slot(arena, slot, value, data=None):
+    fields = arena.slot(slot)
+    fields["pressure"][...] = arena.heights + value
+    fields["contacting_points"][...] = arena.heights > value
+    return value
+
+
+def test_pickled_nbytes():
+    field = np.zeros((16, 16))
+    nbytes, nb_arrays = pickled_nbytes((1.0, field))
+    assert nbytes > field.nbytes
+    assert nb_arrays == 1
+    # Small arrays are not counted
+    assert pickled_nbytes((np.zeros(4), field), min_array_nbytes=256)[1] == 1
+    assert pickled_nbytes(1.0)[1] == 0
+
+
+@pytest.mark.parametrize("precision", ["double", "single"])
+def test_shared_arena(precision):
+    heights = np.arange(12.0).reshape(4, 3)
+    arena = SharedArena(heights, 2, precision=precision)
+    np.testing.assert_array_equal(arena.heights, heights)
+    with pytest.raises(ValueError):
+        arena.heights[0, 0] = 1.0
+    dtype = np.float32 if precision == "single" else np.float64
+    assert arena.slot(0)["gap"].dtype == dtype
+    assert arena.slot(0)["contacting_points"].dtype == bool
+
+    # Fields of different slots do not overlap
+    for i in range(2):
+        for field in arena.slot(i).values():
+            field[...] = i
+    for i in range(2):
+        for field in arena.slot(i).values():
+            assert np.all(field == i)
+    np.testing.assert_array_equal(arena.heights, heights)
+
+    assert arena.acquire() == 0
+    assert arena.acquire() == 1
+    assert arena.acquire() is None
+    arena.release(1)
+    assert arena.acquire() == 1
+    arena.close()
+
+
+def test_shared_arena_worker():
+    heights = np.arange(12.0).reshape(4, 3)
+    arena = SharedArena(heights, 1)
+    # Workers forked after the arena was created write into its slots
+    executor = ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("fork")
+    )
+    try:
+        slot = arena.acquire()
+        assert arena.result(arena.submit(executor, _fill_slot, slot, 5.0)) == 5.0
+        np.testing.assert_array_equal(arena.slot(slot)["pressure"], heights + 5)
+        assert arena.slot(slot)["contacting_points"].sum() == 6
+
+        statistics = arena.statistics()
+        assert statistics["nb_tasks"] == 1
+        assert statistics["nb_bytes_shared"] == 12 * 25
+        assert statistics["nb_fields_sent"] == 0
+        assert statistics["nb_fields_received"] == 0
+
+        # Fields passed as arguments are counted as copies
+        arena.result(arena.submit(executor, _fill_slot, slot, 1.0, data=heights))
+        assert arena.statistics()["nb_fields_sent"] == 1
+    finally:
+        executor.shutdown()
+        arena.close()
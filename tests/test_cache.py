@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from muTimer import Timer
+
+from topobank_contact.cache import (RESULT_CACHE_PREFIX, ResultCache,
+                                    SubstrateCache, _substrate_nbytes)
+
+
+def test_substrate_cache_reuses_and_evicts():
+    timer = Timer()
+    cache = SubstrateCache()
+
+    # Size of the cache is bounded by the memory of two periodic substrates
+    substrate = cache.get((16, 16), (1.0, 1.0), True, timer=timer)
+    cache.max_nbytes = 2 * _substrate_nbytes(substrate)
+    cache.clear()
+
+    substrate = cache.get((16, 16), (1.0, 1.0), True, timer=timer)
+    assert cache.get((16, 16), (1.0, 1.0), True, timer=timer) is substrate
+    assert cache.get((16, 16), (2.0, 1.0), True, timer=timer) is not substrate
+    assert len(cache) == 2
+    # Touch the first substrate, such that the second one is evicted next
+    assert cache.get((16, 16), (1.0, 1.0), True, timer=timer) is substrate
+    cache.get((16, 8), (1.0, 1.0), True, timer=timer)
+    assert len(cache) == 2
+    assert cache.nbytes <= cache.max_nbytes
+    assert cache.get((16, 16), (1.0, 1.0), True, timer=timer) is substrate
+
+    # Free boundaries require a substrate that does not fit into the cache
+    cache.get((16, 16), (1.0, 1.0), False, timer=timer)
+    assert len(cache) == 2
+
+    assert cache.hits == 3
+    assert cache.misses == 5
+    assert timer.get_calls("substrate setup") == 5
+
+
+def test_substrate_cache_drops_solution():
+    cache = SubstrateCache(max_nbytes=2**30)
+    substrate = cache.get((16, 16), (1.0, 1.0), False)
+    # The force and displacement fields of the solver are accounted for
+    assert cache.nbytes >= 2 * np.prod(substrate.nb_domain_grid_pts) * 8
+    substrate.force = np.ones(substrate.nb_domain_grid_pts)
+    substrate.disp = np.ones(substrate.nb_domain_grid_pts)
+
+    # The solution of the previous calculation is not handed out again
+    assert cache.get((16, 16), (1.0, 1.0), False) is substrate
+    assert substrate.force is None
+    assert substrate.disp is None
+
+
+def test_result_cache_concurrent_save(tmp_path):
+    storage = FileSystemStorage(location=tmp_path)
+    cache = ResultCache("abc", storage=storage)
+    cache.save_index(dict(nb_iterations=[1]))
+
+    # Another calculation saved the index between the check and the save
+    exists = storage.exists
+    checked = set()
+
+    def exists_after_check(name):
+        if name in checked:
+            return exists(name)
+        checked.add(name)
+        return False
+
+    storage.exists = exists_after_check
+    cache.save_index(dict(nb_iterations=[1]))
+    assert os.listdir(tmp_path / RESULT_CACHE_PREFIX / "abc") == ["index.json"]
+    assert cache.load_index() == dict(nb_iterations=[1])
+
+
+def test_result_cache_evict(tmp_path):
+    storage = FileSystemStorage(location=tmp_path)
+    for i, key in enumerate(["c", "a", "b"]):
+        cache = ResultCache(key, storage=storage)
+        storage.save(f"{RESULT_CACHE_PREFIX}/{key}/step-0.nc", ContentFile(b"step"))
+        cache.save_index(dict(nb_iterations=[i]))
+        os.utime(tmp_path / RESULT_CACHE_PREFIX / key / "index.json", (i, i))
+    # An entry without index is not touched
+    storage.save(f"{RESULT_CACHE_PREFIX}/d/step-0.nc", ContentFile(b"step"))
+
+    assert ResultCache.evict(3, storage=storage) == 0
+    assert ResultCache.evict(1, storage=storage) == 2
+    assert sorted(os.listdir(tmp_path / RESULT_CACHE_PREFIX / "c")) == []
+    assert ResultCache("a", storage=storage).load_index() is None
+    assert ResultCache("b", storage=storage).load_index() == dict(nb_iterations=[2])
+    assert os.listdir(tmp_path / RESULT_CACHE_PREFIX / "d") == ["step-0.nc"]
+
+    assert ResultCache.evict(1, storage=FileSystemStorage(tmp_path / "empty")) == 0
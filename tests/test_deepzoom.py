@@ -0,0 +1,246 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+from topobank.testing.factories import ManifestSetFactory
+from topobank.testing.utils import (AnalysisResultMock, DummyProgressRecorder,
+                                    FakeTopographyModel)
+
+from django.core.cache import cache
+
+from topobank_contact.deepzoom import (DeepZoomInProgress, DeepZoomRenderer,
+                                       render_deepzoom_on_demand,
+                                       render_field_deepzoom,
+                                       render_step_deepzoom, request_deepzoom)
+from topobank_contact.workflows import BoundaryElementMethod
+
+
+class Folder:
+    def __init__(self):
+        self.files = {}
+
+    def save_file(self, filename, kind, file):
+        assert threading.current_thread() is threading.main_thread()
+        self.files[filename] = file.read()
+
+
+def render(folder, i, delay=0):
+    time.sleep(delay)
+    folder.save_file(f"step-{i}/dzi.json", "der", _File(f"{i}".encode()))
+
+
+class _File:
+    def __init__(self, content):
+        self.content = content
+
+    def read(self):
+        return self.content
+
+
+@pytest.mark.parametrize("nb_threads", [0, 2])
+def test_deepzoom_renderer(nb_threads):
+    folder = Folder()
+    saved = []
+    renderer = DeepZoomRenderer(
+        folder,
+        nb_threads=nb_threads,
+        max_pending=2,
+        callback=lambda: saved.append(sorted(folder.files)),
+    )
+    for i in range(5):
+        # Later steps finish first, but are saved in order
+        renderer.submit(render, i, delay=0.02 * (5 - i))
+        # Back-pressure bounds the number of steps in flight
+        assert len(renderer) <= 2
+    renderer.finish()
+
+    assert len(renderer) == 0
+    assert folder.files == {f"step-{i}/dzi.json": f"{i}".encode() for i in range(5)}
+    assert saved == [[f"step-{j}/dzi.json" for j in range(i + 1)] for i in range(5)]
+
+
+def test_deepzoom_renderer_threads_match_synchronous():
+    rng = np.random.default_rng(0)
+    steps = [
+        dict(
+            pressure=rng.random((32, 24)),
+            gap=rng.random((32, 24)),
+            displacement=rng.random((32, 24)),
+        )
+        for _ in range(4)
+    ]
+    for fields in steps:
+        fields["contacting-points"] = fields["pressure"] > 0.5
+
+    # The actual renderer only uses the methods of the (main thread) folder
+    # that the buffers of the rendering threads provide
+    files = []
+    for nb_threads in [0, 3]:
+        folder = Folder()
+        renderer = DeepZoomRenderer(folder, nb_threads=nb_threads)
+        for i, fields in enumerate(steps):
+            renderer.submit(
+                render_step_deepzoom,
+                f"step-{i}",
+                fields,
+                (1.0, 0.75),
+                "µm",
+                pressure_fac=2.0,
+                pressure_unit="GPa",
+            )
+        renderer.finish()
+        files += [folder.files]
+    synchronous, threaded = files
+    assert len(synchronous) >= 4 * 4
+    assert threaded == synchronous
+
+
+def test_deepzoom_renderer_reraises():
+    def fail(folder):
+        raise ValueError("rendering failed")
+
+    renderer = DeepZoomRenderer(Folder(), nb_threads=1)
+    # Errors surface with the next submission or when finishing
+    with pytest.raises(ValueError):
+        renderer.submit(fail)
+        renderer.finish()
+
+
+@pytest.mark.parametrize("consolidated", [False, True])
+def test_lazy_deepzoom(simple_linear_2d_topography, settings, mocker, consolidated):
+    topography = FakeTopographyModel(simple_linear_2d_topography)
+    settings.CONTACT_MECHANICS_LAZY_DEEPZOOM = True
+    settings.CONTACT_MECHANICS_CONSOLIDATED_NETCDF = consolidated
+    settings.CONTACT_MECHANICS_PER_STEP_NETCDF = not consolidated
+    render_deepzoom = mocker.patch("topobank_contact.deepzoom.render_deepzoom")
+
+    folder = ManifestSetFactory()
+    result = BoundaryElementMethod(
+        nsteps=2, elastic_modulus=2.0, elastic_modulus_unit="GPa"
+    ).topography_implementation(
+        AnalysisResultMock(topography, folder=folder),
+        progress_recorder=DummyProgressRecorder(),
+    )
+    assert result["lazy_deepzoom"]
+    render_deepzoom.assert_not_called()
+
+    def save_dzi(data, folder, storage_prefix, **kwargs):
+        folder.save_file(f"{storage_prefix}/dzi.json", "der", _File(b"{}"))
+
+    render_deepzoom.side_effect = save_dzi
+    assert render_deepzoom_on_demand(folder, result, 1, "pressure") == "step-1/dzi/pressure"
+    render_deepzoom.assert_called_once()
+    (data, _), kwargs = render_deepzoom.call_args
+    dataset = folder.read_xarray(
+        "nc/results.nc" if consolidated else "step-1/nc/results.nc"
+    )
+    if consolidated:
+        dataset = dataset.isel(step=1)
+    np.testing.assert_allclose(data, 2.0 * dataset.pressure)
+    assert kwargs["colorbar_title"] == "Pressure (GPa)"
+    np.testing.assert_allclose(
+        kwargs["physical_sizes"], simple_linear_2d_topography.physical_sizes
+    )
+
+    # The image is only rendered once
+    render_deepzoom_on_demand(folder, result, 1, "pressure")
+    render_deepzoom.assert_called_once()
+
+    with pytest.raises(ValueError):
+        render_deepzoom_on_demand(folder, result, 2, "pressure")
+    with pytest.raises(ValueError):
+        render_deepzoom_on_demand(folder, result, 0, "height")
+
+
+def test_request_deepzoom(simple_linear_2d_topography, settings, mocker):
+    topography = FakeTopographyModel(simple_linear_2d_topography)
+    settings.CONTACT_MECHANICS_LAZY_DEEPZOOM = True
+    folder = ManifestSetFactory()
+    result = BoundaryElementMethod(nsteps=2).topography_implementation(
+        AnalysisResultMock(topography, folder=folder),
+        progress_recorder=DummyProgressRecorder(),
+    )
+
+    def save_dzi(data, folder, storage_prefix, **kwargs):
+        folder.save_file(f"{storage_prefix}/dzi.json", "der", _File(b"{}"))
+
+    render_deepzoom = mocker.patch(
+        "topobank_contact.deepzoom.render_deepzoom", side_effect=save_dzi
+    )
+    requested = []
+
+    def render(step, field):
+        requested.append((step, field))
+
+    # The first request has the image rendered, e.g. by a background task
+    with pytest.raises(DeepZoomInProgress):
+        request_deepzoom(folder, result, 0, "gap", "analysis-1", render)
+    assert requested == [(0, "gap")]
+    # Further requests wait for it
+    with pytest.raises(DeepZoomInProgress):
+        request_deepzoom(folder, result, 0, "gap", "analysis-1", render)
+    assert requested == [(0, "gap")]
+    render_deepzoom.assert_not_called()
+
+    # The task renders the image and removes the marker
+    render_deepzoom_on_demand(folder, result, 0, "gap", lock_key="analysis-1")
+    render_deepzoom.assert_called_once()
+    marker = "topobank-contact-deepzoom/analysis-1/step-0/dzi/gap"
+    assert cache.get(marker) is None
+    assert (
+        request_deepzoom(folder, result, 0, "gap", "analysis-1", render)
+        == "step-0/dzi/gap"
+    )
+    assert requested == [(0, "gap")]
+
+    # Images that could not be queued are requested again
+    def fail(step, field):
+        raise RuntimeError("Broker unavailable")
+
+    with pytest.raises(RuntimeError):
+        request_deepzoom(folder, result, 1, "gap", "analysis-1", fail)
+    with pytest.raises(DeepZoomInProgress):
+        request_deepzoom(folder, result, 1, "gap", "analysis-1", render)
+    assert requested == [(0, "gap"), (1, "gap")]
+
+
+def test_deepzoom_on_demand_missing_netcdf(
+    simple_linear_2d_topography, settings, mocker
+):
+    topography = FakeTopographyModel(simple_linear_2d_topography)
+    settings.CONTACT_MECHANICS_LAZY_DEEPZOOM = True
+    settings.CONTACT_MECHANICS_PER_STEP_NETCDF = False
+    folder = ManifestSetFactory()
+    result = BoundaryElementMethod(nsteps=2).topography_implementation(
+        AnalysisResultMock(topography, folder=folder),
+        progress_recorder=DummyProgressRecorder(),
+    )
+    render_deepzoom = mocker.patch("topobank_contact.deepzoom.render_deepzoom")
+
+    # Neither per-step nor consolidated netCDF files were stored
+    with pytest.raises(FileNotFoundError):
+        request_deepzoom(folder, result, 0, "pressure", "analysis-1", None)
+    with pytest.raises(FileNotFoundError):
+        render_deepzoom_on_demand(folder, result, 0, "pressure")
+    render_deepzoom.assert_not_called()
+
+
+def test_render_field_deepzoom_without_copies(mocker):
+    render_deepzoom = mocker.patch("topobank_contact.deepzoom.render_deepzoom")
+    pressure = np.random.default_rng(0).random((8, 6))
+    render_field_deepzoom(None, "step-0", "pressure", pressure, (1, 1), "m")
+    assert render_deepzoom.call_args.args[0] is pressure
+
+    render_field_deepzoom(
+        None, "step-0", "pressure", pressure, (1, 1), "m", pressure_fac=2.0
+    )
+    np.testing.assert_array_equal(render_deepzoom.call_args.args[0], 2 * pressure)
+
+    contacting_points = pressure > 0.5
+    render_field_deepzoom(
+        None, "step-0", "contacting-points", contacting_points, (1, 1), "m"
+    )
+    data = render_deepzoom.call_args.args[0]
+    assert np.shares_memory(data, contacting_points)
+    np.testing.assert_array_equal(data, contacting_points.astype(int))
@@ -1,14 +1,34 @@
+import json
+import pstats
+import threading
+
 import numpy as np
 import pydantic
 import pytest
+import xarray as xr
+from ContactMechanics import PeriodicFFTElasticHalfSpace
+from django.core.files.base import ContentFile
 from SurfaceTopography import NonuniformLineScan as STNonuniformLineScan
+from SurfaceTopography import PlasticTopography
 from SurfaceTopography import Topography as STTopography
+from SurfaceTopography.Generation import fourier_synthesis
 from topobank.testing.factories import ManifestSetFactory
 from topobank.testing.utils import (AnalysisResultMock, DummyProgressRecorder,
                                     FakeTopographyModel)
 
-from topobank_contact.workflows import (BoundaryElementMethod,
-                                        IncompatibleTopographyException)
+import topobank_contact.workflows
+from topobank_contact.memory import available_memory
+from topobank_contact.storage import save_checkpoint, save_partial_result
+from topobank_contact.workflows import (ADAPTIVE_MIN_BUDGET,
+                                        CONTACT_AREA_MAXSOLVES,
+                                        CONTACT_AREA_RTOL,
+                                        BoundaryElementMethod,
+                                        IncompatibleTopographyException,
+                                        _make_system, _minimize,
+                                        _multigrid_factors,
+                                        _propose_contact_area_displacement,
+                                        _step_fields, _ToleranceSchedule,
+                                        _TopographyContext, _WarmStart)
 
 
 def test_contact_mechanics_incompatible_topography():
@@ -88,6 +108,179 @@ def test_contact_mechanics_step_file_annotations(simple_linear_2d_topography):
     )
 
 
+def test_contact_mechanics_statistics(simple_linear_2d_topography):
+    topography = FakeTopographyModel(simple_linear_2d_topography)
+    folder = ManifestSetFactory()
+    result = BoundaryElementMethod(
+        nsteps=None, pressures=[1e-2, 2e-2]
+    ).topography_implementation(
+        AnalysisResultMock(topography, folder=folder),
+        progress_recorder=DummyProgressRecorder(),
+    )
+
+    # Solver statistics of each step are reported in the per-step files
+    for i in range(2):
+        dataset = folder.read_xarray(f"step-{i}/nc/results.nc")
+        assert dataset.attrs["nb_iterations"] == result["nb_iterations"][i]
+        assert dataset.attrs["solve_time"] == pytest.approx(result["solve_times"][i])
+        assert 0 < dataset.attrs["peak_rss"] <= result["peak_rss"]
+
+    # Statistics of the individual contact patches
+    dataset = folder.read_xarray("step-0/nc/patches.nc")
+    assert dataset.area.sum() == pytest.approx(
+        result["total_contact_areas"][0]
+        * result["scan_area"]
+    )
+    assert dataset.force.sum() == pytest.approx(
+        result["mean_pressures"][0] * result["scan_area"]
+    )
+    assert np.all(dataset.perimeter > 0)
+
+    assert np.all(result["solve_times"] > 0)
+    for stage in [
+        "read topography",
+        "contact step",
+        "save results",
+        "distributions",
+        "patch areas",
+        "deep zoom",
+    ]:
+        assert result["timings"][stage]["total"] > 0
+    assert result["timings"]["contact step"]["calls"] == 2
+    # Step files, distributions and deep zoom images
+    assert result["nb_files_written"] > 4
+    assert result["nb_bytes_written"] > 0
+    assert result["storage_calls"][".nc"]["calls"] == 4
+    assert sum(
+        calls["nb_bytes"] for calls in result["storage_calls"].values()
+    ) == result["nb_bytes_written"]
+    json.dumps(result["timings"])
+
+
+@pytest.mark.parametrize("every,profiled", [(0, False), (1, True)])
+def test_contact_mechanics_profile_every(
+    simple_linear_2d_topography, settings, every, profiled
+):
+    settings.CONTACT_MECHANICS_PROFILE_EVERY = every
+    folder = ManifestSetFactory()
+    result = BoundaryElementMethod(
+        nsteps=None, pressures=[1e-2]
+    ).topography_implementation(
+        AnalysisResultMock(
+            FakeTopographyModel(simple_linear_2d_topography), folder=folder
+        ),
+        progress_recorder=DummyProgressRecorder(),
+    )
+    assert folder.exists("profile.pstats") == profiled
+    assert ("profile_path" in result) == profiled
+
+
+def test_contact_mechanics_profile_topography(
+    simple_linear_2d_topography, settings, tmp_path
+):
+    topography = FakeTopographyModel(simple_linear_2d_topography)
+    settings.CONTACT_MECHANICS_PROFILE_TOPOGRAPHIES = [topography.id]
+    folder = ManifestSetFactory()
+    result = BoundaryElementMethod(
+        nsteps=None, pressures=[1e-2]
+    ).topography_implementation(
+        AnalysisResultMock(topography, folder=folder),
+        progress_recorder=DummyProgressRecorder(),
+    )
+
+    with folder.open_file(result["profile_path"], "rb") as f:
+        (tmp_path / "profile.pstats").write_bytes(f.read())
+    stats = pstats.Stats(str(tmp_path / "profile.pstats"))
+    functions = {name for _, _, name in stats.stats}
+    assert "_topography_implementation" in functions
+    assert "minimize_proxy" in functions
+
+
+def test_contact_mechanics_profile_not_saved(
+    simple_linear_2d_topography, settings, mocker
+):
+    settings.CONTACT_MECHANICS_PROFILE_EVERY = 1
+    folder = ManifestSetFactory()
+    save_file = folder.save_file
+
+    def save_file_except_profile(filename, kind, file):
+        if filename == "profile.pstats":
+            raise OSError("storage failed")
+        return save_file(filename, kind, file)
+
+    mocker.patch.object(folder, "save_file", side_effect=save_file_except_profile)
+    # The calculation completes without profile
+    result = BoundaryElementMethod(
+        nsteps=None, pressures=[1e-2]
+    ).topography_implementation(
+        AnalysisResultMock(
+            FakeTopographyModel(simple_linear_2d_topography), folder=folder
+        ),
+        progress_recorder=DummyProgressRecorder(),
+    )
+    assert "profile_path" not in result
+
+
+def test_topography_context():
+    rng = np.random.default_rng(0)
+    heights = rng.normal(size=(16, 12))
+    topography = PlasticTopography(
+        STTopography(heights, physical_sizes=(2.0, 3.0)), 0.1
+    )
+    topography.plastic_displ = np.ones_like(heights)
+
+    context = _TopographyContext(topography)
+    # Heights without the plastic displacement
+    np.testing.assert_array_equal(context.heights, heights)
+    assert not context.heights.flags.writeable
+    assert context.top == heights.max()
+    assert context.middle == pytest.approx(heights.mean())
+    assert context.bot == heights.min()
+    assert context.nb_pts == 16 * 12
+    assert context.total_area == 6.0
+    assert context.area_per_pt == pytest.approx(6.0 / (16 * 12))
+
+
+@pytest.mark.parametrize("precision", ["double", "single"])
+@pytest.mark.parametrize("plastic", [False, True])
+def test_step_fields(precision, plastic):
+    rng = np.random.default_rng(0)
+    heights = rng.normal(size=(16, 12))
+    topography = STTopography(heights, physical_sizes=(1.0, 3.0))
+    force_xy = rng.random((16, 12))
+    displacement_xy = rng.normal(size=(16, 12))
+    plastic_displ = rng.random((16, 12)) if plastic else None
+
+    pressure_xy, gap_xy, displacement = _step_fields(
+        _TopographyContext(topography), force_xy, displacement_xy, 0.1,
+        plastic_displ=plastic_displ, precision=precision
+    )
+    dtype = np.float32 if precision == "single" else np.float64
+    for field in [pressure_xy, gap_xy, displacement]:
+        assert field.dtype == dtype
+    np.testing.assert_allclose(pressure_xy, force_xy / (3.0 / 192), rtol=1e-6)
+    deformed_heights = heights if plastic_displ is None else heights + plastic_displ
+    np.testing.assert_allclose(
+        gap_xy,
+        np.maximum(displacement_xy - deformed_heights - 0.1, 0),
+        rtol=1e-6,
+        atol=1e-12,
+    )
+    np.testing.assert_allclose(displacement, displacement_xy, rtol=1e-6)
+
+    # Fields are written to given arrays, e.g. slots of a shared arena
+    out = {name: np.empty((16, 12), dtype=dtype) for name in ["pressure", "gap", "displacement"]}
+    fields = _step_fields(
+        _TopographyContext(topography), force_xy, displacement_xy, 0.1,
+        plastic_displ=plastic_displ, precision=precision, out=out
+    )
+    for field, name, expected in zip(
+        fields, ["pressure", "gap", "displacement"], [pressure_xy, gap_xy, displacement]
+    ):
+        assert field is out[name]
+        np.testing.assert_array_equal(field, expected)
+
+
 def test_contact_mechanics_physical_units(simple_linear_2d_topography):
     topography = FakeTopographyModel(simple_linear_2d_topography)
     folder = ManifestSetFactory()
@@ -122,6 +315,784 @@ def test_contact_mechanics_physical_units(simple_linear_2d_topography):
     assert max(distributions["pressure"]) > 1e-2 * 250.0
 
 
+def test_contact_mechanics_warm_start(simple_linear_2d_topography):
+    topography = FakeTopographyModel(simple_linear_2d_topography)
+    given_pressures = [1e-2, 2e-3, 5e-3]
+    results = [
+        BoundaryElementMethod(
+            nsteps=None, pressures=given_pressures, warm_start=warm_start
+        ).topography_implementation(
+            AnalysisResultMock(topography, folder=ManifestSetFactory()),
+            progress_recorder=DummyProgressRecorder(),
+        )
+        for warm_start in [False, True]
+    ]
+    cold, warm = results
+
+    assert not cold["warm_start"]
+    assert warm["warm_start"]
+    np.testing.assert_allclose(warm["mean_pressures"], cold["mean_pressures"])
+    np.testing.assert_allclose(
+        warm["total_contact_areas"], cold["total_contact_areas"], atol=1e-2
+    )
+    # Iteration counts are reported for every step, together with whether
+    # it was seeded with a previous solution; results are sorted by
+    # pressure and only the last given pressure lies between solved steps
+    assert len(warm["nb_iterations"]) == len(given_pressures)
+    assert np.all(warm["nb_iterations"] > 0)
+    np.testing.assert_array_equal(warm["warm_started"], [False, True, False])
+    np.testing.assert_array_equal(cold["warm_started"], False)
+    # Savings are estimated from the steps solved from scratch, whether
+    # positive or not
+    assert warm["nb_iterations_saved"][0] == warm["nb_iterations_saved"][2] == 0
+    cold_nb_iterations = warm["nb_iterations"][[0, 2]]
+    assert (
+        cold_nb_iterations.min()
+        <= warm["nb_iterations_saved"][1] + warm["nb_iterations"][1]
+        <= cold_nb_iterations.max()
+    )
+    np.testing.assert_array_equal(cold["nb_iterations_saved"], 0)
+
+
+def test_warm_start_seeds_only_bracketed_steps():
+    substrate = PeriodicFFTElasticHalfSpace((4, 4), 1.0, (1.0, 1.0))
+    warm_start = _WarmStart()
+    assert warm_start.initial_forces(1.0, substrate) is None
+    warm_start.append(1.0, np.full((4, 4), 1.0))
+    warm_start.append(3.0, np.full((4, 4), 3.0))
+    # Solutions are interpolated, and the solver's forces have opposite sign
+    np.testing.assert_allclose(warm_start.initial_forces(1.5, substrate), -1.5)
+    np.testing.assert_allclose(warm_start.initial_forces(3.0, substrate), -3.0)
+    # Steps outside of the solved range are solved from scratch
+    assert warm_start.initial_forces(0.5, substrate) is None
+    assert warm_start.initial_forces(4.0, substrate) is None
+
+
+@pytest.mark.parametrize("periodic", [True, False])
+def test_contact_mechanics_multigrid(periodic):
+    x, y = np.meshgrid(np.arange(64), np.arange(64), indexing="ij")
+    heights = np.cos(2 * np.pi * x / 64) * np.cos(2 * np.pi * y / 32)
+    t = STTopography(heights, (1.0, 1.0), periodic=periodic, unit="um")
+    topography = FakeTopographyModel(t)
+    results = [
+        BoundaryElementMethod(
+            nsteps=None,
+            pressures=[1e-2, 5e-2],
+            multigrid_levels=multigrid_levels,
+            substrate="periodic" if periodic else "nonperiodic",
+        ).topography_implementation(
+            AnalysisResultMock(topography, folder=ManifestSetFactory()),
+            progress_recorder=DummyProgressRecorder(),
+        )
+        for multigrid_levels in [0, 2]
+    ]
+    plain, multigrid = results
+
+    np.testing.assert_allclose(multigrid["mean_pressures"], plain["mean_pressures"])
+    np.testing.assert_allclose(
+        multigrid["total_contact_areas"], plain["total_contact_areas"], atol=1e-2
+    )
+    assert np.all(multigrid["converged"])
+    # Two coarse levels (32² and 16² grid points) per step
+    assert multigrid["multigrid_nb_iterations"].shape == (2, 2)
+    assert np.all(multigrid["multigrid_nb_iterations"] > 0)
+    assert plain["multigrid_nb_iterations"].shape == (2, 0)
+
+
+def test_multigrid_factors():
+    assert _multigrid_factors((64, 64), 0) == []
+    assert _multigrid_factors((64, 64), 2) == [4, 2]
+    # Coarse grids keep at least 16 points per direction
+    assert _multigrid_factors((64, 64), 5) == [4, 2]
+    assert _multigrid_factors((64, 48), 5) == [2]
+    assert _multigrid_factors((63, 64), 2) == []
+
+
+def test_contact_mechanics_given_pressures_in_parallel(
+    simple_linear_2d_topography, settings
+):
+    topography = FakeTopographyModel(simple_linear_2d_topography)
+    given_pressures = [1e-2, 2e-3, 5e-3]
+
+    serial = BoundaryElementMethod(
+        nsteps=None, pressures=given_pressures
+    ).topography_implementation(
+        AnalysisResultMock(topography, folder=ManifestSetFactory()),
+        progress_recorder=DummyProgressRecorder(),
+    )
+
+    class ProgressRecorder:
+        def __init__(self):
+            self.progress = []
+
+        def set_progress(self, current, total):
+            self.progress += [(current, total)]
+
+    settings.CONTACT_MECHANICS_NB_PROCESSES = 2
+    folder = ManifestSetFactory()
+    progress_recorder = ProgressRecorder()
+    parallel = BoundaryElementMethod(
+        nsteps=None, pressures=given_pressures
+    ).topography_implementation(
+        AnalysisResultMock(topography, folder=folder),
+        progress_recorder=progress_recorder,
+    )
+
+    np.testing.assert_allclose(parallel["mean_pressures"], serial["mean_pressures"])
+    np.testing.assert_allclose(
+        parallel["total_contact_areas"], serial["total_contact_areas"]
+    )
+    np.testing.assert_array_equal(parallel["data_paths"], serial["data_paths"])
+    # Steps are stored in the order of the given pressures
+    for i, pressure in enumerate(given_pressures):
+        dataset = folder.read_xarray(f"step-{i}/nc/results.nc")
+        assert dataset.attrs["mean_pressure"] == pytest.approx(pressure)
+    assert progress_recorder.progress[-1] == (3, 3)
+
+    # Fields are passed through shared memory rather than pickled
+    assert serial["arena"] is None
+    assert parallel["arena"]["nb_tasks"] == 3
+    assert parallel["arena"]["nb_fields_sent"] == 0
+    assert parallel["arena"]["nb_fields_received"] == 0
+
+
+def test_contact_mechanics_nsteps_in_parallel(simple_linear_2d_topography, settings):
+    topography = FakeTopographyModel(simple_linear_2d_topography)
+    settings.CONTACT_MECHANICS_NB_PROCESSES = 2
+    result = BoundaryElementMethod(nsteps=5).topography_implementation(
+        AnalysisResultMock(topography, folder=ManifestSetFactory()),
+        progress_recorder=DummyProgressRecorder(),
+    )
+
+    # Steps are solved in rounds of two, but all steps are reported
+    assert len(result["mean_pressures"]) == 5
+    assert result["arena"]["nb_slots"] == 2
+    assert result["arena"]["nb_fields_received"] == 0
+    assert len(set(result["mean_displacements"])) == 5
+    assert np.all(np.diff(result["mean_pressures"]) >= 0)
+
+
+def test_contact_mechanics_result_cache(settings):
+    settings.CONTACT_MECHANICS_RESULT_CACHE = True
+    # Random heights, such that the first calculation is never cached
+    t = STTopography(np.random.random((16, 16)), physical_sizes=(1.0, 1.0), unit="nm")
+    topography = FakeTopographyModel(t)
+
+    results = []
+    folders = []
+    for elastic_modulus in [None, 100.0]:
+        folder = ManifestSetFactory()
+        results += [
+            BoundaryElementMethod(
+                nsteps=3, elastic_modulus=elastic_modulus
+            ).topography_implementation(
+                AnalysisResultMock(topography, folder=folder),
+                progress_recorder=DummyProgressRecorder(),
+            )
+        ]
+        folders += [folder]
+    computed, cached = results
+
+    # The contact modulus does not enter the cache key
+    assert not computed["result_cache_hit"]
+    assert cached["result_cache_hit"]
+    np.testing.assert_allclose(cached["mean_pressures"], computed["mean_pressures"])
+    np.testing.assert_allclose(
+        cached["total_contact_areas"], computed["total_contact_areas"]
+    )
+    np.testing.assert_array_equal(cached["nb_iterations"], computed["nb_iterations"])
+
+    # Derived plots are rendered for the contact modulus of each analysis
+    for i in range(3):
+        computed_dataset = folders[0].read_xarray(f"step-{i}/nc/results.nc")
+        cached_dataset = folders[1].read_xarray(f"step-{i}/nc/results.nc")
+        np.testing.assert_allclose(cached_dataset.pressure, computed_dataset.pressure)
+        assert cached_dataset.attrs["elastic_modulus"] == pytest.approx(100.0)
+        computed_distributions = folders[0].read_json(f"step-{i}/json/distributions.json")
+        cached_distributions = folders[1].read_json(f"step-{i}/json/distributions.json")
+        np.testing.assert_allclose(
+            cached_distributions["pressure"],
+            100.0 * np.array(computed_distributions["pressure"]),
+        )
+
+    # Any other parameter changes the key
+    result = BoundaryElementMethod(nsteps=3, maxiter=200).topography_implementation(
+        AnalysisResultMock(topography, folder=ManifestSetFactory()),
+        progress_recorder=DummyProgressRecorder(),
+    )
+    assert not result["result_cache_hit"]
+
+
+def test_contact_mechanics_substrate_cache(settings):
+    settings.CONTACT_MECHANICS_SUBSTRATE_CACHE_MB = 16
+    # Physical sizes that no other test uses, such that the first lookup misses
+    t = STTopography(np.random.random((16, 16)), physical_sizes=(1.25, 0.75), unit="nm")
+    topography = FakeTopographyModel(t)
+
+    lookups = []
+    for _ in range(2):
+        result = BoundaryElementMethod(nsteps=2).topography_implementation(
+            AnalysisResultMock(topography, folder=ManifestSetFactory()),
+            progress_recorder=DummyProgressRecorder(),
+        )
+        lookups += [result["substrate_cache"]]
+    assert lookups == [dict(hits=0, misses=1), dict(hits=1, misses=0)]
+
+
+def test_contact_mechanics_consolidated_netcdf(simple_linear_2d_topography, settings):
+    topography = FakeTopographyModel(simple_linear_2d_topography)
+    settings.CONTACT_MECHANICS_CONSOLIDATED_NETCDF = True
+    folder = ManifestSetFactory()
+    result = BoundaryElementMethod(nsteps=3).topography_implementation(
+        AnalysisResultMock(topography, folder=folder),
+        progress_recorder=DummyProgressRecorder(),
+    )
+
+    assert result["results_path"] == "nc/results.nc"
+    dataset = folder.read_xarray(result["results_path"])
+    assert dataset.sizes["step"] == 3
+    assert dataset.pressure.dims == ("step", "x", "y")
+    assert dataset.pressure.attrs["units"] == "E*"
+    assert dataset.attrs["length_unit"] == "nm"
+    assert dataset.converged.dtype == bool
+    np.testing.assert_allclose(
+        dataset.mean_pressure[result["steps"]], result["mean_pressures"]
+    )
+    # Steps agree with the per-step files
+    for i in range(3):
+        step_dataset = folder.read_xarray(f"step-{i}/nc/results.nc")
+        step = dataset.isel(step=i)
+        np.testing.assert_allclose(step.pressure, step_dataset.pressure)
+        np.testing.assert_array_equal(
+            step.contacting_points, step_dataset.contacting_points
+        )
+        assert float(step.total_contact_area) == pytest.approx(
+            step_dataset.attrs["total_contact_area"]
+        )
+        assert bool(step.converged) == bool(step_dataset.attrs["converged"])
+
+
+def test_contact_mechanics_float32_netcdf(simple_linear_2d_topography, settings):
+    topography = FakeTopographyModel(simple_linear_2d_topography)
+    settings.CONTACT_MECHANICS_CONSOLIDATED_NETCDF = True
+    settings.CONTACT_MECHANICS_NETCDF_OPTIONS = dict(dtype="float32")
+    folder = ManifestSetFactory()
+    BoundaryElementMethod(nsteps=2).topography_implementation(
+        AnalysisResultMock(topography, folder=folder),
+        progress_recorder=DummyProgressRecorder(),
+    )
+
+    step_dataset = folder.read_xarray("step-1/nc/results.nc")
+    dataset = folder.read_xarray("nc/results.nc")
+    for name in ["pressure", "gap", "displacement"]:
+        assert step_dataset[name].dtype == np.float32
+        assert dataset[name].dtype == np.float32
+    assert step_dataset.contacting_points.dtype == bool
+    np.testing.assert_array_equal(dataset.pressure.isel(step=1), step_dataset.pressure)
+
+
+def test_contact_mechanics_deepzoom_threads(
+    simple_linear_2d_topography, settings, mocker
+):
+    topography = FakeTopographyModel(simple_linear_2d_topography)
+    settings.CONTACT_MECHANICS_DEEPZOOM_THREADS = 2
+    render_threads = set()
+
+    def render_deepzoom(data, folder, storage_prefix, **kwargs):
+        render_threads.add(threading.current_thread().name)
+        folder.save_file(
+            f"{storage_prefix}/dzi.json",
+            "der",
+            ContentFile(json.dumps(dict(shape=data.shape)).encode("utf-8")),
+        )
+
+    mocker.patch("topobank_contact.deepzoom.render_deepzoom", render_deepzoom)
+
+    class ProgressRecorder:
+        def __init__(self):
+            self.progress = []
+
+        def set_progress(self, current, total, description=None):
+            self.progress += [(current, total, description)]
+
+    folder = ManifestSetFactory()
+    progress_recorder = ProgressRecorder()
+    result = BoundaryElementMethod(nsteps=3).topography_implementation(
+        AnalysisResultMock(topography, folder=folder),
+        progress_recorder=progress_recorder,
+    )
+
+    assert len(result["data_paths"]) == 3
+    for i in range(3):
+        for name in ["pressure", "contacting-points", "gap", "displacement"]:
+            dzi = folder.read_json(f"step-{i}/dzi/{name}/dzi.json")
+            assert dzi["shape"] == list(simple_linear_2d_topography.nb_grid_pts)
+    assert threading.current_thread().name not in render_threads
+    # Images saved by the threads are counted with the other files of the
+    # steps (distributions, checkpoints)
+    assert result["storage_calls"][".json"]["calls"] > 3 * 4
+    assert result["nb_files_written"] == sum(
+        calls["calls"] for calls in result["storage_calls"].values()
+    )
+    assert progress_recorder.progress[-1] == (
+        6,
+        6,
+        "Solved 3 of 3 steps, rendered images of 3",
+    )
+    currents = [current for current, _, _ in progress_recorder.progress]
+    assert currents == sorted(currents)
+
+
+def test_contact_mechanics_deepzoom_threads_real_renderer(
+    simple_linear_2d_topography, settings
+):
+    topography = FakeTopographyModel(simple_linear_2d_topography)
+    folders = []
+    for nb_threads in [0, 2]:
+        settings.CONTACT_MECHANICS_DEEPZOOM_THREADS = nb_threads
+        folder = ManifestSetFactory()
+        BoundaryElementMethod(nsteps=3).topography_implementation(
+            AnalysisResultMock(topography, folder=folder),
+            progress_recorder=DummyProgressRecorder(),
+        )
+        folders += [folder]
+
+    # Images rendered in threads equal those rendered by the main thread
+    synchronous, threaded = folders
+    for i in range(3):
+        for name in ["pressure", "contacting-points", "gap", "displacement"]:
+            filename = f"step-{i}/dzi/{name}/dzi.json"
+            assert threaded.read_json(filename) == synchronous.read_json(filename)
+
+
+@pytest.mark.parametrize("nb_processes", [1, 2])
+@pytest.mark.parametrize("given_pressures", [None, [1e-2, 2e-3, 5e-3, 1e-3]])
+def test_contact_mechanics_resume_from_checkpoint(
+    simple_linear_2d_topography, settings, mocker, nb_processes, given_pressures
+):
+    topography = FakeTopographyModel(simple_linear_2d_topography)
+    settings.CONTACT_MECHANICS_NB_PROCESSES = nb_processes
+    settings.CONTACT_MECHANICS_CONSOLIDATED_NETCDF = True
+    kwargs = (
+        dict(nsteps=4) if given_pressures is None else dict(nsteps=None, pressures=given_pressures)
+    )
+
+    uninterrupted = BoundaryElementMethod(**kwargs).topography_implementation(
+        AnalysisResultMock(topography, folder=ManifestSetFactory()),
+        progress_recorder=DummyProgressRecorder(),
+    )
+
+    class Interrupted(Exception):
+        pass
+
+    def save_checkpoint_and_interrupt(folder, key, nb_steps, *args, **kwargs):
+        save_checkpoint(folder, key, nb_steps, *args, **kwargs)
+        if nb_steps == 2:
+            raise Interrupted
+
+    mocker.patch(
+        "topobank_contact.workflows.save_checkpoint", save_checkpoint_and_interrupt
+    )
+    folder = ManifestSetFactory()
+    with pytest.raises(Interrupted):
+        BoundaryElementMethod(**kwargs).topography_implementation(
+            AnalysisResultMock(topography, folder=folder),
+            progress_recorder=DummyProgressRecorder(),
+        )
+    mocker.stopall()
+    assert folder.read_json("checkpoint.json")["nb_steps"] == 2
+
+    make_system = mocker.spy(topobank_contact.workflows, "_make_system")
+    next_contact_step = mocker.spy(topobank_contact.workflows, "_next_contact_step")
+    contact_at_given_load = mocker.spy(
+        topobank_contact.workflows, "_contact_at_given_load"
+    )
+    resumed = BoundaryElementMethod(**kwargs).topography_implementation(
+        AnalysisResultMock(topography, folder=folder),
+        progress_recorder=DummyProgressRecorder(),
+    )
+
+    if nb_processes == 1:
+        # Only the missing steps are solved
+        assert next_contact_step.call_count + contact_at_given_load.call_count == 2
+    else:
+        make_system.assert_called_once()
+    for key in ["mean_pressures", "mean_displacements", "total_contact_areas"]:
+        np.testing.assert_allclose(resumed[key], uninterrupted[key])
+    np.testing.assert_array_equal(resumed["data_paths"], uninterrupted["data_paths"])
+    # The checkpoint is removed once the calculation is complete
+    assert not folder.exists("checkpoint.json")
+    dataset = folder.read_xarray("nc/results.nc")
+    np.testing.assert_allclose(
+        dataset.mean_pressure[resumed["steps"]], resumed["mean_pressures"]
+    )
+
+
+@pytest.mark.parametrize("publish", [True, False])
+def test_contact_mechanics_partial_results(
+    simple_linear_2d_topography, settings, mocker, publish
+):
+    settings.CONTACT_MECHANICS_PARTIAL_RESULTS = publish
+    nb_steps_completed = []
+    partial_results = []
+
+    def save_partial_result_and_record(folder, *args, **kwargs):
+        save_partial_result(folder, *args, **kwargs)
+        partial_results.append(folder.read_json("partial.json"))
+        nb_steps_completed.append(partial_results[-1]["nb_steps_completed"])
+
+    mocker.patch(
+        "topobank_contact.workflows.save_partial_result", save_partial_result_and_record
+    )
+    folder = ManifestSetFactory()
+    result = BoundaryElementMethod(nsteps=3).topography_implementation(
+        AnalysisResultMock(
+            FakeTopographyModel(simple_linear_2d_topography), folder=folder
+        ),
+        progress_recorder=DummyProgressRecorder(),
+    )
+
+    if not publish:
+        assert nb_steps_completed == []
+        assert not folder.exists("partial.json")
+        return
+    # Published after each step
+    assert nb_steps_completed == [1, 2, 3]
+    partial_result = partial_results[-1]
+    assert partial_result["nb_steps"] == 3
+    for key in [
+        "mean_pressures",
+        "total_contact_areas",
+        "mean_displacements",
+        "mean_gaps",
+        "converged",
+    ]:
+        np.testing.assert_allclose(partial_result[key], result[key])
+    # and removed once the result is complete
+    assert not folder.exists("partial.json")
+
+
+@pytest.mark.parametrize("refinement_maxiter", [0, 20])
+def test_contact_mechanics_precision_and_relaxed_tolerances(refinement_maxiter):
+    x, y = np.meshgrid(np.arange(64), np.arange(64), indexing="ij")
+    heights = np.cos(2 * np.pi * x / 64) * np.cos(2 * np.pi * y / 32)
+    topography = FakeTopographyModel(
+        STTopography(heights, (1.0, 1.0), periodic=True, unit="um")
+    )
+    pressures = [1e-2, 5e-2]
+    folders = [ManifestSetFactory(), ManifestSetFactory(), ManifestSetFactory()]
+    double, single, relaxed = [
+        BoundaryElementMethod(
+            nsteps=None,
+            pressures=pressures,
+            substrate="periodic",
+            refinement_maxiter=refinement_maxiter,
+            **kwargs,
+        ).topography_implementation(
+            AnalysisResultMock(topography, folder=folder),
+            progress_recorder=DummyProgressRecorder(),
+        )
+        for kwargs, folder in zip(
+            [{}, dict(precision="single"), dict(relaxed_tolerances=True)], folders
+        )
+    ]
+
+    # Single precision fields do not change the solution
+    assert single["accuracy"] == dict(
+        solver_dtype="float64",
+        fields_dtype="float32",
+        stored_dtype="float32",
+        relaxed_tolerances=False,
+        refinement_maxiter=0,
+    )
+    np.testing.assert_array_equal(single["nb_iterations"], double["nb_iterations"])
+    np.testing.assert_allclose(
+        single["total_contact_areas"], double["total_contact_areas"]
+    )
+    np.testing.assert_array_equal(single["refinement_nb_iterations"], 0)
+    dataset = folders[1].read_xarray("step-0/nc/results.nc")
+    assert dataset.pressure.dtype == np.float32
+    assert dataset.gap.dtype == np.float32
+
+    # Relaxed tolerances do not change the type of the fields
+    assert relaxed["accuracy"] == dict(
+        solver_dtype="float64",
+        fields_dtype="float64",
+        stored_dtype="float64",
+        relaxed_tolerances=True,
+        refinement_maxiter=refinement_maxiter,
+    )
+    np.testing.assert_allclose(relaxed["mean_pressures"], pressures)
+    np.testing.assert_allclose(
+        relaxed["total_contact_areas"], double["total_contact_areas"], atol=1e-2
+    )
+    assert np.all(relaxed["relaxed_converged"])
+    assert not np.any(double["relaxed_converged"])
+    assert np.all(relaxed["residuals"] >= 0)
+    np.testing.assert_allclose(relaxed["pentols"], 10 * double["pentols"])
+    # Refinement only applies to solutions at relaxed tolerances
+    np.testing.assert_array_equal(double["refinement_nb_iterations"], 0)
+    if refinement_maxiter == 0:
+        np.testing.assert_array_equal(relaxed["refinement_nb_iterations"], 0)
+        np.testing.assert_array_equal(relaxed["refinement_contact_area_differences"], 0)
+    else:
+        assert np.all(relaxed["refinement_nb_iterations"] > 0)
+        assert np.all(relaxed["refinement_nb_iterations"] <= refinement_maxiter)
+        assert np.all(
+            np.abs(relaxed["refinement_contact_area_differences"]) < 1e-2
+        )
+    dataset = folders[2].read_xarray("step-0/nc/results.nc")
+    assert dataset.pressure.dtype == np.float64
+    assert dataset.attrs["residual"] == pytest.approx(
+        relaxed["residuals"][np.argsort(relaxed["mean_pressures"])][0]
+    )
+    assert folders[0].read_xarray("step-0/nc/results.nc").pressure.dtype == np.float64
+
+
+@pytest.mark.parametrize("relaxed_tolerances", [False, True])
+def test_minimize_default_pentol(relaxed_tolerances):
+    topography = _plastic_topography()
+    system = _make_system(topography, "periodic", None)
+    # The solver chooses the penetration tolerance
+    opt = _minimize(
+        system,
+        pentol=None,
+        maxiter=200,
+        relaxed_tolerances=relaxed_tolerances,
+        refinement_maxiter=20,
+        offset=-np.mean(topography.heights()),
+    )
+    assert opt.success
+    assert opt.relaxed_success == relaxed_tolerances
+    assert opt.pentol is None
+    assert (opt.refinement_nb_iterations > 0) == relaxed_tolerances
+
+
+def test_minimize_refinement_not_converged():
+    topography = _plastic_topography()
+    system = _make_system(topography, "periodic", None)
+    opt = _minimize(
+        system,
+        pentol=1e-6,
+        maxiter=200,
+        relaxed_tolerances=True,
+        refinement_maxiter=1,
+        offset=-np.mean(topography.heights()),
+    )
+    # The failed refinement is not masked by the converged relaxed solution
+    assert opt.relaxed_success
+    assert not opt.success
+    assert opt.refinement_nb_iterations == 1
+
+
+def test_tolerance_schedule():
+    schedule = _ToleranceSchedule(maxiter=1000)
+    # Without history, base tolerances and a quarter of the iterations
+    assert schedule.tolerances(None, -0.5, "mean_displacements") == (1.0, 250)
+
+    history = ([-0.1, -0.5], [0.0, 0.0], [1e-3, 1e-1], [0.001, 0.25], [True, True])
+    schedule.append(0.001, 10)
+    schedule.append(0.25, 40)
+    tolerance_fac, budget = schedule.tolerances(history, -0.5, "mean_displacements")
+    assert tolerance_fac == pytest.approx(5)
+    assert budget == 80
+    # Small contact areas keep the base tolerances
+    tolerance_fac, budget = schedule.tolerances(history, 1e-3, "mean_pressures")
+    assert tolerance_fac == 1
+    assert budget == ADAPTIVE_MIN_BUDGET
+
+
+def _plastic_topography():
+    np.random.seed(1)
+    return fourier_synthesis(
+        (64, 64), (1.0, 1.0), 0.8, rms_height=0.1, unit="µm", periodic=True
+    ).detrend("center")
+
+
+def test_minimize_stalled():
+    topography = _plastic_topography()
+    system = _make_system(topography, "periodic", 0.005)
+    opt = _minimize(
+        system, pentol=1e-5, maxiter=200, budget=10, offset=-np.mean(topography.heights())
+    )
+    assert opt.stalled
+    # Twice the budget, and a single iteration evaluating the stalled solution
+    assert opt.nit == 22
+    assert opt.pentol == 1e-5
+
+    opt = _minimize(system, pentol=1e-5, maxiter=200, offset=-np.mean(topography.heights()))
+    assert not opt.stalled
+
+
+def test_contact_mechanics_adaptive_tolerances():
+    topography = FakeTopographyModel(_plastic_topography())
+    fixed, adaptive = [
+        BoundaryElementMethod(
+            substrate="periodic",
+            hardness=0.005,
+            nsteps=6,
+            maxiter=500,
+            adaptive_tolerances=adaptive_tolerances,
+        ).topography_implementation(
+            AnalysisResultMock(topography, folder=ManifestSetFactory()),
+            progress_recorder=DummyProgressRecorder(),
+        )
+        for adaptive_tolerances in [False, True]
+    ]
+
+    assert not np.any(fixed["stalled"])
+    assert np.any(adaptive["stalled"])
+    assert np.sum(adaptive["nb_iterations"]) < np.sum(fixed["nb_iterations"])
+    assert np.all(adaptive["pentols"] >= fixed["pentols"])
+    np.testing.assert_allclose(
+        adaptive["total_contact_areas"], fixed["total_contact_areas"], atol=1e-3
+    )
+
+
+def test_propose_contact_area_displacement():
+    context = _TopographyContext(
+        STTopography(np.arange(100.0).reshape(10, 10), (1.0, 1.0), periodic=True)
+    )
+    # Without solves, the geometric overlap of the heights matches the target
+    mean_displacement = _propose_contact_area_displacement(0.1, [], context)
+    assert np.mean(context.heights > -mean_displacement) == pytest.approx(0.1, abs=0.01)
+    # Half the geometric overlap in contact doubles the overlap
+    mean_displacement = _propose_contact_area_displacement(
+        0.1, [(-89.5, 0.05)], context
+    )
+    assert np.mean(context.heights > -mean_displacement) == pytest.approx(0.2, abs=0.01)
+    # Secant interpolation of the log contact area between bracketing solves
+    mean_displacement = _propose_contact_area_displacement(
+        0.1, [(-90, 0.05), (-80, 0.2), (-50, 0.5)], context
+    )
+    assert mean_displacement == pytest.approx(-85, abs=0.5)
+
+
+def test_contact_mechanics_contact_areas():
+    topography = FakeTopographyModel(_plastic_topography())
+    contact_areas = [0.02, 0.1]
+    result = BoundaryElementMethod(
+        substrate="periodic", nsteps=None, contact_areas=contact_areas, maxiter=500
+    ).topography_implementation(
+        AnalysisResultMock(topography, folder=ManifestSetFactory()),
+        progress_recorder=DummyProgressRecorder(),
+    )
+
+    assert len(result["data_paths"]) == 2
+    assert np.all(result["converged"])
+    np.testing.assert_allclose(
+        result["total_contact_areas"], contact_areas, rtol=CONTACT_AREA_RTOL
+    )
+    assert np.all(result["nb_solves"] >= 1)
+    assert np.all(result["nb_solves"] <= CONTACT_AREA_MAXSOLVES)
+    assert result["timings"]["contact step"]["calls"] == 2
+
+
+def test_contact_mechanics_contact_areas_validation():
+    with pytest.raises(pydantic.ValidationError):
+        BoundaryElementMethod(nsteps=None, contact_areas=[0.1, 1.0])
+    with pytest.raises(ValueError, match="contact_areas"):
+        BoundaryElementMethod(contact_areas=[0.1]).topography_implementation(
+            AnalysisResultMock(
+                FakeTopographyModel(_plastic_topography()), folder=ManifestSetFactory()
+            ),
+            progress_recorder=DummyProgressRecorder(),
+        )
+
+
+@pytest.mark.parametrize("out_of_core", [True, "auto"])
+def test_contact_mechanics_out_of_core(settings, mocker, out_of_core):
+    x, y = np.meshgrid(np.arange(64), np.arange(48), indexing="ij")
+    heights = np.cos(2 * np.pi * x / 32) * np.cos(2 * np.pi * y / 16)
+    topography = FakeTopographyModel(
+        STTopography(heights, (1.0, 0.75), periodic=True, unit="um")
+    )
+    render_deepzoom = mocker.patch("topobank_contact.deepzoom.render_deepzoom")
+    settings.CONTACT_MECHANICS_CONSOLIDATED_NETCDF = True
+
+    def run():
+        folder = ManifestSetFactory()
+        result = BoundaryElementMethod(
+            nsteps=None, pressures=[1e-2, 1e-1], substrate="periodic"
+        ).topography_implementation(
+            AnalysisResultMock(topography, folder=folder),
+            progress_recorder=DummyProgressRecorder(),
+        )
+        return folder, result
+
+    in_core_folder, in_core = run()
+    assert not in_core["out_of_core"]
+    assert render_deepzoom.call_count == 2 * 4
+    render_deepzoom.reset_mock()
+
+    # Tiles of 10 rows
+    settings.CONTACT_MECHANICS_TILE_MB = 10 * 48 * 8 / 1024**2
+    settings.CONTACT_MECHANICS_OUT_OF_CORE = out_of_core
+    if out_of_core == "auto":
+        # Only the out-of-core calculation fits into the budget
+        settings.CONTACT_MECHANICS_MEMORY_BUDGET_MB = (
+            in_core["memory_estimate"]["total"] / 1024**2 - 0.1
+        )
+    folder, result = run()
+    assert result["out_of_core"]
+    assert result["lazy_deepzoom"]
+    render_deepzoom.assert_not_called()
+    assert result["memory_estimate"]["total"] < in_core["memory_estimate"]["total"]
+
+    np.testing.assert_allclose(result["mean_pressures"], in_core["mean_pressures"])
+    np.testing.assert_allclose(
+        result["total_contact_areas"], in_core["total_contact_areas"]
+    )
+    for i in range(2):
+        for filename in ["json/distributions.json", "nc/results.nc"]:
+            path = f"{in_core['data_paths'][i]}/{filename}"
+            if filename.endswith(".json"):
+                assert folder.read_json(path) == pytest.approx(
+                    in_core_folder.read_json(path)
+                )
+            else:
+                # Timings and memory usage differ between runs
+                dataset, in_core_dataset = (
+                    f.read_xarray(path) for f in [folder, in_core_folder]
+                )
+                for name in ["solve_time", "peak_rss"]:
+                    del dataset.attrs[name], in_core_dataset.attrs[name]
+                xr.testing.assert_identical(dataset, in_core_dataset)
+    np.testing.assert_array_equal(
+        folder.read_xarray("nc/results.nc").pressure,
+        in_core_folder.read_xarray("nc/results.nc").pressure,
+    )
+
+
+def test_contact_mechanics_releases_resources_on_failure(
+    simple_linear_2d_topography, settings, mocker
+):
+    topography = FakeTopographyModel(simple_linear_2d_topography)
+    settings.CONTACT_MECHANICS_OUT_OF_CORE = True
+    settings.CONTACT_MECHANICS_CONSOLIDATED_NETCDF = True
+    settings.CONTACT_MECHANICS_DEEPZOOM_THREADS = 2
+    step_fields_close = mocker.spy(topobank_contact.workflows.StepFields, "close")
+    renderer_shutdown = mocker.spy(
+        topobank_contact.workflows.DeepZoomRenderer, "shutdown"
+    )
+    writer_close = mocker.spy(
+        topobank_contact.workflows.ConsolidatedNetCDFWriter, "close"
+    )
+    mocker.patch(
+        "topobank_contact.workflows.save_partial_result",
+        side_effect=OSError("storage failed"),
+    )
+
+    with pytest.raises(OSError):
+        BoundaryElementMethod(nsteps=3).topography_implementation(
+            AnalysisResultMock(topography, folder=ManifestSetFactory()),
+            progress_recorder=DummyProgressRecorder(),
+        )
+    step_fields_close.assert_called_once()
+    renderer_shutdown.assert_called_once()
+    writer_close.assert_called_once()
+
+
 def test_contact_mechanics_rejects_nonpositive_elastic_modulus():
     with pytest.raises(pydantic.ValidationError):
         BoundaryElementMethod(elastic_modulus=-1.0)
@@ -156,6 +1127,10 @@ def test_exception_topography_too_large_for_contact_mechanics(
     x_dim, y_dim, mocker, simple_linear_2d_topography
 ):
     topo = FakeTopographyModel(simple_linear_2d_topography)
+    # Default budget on a machine with 16 GB of memory
+    mocker.patch(
+        "topobank_contact.workflows.available_memory", return_value=16 * 1024**3
+    )
 
     # patch raw topography in order to return a higher number of grid points
     m = mocker.patch(
@@ -172,6 +1147,41 @@ def test_exception_topography_too_large_for_contact_mechanics(
         )
 
 
+def test_contact_mechanics_memory_estimate(simple_linear_2d_topography, settings):
+    topography = FakeTopographyModel(simple_linear_2d_topography)
+    settings.CONTACT_MECHANICS_MEMORY_BUDGET_MB = 1024
+    result = BoundaryElementMethod(substrate="nonperiodic").topography_implementation(
+        AnalysisResultMock(topography, folder=ManifestSetFactory()),
+        progress_recorder=DummyProgressRecorder(),
+    )
+    assert result["memory_budget"] == 1024 * 1024 * 1024
+    assert result["memory_estimate"]["total"] == sum(
+        value for key, value in result["memory_estimate"].items() if key != "total"
+    )
+
+    # By default, a calculation may use the memory of the machine, unless
+    # worker processes are configured to share it
+    settings.CONTACT_MECHANICS_MEMORY_BUDGET_MB = None
+    result = BoundaryElementMethod().topography_implementation(
+        AnalysisResultMock(topography, folder=ManifestSetFactory()),
+        progress_recorder=DummyProgressRecorder(),
+    )
+    assert result["memory_budget"] == available_memory()
+    settings.CONTACT_MECHANICS_WORKER_CONCURRENCY = 3
+    result = BoundaryElementMethod().topography_implementation(
+        AnalysisResultMock(topography, folder=ManifestSetFactory()),
+        progress_recorder=DummyProgressRecorder(),
+    )
+    assert result["memory_budget"] == available_memory(3)
+
+    # The interpreter alone does not fit
+    settings.CONTACT_MECHANICS_MEMORY_BUDGET_MB = 64
+    with pytest.raises(IncompatibleTopographyException):
+        BoundaryElementMethod().topography_implementation(
+            AnalysisResultMock(topography, folder=ManifestSetFactory())
+        )
+
+
 @pytest.mark.parametrize(
     ["topo_is_periodic", "substrate", "exp_num_alerts"],
     [
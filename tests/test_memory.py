@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+from topobank_contact.memory import (INTERPRETER_NBYTES, available_memory,
+                                     estimate_memory, peak_rss)
+
+
+def test_estimate_memory():
+    nb_grid_pts = (1024, 512)
+    periodic = estimate_memory(nb_grid_pts, True)
+    nonperiodic = estimate_memory(nb_grid_pts, False)
+    plastic = estimate_memory(nb_grid_pts, True, plastic=True)
+    for estimate in [periodic, nonperiodic, plastic]:
+        assert estimate["total"] == sum(
+            value for key, value in estimate.items() if key != "total"
+        )
+
+    # Nonperiodic calculations run on a grid padded to four times the size
+    assert nonperiodic["substrate"] == 4 * periodic["substrate"]
+    assert nonperiodic["solver"] == 4 * periodic["solver"]
+    assert plastic["topography"] > periodic["topography"]
+
+    # Per-step memory scales with the number of steps only for warm starts
+    assert estimate_memory(nb_grid_pts, True, nsteps=20) == periodic
+    assert (
+        estimate_memory(nb_grid_pts, True, nsteps=20, warm_start=True)["warm_start"]
+        == 20 * estimate_memory(nb_grid_pts, True, warm_start=True)["warm_start"]
+    )
+
+    # Each worker process sets up its own system
+    parallel = estimate_memory(nb_grid_pts, True, nsteps=10, nb_processes=4)
+    assert "solver" not in parallel
+    # Workers write the fields of their steps into slots of a shared arena
+    assert parallel["arena"] == (
+        periodic["topography"] + 8 * periodic["step_fields"]
+    )
+    assert parallel["workers"] > 4 * periodic["solver"]
+    assert estimate_memory(nb_grid_pts, True, nsteps=2, nb_processes=4)["workers"] == (
+        parallel["workers"] // 2
+    )
+
+    single = estimate_memory(nb_grid_pts, True, precision="single")
+    assert single["step_fields"] < periodic["step_fields"]
+
+    # Coarse levels add a third of the memory of the system at most
+    multigrid = estimate_memory(nb_grid_pts, True, multigrid_levels=3)
+    assert 0 < multigrid["multigrid"] < (
+        periodic["topography"] + periodic["substrate"] + periodic["solver"]
+    ) / 3
+
+    # Out of core, post-processing holds a tile and images are rendered lazily
+    out_of_core = estimate_memory(
+        nb_grid_pts, True, out_of_core=True, tile_nbytes=64 * 1024
+    )
+    assert out_of_core["postprocessing"] == periodic["postprocessing"] // 64
+    assert "deepzoom" not in out_of_core
+    assert out_of_core["total"] < periodic["total"]
+
+    assert "deepzoom" not in estimate_memory(nb_grid_pts, True, lazy_deepzoom=True)
+    assert (
+        estimate_memory(nb_grid_pts, True, nb_deepzoom_threads=2)["deepzoom"]
+        > periodic["deepzoom"]
+    )
+
+
+@pytest.mark.parametrize("periodic", [True, False])
+def test_estimate_memory_of_small_topography(periodic):
+    estimate = estimate_memory((64, 64), periodic)
+    assert INTERPRETER_NBYTES < estimate["total"] < 2 * INTERPRETER_NBYTES
+
+
+def test_available_memory():
+    assert available_memory() > 0
+    # Shared by the worker processes of a machine
+    assert available_memory(4) == available_memory() // 4
+
+
+def test_peak_rss():
+    nbytes = peak_rss()
+    assert nbytes > 0
+    # Touch 64 MB of fresh memory
+    data = np.ones(8 * 1024 * 1024)
+    assert peak_rss() >= nbytes
+    assert peak_rss() > data.nbytes
@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+import xarray as xr
+from SurfaceTopography.Uniform.GeometryAnalysis import (
+    assign_patch_numbers_area, patch_areas)
+
+from topobank_contact.patches import patch_statistics
+from topobank_contact.storage import netcdf_bytes
+from topobank_contact.tiles import tile_slices
+
+
+@pytest.mark.parametrize("periodic", [True, False])
+@pytest.mark.parametrize("nb_rows", [1, 3, 100])
+def test_patch_areas(periodic, nb_rows):
+    rng = np.random.default_rng(1)
+    for _ in range(20):
+        nb_grid_pts = tuple(rng.integers(1, 30, size=2))
+        mask = rng.random(nb_grid_pts) < rng.uniform(0.1, 0.7)
+        pressure = rng.random(nb_grid_pts)
+        statistics = patch_statistics(
+            mask,
+            periodic,
+            tiles=tile_slices(nb_grid_pts, nb_rows * nb_grid_pts[1] * 8),
+            pressure=pressure,
+        )
+        np.testing.assert_array_equal(
+            np.sort(statistics["nb_pts"]),
+            np.sort(patch_areas(assign_patch_numbers_area(mask, periodic)[1])),
+        )
+        # Patches share out the total load
+        assert statistics["load"].sum() == pytest.approx(pressure[mask].sum())
+        # Tiling does not change the statistics
+        untiled = patch_statistics(mask, periodic, pressure=pressure)
+        for name in ["nb_pts", "perimeter", "load"]:
+            np.testing.assert_allclose(
+                np.sort(statistics[name]), np.sort(untiled[name])
+            )
+
+
+def test_patch_areas_across_boundaries():
+    mask = np.zeros((6, 6), dtype=bool)
+    mask[1, 1] = mask[2, 2] = True  # Diagonal neighbors
+    mask[0, 3] = mask[5, 3] = True  # Across the boundary along x
+    mask[3, 0] = mask[3, 5] = True  # Across the boundary along y
+    tiles = tile_slices(mask.shape, 2 * 6 * 8)
+    np.testing.assert_array_equal(
+        patch_statistics(mask, True, tiles=tiles)["nb_pts"], [2, 2, 2]
+    )
+    np.testing.assert_array_equal(
+        np.sort(patch_statistics(mask, False, tiles=tiles)["nb_pts"]),
+        [1, 1, 1, 1, 2],
+    )
+
+
+def test_patch_statistics():
+    mask = np.zeros((8, 10), dtype=bool)
+    mask[2:4, 3:6] = True  # 2 x 3 rectangle
+    mask[0, 4] = mask[7, 4] = True  # Pair across the boundary along x
+    pressure = np.where(mask, 2.0, 0.0)
+    statistics = patch_statistics(
+        mask, True, pressure=pressure, grid_spacing=(0.5, 2.0)
+    )
+    order = np.argsort(statistics["centroid"][:, 0])
+    statistics = {name: values[order] for name, values in statistics.items()}
+
+    np.testing.assert_array_equal(statistics["nb_pts"], [6, 2])
+    np.testing.assert_allclose(statistics["area"], [6.0, 2.0])
+    # Edges perpendicular to x are 2.0 long, those perpendicular to y 0.5
+    np.testing.assert_allclose(
+        statistics["perimeter"], [2 * 3 * 2.0 + 2 * 2 * 0.5, 2 * 2.0 + 4 * 0.5]
+    )
+    np.testing.assert_allclose(statistics["load"], [12.0, 4.0])
+    # The pair wraps around the boundary, its centroid lies in between
+    np.testing.assert_allclose(statistics["centroid"], [[1.25, 8.0], [3.75, 8.0]])
+
+    # The boundary of nonperiodic masks is not part of the perimeter
+    statistics = patch_statistics(np.ones((4, 5), dtype=bool), False)
+    np.testing.assert_allclose(statistics["perimeter"], [0.0])
+    np.testing.assert_allclose(statistics["centroid"], [[1.5, 2.0]])
+
+
+def test_patch_statistics_without_contact():
+    statistics = patch_statistics(
+        np.zeros((4, 5), dtype=bool), True, pressure=np.zeros((4, 5))
+    )
+    for values in statistics.values():
+        assert len(values) == 0
+    # Sums are floating point, such that they can be stored in netCDF 3 files
+    for name in ["area", "perimeter", "centroid", "load"]:
+        assert statistics[name].dtype == np.float64
+    dataset = xr.Dataset(
+        {
+            name: ("patch", statistics[name])
+            for name in ["area", "perimeter", "load"]
+        }
+    )
+    assert xr.load_dataset(bytes(netcdf_bytes(dataset))).sizes["patch"] == 0
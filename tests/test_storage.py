@@ -0,0 +1,166 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from django.core.files.base import ContentFile
+
+from topobank_contact.storage import (ConsolidatedNetCDFWriter, CountingFolder,
+                                      netcdf_bytes, netcdf_encoding,
+                                      save_netcdf)
+from topobank_contact.tiles import tile_slices
+
+
+class Folder:
+    def __init__(self, path):
+        self.path = path
+
+    def save_file(self, filename, kind, file):
+        (self.path / filename).write_bytes(file.read())
+
+
+def make_step(nx, ny, mean_pressure):
+    rng = np.random.default_rng(0)
+    pressure = rng.random((nx, ny))
+    dataset = xr.Dataset(
+        {
+            "pressure": xr.DataArray(pressure, dims=("x", "y"), attrs=dict(units="E*")),
+            "contacting_points": xr.DataArray(pressure > 0.5, dims=("x", "y")),
+        }
+    )
+    dataset.attrs.update(
+        mean_pressure=mean_pressure,
+        mean_displacement=-mean_pressure,
+        converged=1,
+        total_contact_area=0.5,
+        residual=1e-6,
+        nb_iterations=12,
+        solve_time=0.5,
+        peak_rss=2.0**32,
+        type="periodic",
+    )
+    return dataset
+
+
+def test_netcdf_encoding():
+    dataset = make_step(10, 6, 0.1)
+    encoding = netcdf_encoding(dataset)
+    assert encoding == dict(pressure={}, contacting_points={})
+
+    encoding = netcdf_encoding(
+        dataset, format="NETCDF4", dtype="float32", compression="zlib", chunk_size=8
+    )
+    assert encoding["pressure"]["dtype"] == np.float32
+    assert encoding["pressure"]["chunksizes"] == (8, 6)
+    assert encoding["pressure"]["compression"] == "zlib"
+    assert "dtype" not in encoding["contacting_points"]
+
+    # Compression and chunking are not supported by netCDF3
+    encoding = netcdf_encoding(
+        dataset, dtype="float32", compression="zlib", chunk_size=8
+    )
+    assert encoding["pressure"] == dict(dtype=np.float32)
+
+    # Chunks too small for blosc are stored uncompressed
+    encoding = netcdf_encoding(
+        dataset, format="NETCDF4", compression="blosc_lz4", chunk_size=4
+    )
+    assert encoding["pressure"]["compression"] == "blosc_lz4"
+    assert "compression" not in encoding["contacting_points"]
+
+
+@pytest.mark.parametrize("compression", ["zlib", "blosc_lz4"])
+def test_compressed_consolidated_netcdf(tmp_path, compression):
+    writer = ConsolidatedNetCDFWriter(
+        format="NETCDF4", dtype="float32", compression=compression, chunk_size=4
+    )
+    steps = [make_step(10, 6, mean_pressure) for mean_pressure in [0.1, 0.2]]
+    for step in steps:
+        writer.write_step(step)
+    assert len(writer) == 2
+    writer.save(Folder(tmp_path), "results.nc")
+
+    with xr.open_dataset(tmp_path / "results.nc") as dataset:
+        assert dataset.pressure.dims == ("step", "x", "y")
+        assert dataset.pressure.dtype == np.float32
+        assert dataset.pressure.encoding["chunksizes"] == (1, 4, 4)
+        assert dataset.contacting_points.dtype == bool
+        np.testing.assert_allclose(dataset.mean_pressure, [0.1, 0.2])
+        np.testing.assert_array_equal(dataset.nb_iterations, [12, 12])
+        assert dataset.nb_iterations.dtype == np.int32
+        assert "solve_time" not in dataset.attrs
+        assert dataset.attrs["type"] == "periodic"
+        np.testing.assert_allclose(
+            dataset.pressure.isel(step=1), steps[1].pressure, rtol=1e-6
+        )
+        np.testing.assert_array_equal(
+            dataset.contacting_points.isel(step=0), steps[0].contacting_points
+        )
+
+
+@pytest.mark.parametrize(
+    "options", [{}, dict(format="NETCDF4", compression="zlib", chunk_size=4)]
+)
+def test_save_netcdf(tmp_path, options):
+    dataset = make_step(10, 6, 0.1)
+    tiles = tile_slices((10, 6), 3 * 6 * 8)
+    save_netcdf(tmp_path / "tiled.nc", dataset, tiles, **options)
+    dataset.to_netcdf(
+        tmp_path / "xarray.nc",
+        format=options.get("format", "NETCDF3_64BIT"),
+        encoding=netcdf_encoding(dataset, **options),
+    )
+
+    with xr.open_dataset(tmp_path / "tiled.nc") as tiled, xr.open_dataset(
+        tmp_path / "xarray.nc"
+    ) as reference:
+        xr.testing.assert_identical(tiled, reference)
+        assert tiled.contacting_points.dtype == bool
+
+
+@pytest.mark.parametrize(
+    "options", [{}, dict(format="NETCDF4", compression="zlib", chunk_size=4)]
+)
+def test_netcdf_bytes(tmp_path, options):
+    dataset = make_step(10, 6, 0.1)
+    save_netcdf(tmp_path / "file.nc", dataset, [slice(None)], **options)
+    content = netcdf_bytes(dataset, **options)
+    if "format" not in options:
+        assert bytes(content) == (tmp_path / "file.nc").read_bytes()
+    (tmp_path / "memory.nc").write_bytes(content)
+
+    with xr.open_dataset(tmp_path / "memory.nc") as memory, xr.open_dataset(
+        tmp_path / "file.nc"
+    ) as reference:
+        xr.testing.assert_identical(memory, reference)
+
+
+def test_consolidated_netcdf_in_tiles(tmp_path):
+    writer = ConsolidatedNetCDFWriter()
+    steps = [make_step(10, 6, mean_pressure) for mean_pressure in [0.1, 0.2]]
+    for step in steps:
+        writer.write_step(step, tiles=tile_slices((10, 6), 4 * 6 * 8))
+    writer.save(Folder(tmp_path), "results.nc")
+
+    with xr.open_dataset(tmp_path / "results.nc") as dataset:
+        np.testing.assert_array_equal(dataset.pressure.isel(step=1), steps[1].pressure)
+        np.testing.assert_array_equal(
+            dataset.contacting_points.isel(step=0), steps[0].contacting_points
+        )
+
+
+def test_counting_folder(tmp_path):
+    folder = CountingFolder(Folder(tmp_path))
+    folder.save_file("a.json", "der", ContentFile(b"{}"))
+    folder.save_file("b.json", "der", ContentFile(b"[1, 2]"))
+    assert folder.nb_files_written == 2
+    assert folder.nb_bytes_written == 8
+    assert (tmp_path / "b.json").read_bytes() == b"[1, 2]"
+
+    folder.save_file("c.nc", "der", ContentFile(b"CDF"))
+    folder.save_file("d.json", "der", ContentFile(b"{}"))
+    assert folder.nb_files_written == 4
+    assert (tmp_path / "c.nc").read_bytes() == b"CDF"
+    assert folder.storage_calls[".json"]["calls"] == 3
+    assert folder.storage_calls[".json"]["nb_bytes"] == 10
+    assert folder.storage_calls[".nc"]["nb_bytes"] == 3
+    assert folder.storage_calls[".nc"]["time"] >= 0
@@ -0,0 +1,44 @@
+import os
+
+import numpy as np
+
+from topobank_contact.tiles import (StepFields, step_fields_nbytes,
+                                    tile_slices, tiled_histogram)
+
+
+def test_tile_slices():
+    assert tile_slices((10, 4), 3 * 4 * 8) == [
+        slice(0, 3),
+        slice(3, 6),
+        slice(6, 9),
+        slice(9, 10),
+    ]
+    # Tiles hold at least a row
+    assert tile_slices((2, 4), 1) == [slice(0, 1), slice(1, 2)]
+    assert tile_slices((2, 4), 1024) == [slice(0, 2)]
+
+
+def test_tiled_histogram():
+    data = np.random.default_rng(0).normal(size=(100, 37))
+    hist, edges = np.histogram(3 * data, bins=50, density=True)
+    tiled_hist, tiled_edges = tiled_histogram(
+        data, tile_slices(data.shape, 800), fac=3
+    )
+    np.testing.assert_array_equal(tiled_edges, edges)
+    np.testing.assert_allclose(tiled_hist, hist)
+
+
+def test_step_fields(tmp_path):
+    assert step_fields_nbytes((8, 4)) == 32 * 25
+    assert step_fields_nbytes((8, 4), "single") == 32 * 13
+    assert StepFields((8, 4), precision="single")["gap"].dtype == np.float32
+
+    step_fields = StepFields((8, 4), directory=tmp_path)
+    step_fields["pressure"][...] = 1.0
+    step_fields["contacting_points"][2:4] = True
+    assert step_fields["pressure"].sum() == 32
+    assert step_fields["contacting_points"].sum() == 8
+    assert isinstance(step_fields["gap"], np.memmap)
+    assert len(os.listdir(tmp_path)) == 1
+    step_fields.close()
+    assert len(os.listdir(tmp_path)) == 0
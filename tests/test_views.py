@@ -1,7 +1,9 @@
 import pytest
+from django.core.files.base import ContentFile
 from topobank.manager.utils import subjects_to_base64
 
-from topobank_contact.views import contact_mechanics_card_view
+from topobank_contact.views import (contact_mechanics_card_view,
+                                    contact_mechanics_deepzoom_view)
 
 
 @pytest.mark.django_db
@@ -21,3 +23,80 @@ def test_resolve_card_view(
 
     response = contact_mechanics_card_view(request)
     assert response.status_code == 200
+
+
+@pytest.mark.django_db
+@pytest.mark.urls("test_urls")
+def test_card_view_running_analysis(
+    api_rf, example_contact_analysis, handle_usage_statistics
+):
+    example_contact_analysis.task_state = "st"
+    example_contact_analysis.save()
+    example_contact_analysis.folder.save_file(
+        "partial.json",
+        "der",
+        ContentFile(b'{"nb_steps_completed": 1, "mean_pressures": [1]}'),
+    )
+    subjects = subjects_to_base64([example_contact_analysis.subject])
+
+    request = api_rf.get(
+        f"/plugins/contact/card/contact-mechanics/{example_contact_analysis.function.name}",
+        {"workflow": example_contact_analysis.function.name, "subjects": subjects},
+    )
+    request.user = example_contact_analysis.get_related_surfaces()[0].created_by
+    request.session = {}
+
+    response = contact_mechanics_card_view(request)
+    assert response.status_code == 200
+    (data_source,) = response.data["plotConfiguration"]["dataSources"]
+    assert data_source["running"]
+    assert "partial" in data_source["url"]
+
+
+@pytest.mark.django_db
+@pytest.mark.urls("test_urls")
+def test_deepzoom_view_missing_netcdf(
+    api_rf, example_contact_analysis, handle_usage_statistics
+):
+    # Only a consolidated netCDF file would hold the fields, but it is missing
+    example_contact_analysis.result["results_path"] = "nc/results.nc"
+    example_contact_analysis.save()
+
+    request = api_rf.get(
+        f"/plugins/contact/deepzoom/{example_contact_analysis.id}/1/pressure"
+    )
+    request.user = example_contact_analysis.get_related_surfaces()[0].created_by
+    request.session = {}
+
+    response = contact_mechanics_deepzoom_view(
+        request, analysis_id=example_contact_analysis.id, step=1, field="pressure"
+    )
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+@pytest.mark.urls("test_urls")
+def test_deepzoom_view_queues_rendering(
+    api_rf, example_contact_analysis, handle_usage_statistics, mocker
+):
+    example_contact_analysis.folder.save_file(
+        "step-1/nc/results.nc", "der", ContentFile(b"CDF")
+    )
+    render_deepzoom_task = mocker.patch("topobank_contact.views.render_deepzoom_task")
+
+    for _ in range(2):
+        request = api_rf.get(
+            f"/plugins/contact/deepzoom/{example_contact_analysis.id}/1/pressure"
+        )
+        request.user = example_contact_analysis.get_related_surfaces()[0].created_by
+        request.session = {}
+
+        response = contact_mechanics_deepzoom_view(
+            request, analysis_id=example_contact_analysis.id, step=1, field="pressure"
+        )
+        # The image is rendered in the background
+        assert response.status_code == 202
+        assert response.data["url"] is None
+    render_deepzoom_task.delay.assert_called_once_with(
+        example_contact_analysis.id, 1, "pressure"
+    )
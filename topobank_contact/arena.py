@@ -0,0 +1,215 @@
+"""
+Shared memory of calculations whose load steps are solved in worker
+processes.
+
+An arena is a single anonymous shared memory mapping that holds the
+(read-only) heights of the topography and a number of slots, each holding
+the fields of one load step (see `topobank_contact.tiles.STEP_FIELDS`).
+Worker processes forked after the arena was created inherit the mapping;
+they set up their contact system on the shared heights and write the
+fields of the steps they solve into the slot they are handed. Only the
+scalars of a step travel through the pipes of the process pool, and the
+parent post-processes the fields in the slot before handing it to another
+step.
+"""
+
+import itertools
+import mmap
+import pickle
+
+import numpy as np
+
+from .tiles import STEP_FIELDS, _field_dtype, step_fields_nbytes
+
+# Arrays in the arena start at multiples of this number of bytes
+ALIGNMENT = 64
+
+# Arenas of this process, by key; worker processes inherit this registry
+# when they are forked
+_arenas = {}
+_keys = itertools.count()
+
+
+def pickled_nbytes(obj, min_array_nbytes=0):
+    """
+    Size of an object when passed to or from a worker process.
+
+    Parameters
+    ----------
+    obj : object
+        Object to be pickled.
+    min_array_nbytes : int, optional
+        Arrays smaller than this are not counted. (Default: 0)
+
+    Returns
+    -------
+    nbytes : int
+        Number of bytes of the pickled object.
+    nb_arrays : int
+        Number of (contiguous) arrays of at least `min_array_nbytes` bytes
+        contained in the object. Their data is measured out of band, i.e.
+        without copying it.
+    """
+    buffers = []
+    data = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    sizes = [buffer.raw().nbytes for buffer in buffers]
+    return len(data) + sum(sizes), sum(size >= min_array_nbytes for size in sizes)
+
+
+def _aligned(nbytes):
+    return -(-nbytes // ALIGNMENT) * ALIGNMENT
+
+
+class SharedArena:
+    """
+    Heights of a topography and slots for the fields of load steps in
+    memory shared with forked worker processes.
+
+    The arena also counts the tasks run through it, the bytes that were
+    pickled to pass their arguments and results between the processes, and
+    the fields (arrays of at least the size of a contact mask) among them.
+    """
+
+    def __init__(self, heights, nb_slots, precision="double"):
+        """
+        Parameters
+        ----------
+        heights : numpy.ndarray
+            Heights of the topography; copied into the arena.
+        nb_slots : int
+            Number of steps whose fields can be held at the same time.
+        precision : str, optional
+            'double' or 'single'; floating point type of the fields.
+            (Default: 'double')
+        """
+        self.shape = heights.shape
+        self.nb_slots = nb_slots
+        nb_pts = int(np.prod(self.shape))
+        layout = [("heights", None, np.dtype(np.float64))] + [
+            (name, slot, _field_dtype(name, precision))
+            for slot in range(nb_slots)
+            for name in STEP_FIELDS
+        ]
+        offsets = []
+        self.nbytes = 0
+        for _, _, dtype in layout:
+            offsets.append(self.nbytes)
+            self.nbytes += _aligned(nb_pts * dtype.itemsize)
+        self._mmap = mmap.mmap(-1, max(self.nbytes, 1))
+
+        def array(offset, dtype):
+            return np.frombuffer(
+                self._mmap, dtype=dtype, count=nb_pts, offset=offset
+            ).reshape(self.shape)
+
+        self.heights = array(offsets[0], np.float64)
+        self.heights[...] = heights
+        self.heights.flags.writeable = False
+        self._slots = [{} for _ in range(nb_slots)]
+        for (name, slot, dtype), offset in zip(layout[1:], offsets[1:]):
+            self._slots[slot][name] = array(offset, dtype)
+        self.slot_nbytes = step_fields_nbytes(self.shape, precision)
+        # Size of the smallest field, the contact mask
+        self.field_nbytes = nb_pts * _field_dtype("contacting_points", precision).itemsize
+        self._free_slots = list(range(nb_slots))
+
+        self.nb_tasks = 0
+        self.nb_bytes_sent = 0
+        self.nb_fields_sent = 0
+        self.nb_bytes_received = 0
+        self.nb_fields_received = 0
+
+        self.key = next(_keys)
+        _arenas[self.key] = self
+
+    def slot(self, i):
+        """
+        Fields of slot `i`, as a dictionary of arrays.
+        """
+        return self._slots[i]
+
+    def acquire(self):
+        """
+        Reserve a free slot. Returns its index, or None if all slots are in
+        use.
+        """
+        if not self._free_slots:
+            return None
+        return self._free_slots.pop(0)
+
+    def release(self, i):
+        """
+        Hand slot `i` back; its fields may be overwritten afterwards.
+        """
+        self._free_slots.append(i)
+
+    def submit(self, executor, fn, slot, *args, **kwargs):
+        """
+        Run `fn(arena, slot, *args, **kwargs)` in a worker process of
+        `executor` (forked after the arena was created), counting the
+        pickled arguments. Returns the future of the task; pass it to
+        `result` to obtain the result of `fn`.
+        """
+        task = (self.key, slot, fn, args, kwargs)
+        nbytes, nb_fields = pickled_nbytes(task, self.field_nbytes)
+        self.nb_tasks += 1
+        self.nb_bytes_sent += nbytes
+        self.nb_fields_sent += nb_fields
+        return executor.submit(_run_task, *task)
+
+    def result(self, future):
+        """
+        Result of a task submitted with `submit`, counting the pickled
+        result.
+        """
+        result, nbytes, nb_fields = future.result()
+        self.nb_bytes_received += nbytes
+        self.nb_fields_received += nb_fields
+        return result
+
+    def statistics(self):
+        """
+        Size of the arena and the volume passed between the processes.
+
+        Returns
+        -------
+        statistics : dict
+            'nb_bytes' is the size of the arena and 'nb_slots' its number
+            of slots. 'nb_tasks' is the number of tasks run through it,
+            'nb_bytes_shared' the bytes of fields that workers wrote into
+            slots. 'nb_bytes_sent' and 'nb_bytes_received' are the pickled
+            bytes of the arguments and results of the tasks, and
+            'nb_fields_sent' and 'nb_fields_received' the number of fields
+            among them, i.e. of copies of fields through the pipes of the
+            pool.
+        """
+        return dict(
+            nb_bytes=self.nbytes,
+            nb_slots=self.nb_slots,
+            nb_tasks=self.nb_tasks,
+            nb_bytes_shared=self.nb_tasks * self.slot_nbytes,
+            nb_bytes_sent=self.nb_bytes_sent,
+            nb_fields_sent=self.nb_fields_sent,
+            nb_bytes_received=self.nb_bytes_received,
+            nb_fields_received=self.nb_fields_received,
+        )
+
+    def close(self):
+        """
+        Remove the arena from the registry. The mapping is released once
+        the last array viewing it is gone.
+        """
+        _arenas.pop(self.key, None)
+        self._slots = []
+        self._free_slots = []
+
+
+def _run_task(key, slot, fn, args, kwargs):
+    """
+    Run a task of an arena in a worker process, and measure its pickled
+    result.
+    """
+    arena = _arenas[key]
+    result = fn(arena, slot, *args, **kwargs)
+    nbytes, nb_fields = pickled_nbytes(result, arena.field_nbytes)
+    return result, nbytes, nb_fields
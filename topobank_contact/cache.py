@@ -0,0 +1,331 @@
+"""
+Caches for contact mechanics calculations.
+"""
+
+import hashlib
+import io
+import json
+import logging
+import tempfile
+from collections import OrderedDict
+
+import ContactMechanics
+import numpy as np
+import xarray as xr
+from ContactMechanics import FreeFFTElasticHalfSpace, PeriodicFFTElasticHalfSpace
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from topobank.supplib.json import ExtendedJSONEncoder
+
+from .storage import save_netcdf
+
+# Increase whenever the content of the cached results changes
+RESULT_CACHE_VERSION = 8
+RESULT_CACHE_PREFIX = "topobank-contact-cache"
+
+_log = logging.getLogger(__name__)
+
+
+def result_cache_key(heights, physical_sizes, parameters):
+    """
+    Content hash identifying a contact mechanics calculation.
+
+    Parameters
+    ----------
+    heights : numpy.ndarray
+        Height array of the topography.
+    physical_sizes : tuple of float
+        Physical sizes of the topography.
+    parameters : dict
+        All parameters that affect the solution of the contact problem.
+        Must be serializable to JSON.
+
+    Returns
+    -------
+    key : str
+        Hex digest of the hash.
+    """
+    heights = np.ascontiguousarray(heights)
+    h = hashlib.sha256()
+    # Hash the buffer of the array rather than a copy of it
+    h.update(memoryview(heights).cast("B"))
+    h.update(
+        json.dumps(
+            dict(
+                version=RESULT_CACHE_VERSION,
+                contact_mechanics_version=ContactMechanics.__version__,
+                dtype=str(heights.dtype),
+                shape=heights.shape,
+                physical_sizes=physical_sizes,
+                parameters=parameters,
+            ),
+            sort_keys=True,
+            cls=ExtendedJSONEncoder,
+        ).encode("utf-8")
+    )
+    return h.hexdigest()
+
+
+class ResultCache:
+    """
+    Content-addressed cache of the per-step results of contact mechanics
+    calculations, stored in Django's default storage.
+
+    An entry consists of one netCDF file per step and an index with the
+    history of the calculation. The index is written last; an entry is only
+    used once its index exists. Calculations that store the same entry
+    concurrently write identical files; whichever is saved first is kept.
+    `evict` bounds the number of complete entries. Entries without index,
+    left behind by calculations that failed, are not evicted and can be
+    removed by deleting their directory below `RESULT_CACHE_PREFIX`.
+    """
+
+    def __init__(self, key, storage=None):
+        self._key = key
+        self._storage = default_storage if storage is None else storage
+        self._prefix = f"{RESULT_CACHE_PREFIX}/{key}"
+
+    @property
+    def key(self):
+        return self._key
+
+    def _step_path(self, i):
+        return f"{self._prefix}/step-{i}.nc"
+
+    @property
+    def _index_path(self):
+        return f"{self._prefix}/index.json"
+
+    def _save(self, path, file):
+        # Content is addressed by its hash, existing files are identical
+        if self._storage.exists(path):
+            return
+        name = self._storage.save(path, file)
+        if name != path:
+            # Another calculation saved the file in the meantime and the
+            # storage picked an alternative name for this copy
+            self._storage.delete(name)
+
+    def load_index(self):
+        """
+        Return the index of the cache entry, or None if there is no
+        (complete) entry.
+        """
+        if not self._storage.exists(self._index_path):
+            return None
+        with self._storage.open(self._index_path) as f:
+            return json.load(f)
+
+    def save_index(self, index):
+        """
+        Store the index, marking the entry as complete.
+        """
+        self._save(
+            self._index_path,
+            ContentFile(json.dumps(index, cls=ExtendedJSONEncoder).encode("utf-8")),
+        )
+
+    def load_step(self, i):
+        """
+        Return the dataset of step `i`.
+        """
+        with self._storage.open(self._step_path(i)) as f:
+            return xr.load_dataset(io.BytesIO(f.read()), engine="scipy")
+
+    def save_step(self, i, dataset, tiles=None):
+        """
+        Store the dataset of step `i`. If `tiles` are given, the fields are
+        written tile by tile through a local file, see
+        `topobank_contact.storage.save_netcdf`.
+        """
+        if tiles is None:
+            self._save(
+                self._step_path(i),
+                ContentFile(
+                    bytes(dataset.to_netcdf(format="NETCDF3_64BIT", engine="scipy"))
+                ),
+            )
+            return
+        with tempfile.NamedTemporaryFile(prefix="cache-", suffix=".nc") as tmpfile:
+            save_netcdf(tmpfile.name, dataset, tiles, format="NETCDF3_64BIT")
+            tmpfile.seek(0)
+            self._save(self._step_path(i), File(tmpfile))
+
+    @staticmethod
+    def evict(max_entries, storage=None):
+        """
+        Delete the oldest complete entries, such that at most `max_entries`
+        remain. Entries are ordered by the time their index was written.
+
+        Parameters
+        ----------
+        max_entries : int
+            Number of entries to keep.
+        storage : django.core.files.storage.Storage, optional
+            Storage of the cache. (Default: None, i.e. Django's default
+            storage)
+
+        Returns
+        -------
+        nb_evicted : int
+            Number of entries deleted.
+        """
+        storage = default_storage if storage is None else storage
+        try:
+            keys, _ = storage.listdir(RESULT_CACHE_PREFIX)
+        except FileNotFoundError:
+            return 0
+        entries = []
+        for key in keys:
+            entry = ResultCache(key, storage=storage)
+            try:
+                modified_time = storage.get_modified_time(entry._index_path)
+            except OSError:
+                # Incomplete, or deleted by another process
+                continue
+            entries.append((modified_time, key, entry))
+        entries.sort(key=lambda item: item[:2])
+        nb_evicted = max(len(entries) - max_entries, 0)
+        for _, key, entry in entries[:nb_evicted]:
+            _log.info(f"Evicting cached results {key}.")
+            entry.delete()
+        return nb_evicted
+
+    def delete(self):
+        """
+        Delete the entry. The index goes first, such that the entry is not
+        used while its steps are deleted.
+        """
+        _, filenames = self._storage.listdir(self._prefix)
+        for filename in sorted(filenames, key=lambda name: name != "index.json"):
+            self._storage.delete(f"{self._prefix}/{filename}")
+
+
+# Attributes in which solvers leave the solution of the last calculation on
+# the half-space
+_SOLUTION_ATTRIBUTES = ["energy", "force", "force_k", "disp"]
+
+
+def _substrate_nbytes(substrate):
+    """
+    Memory held by an elastic half-space: Green's function, surface
+    stiffness and FFT buffers, and the full-size force and displacement
+    fields that solvers attach to it.
+    """
+    nbytes = 0
+    for name in ["greens_function", "surface_stiffness"]:
+        array = getattr(substrate, name, None)
+        if array is not None:
+            nbytes += np.asarray(array).nbytes
+    for name in ["real_buffer", "fourier_buffer"]:
+        buffer = getattr(substrate, name, None)
+        if buffer is not None:
+            nbytes += np.asarray(buffer.p).nbytes
+    # Solvers store the force (and the displacement) on the padded grid;
+    # reserve them whether or not the half-space has been used yet
+    nb_domain_pts = int(np.prod(substrate.nb_domain_grid_pts))
+    nbytes += 2 * nb_domain_pts * np.dtype(np.float64).itemsize
+    return nbytes
+
+
+def _clear_solution(substrate):
+    """
+    Drop the solution a previous calculation left on a half-space.
+    """
+    for name in _SOLUTION_ATTRIBUTES:
+        if getattr(substrate, name, None) is not None:
+            setattr(substrate, name, None)
+
+
+class SubstrateCache:
+    """
+    Least-recently-used cache of elastic half-spaces, keyed by number of
+    grid points, physical sizes and periodicity.
+
+    Setting up a half-space computes its Green's function and the FFT
+    plans, which is expensive for the padded grids of nonperiodic
+    calculations. Apart from the solution that solvers leave on them, which
+    is dropped when a half-space is handed out again, half-spaces carry no
+    state between calculations and can be reused for topographies of equal
+    grid. The cache lives in a single (worker) process; its total memory is
+    bounded and the least recently used half-spaces are evicted first.
+    `hits` and `misses` count the lookups of the cache.
+    """
+
+    def __init__(self, max_nbytes=0):
+        self.max_nbytes = max_nbytes
+        self._substrates = OrderedDict()
+        self._nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._substrates)
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def clear(self):
+        self._substrates.clear()
+        self._nbytes = 0
+
+    def get(self, nb_grid_pts, physical_sizes, periodic, timer=None):
+        """
+        Return a (cached) elastic half-space with contact modulus 1.
+
+        Parameters
+        ----------
+        nb_grid_pts : tuple of int
+            Number of grid points of the topography.
+        physical_sizes : tuple of float
+            Physical sizes of the topography.
+        periodic : bool
+            Periodic or free boundary conditions.
+        timer : muTimer.Timer, optional
+            Timer for the setup of the half-space on a cache miss.
+
+        Returns
+        -------
+        substrate : ContactMechanics.FFTElasticHalfSpace.PeriodicFFTElasticHalfSpace
+            The elastic half-space.
+        """
+        key = (
+            tuple(int(n) for n in nb_grid_pts),
+            tuple(float(s) for s in physical_sizes),
+            bool(periodic),
+        )
+        substrate = self._substrates.get(key)
+        if substrate is not None:
+            self.hits += 1
+            self._substrates.move_to_end(key)
+            _clear_solution(substrate[0])
+            return substrate[0]
+
+        half_space_factory = {
+            True: PeriodicFFTElasticHalfSpace,
+            False: FreeFFTElasticHalfSpace,
+        }
+        if timer is None:
+            substrate = half_space_factory[periodic](nb_grid_pts, 1.0, physical_sizes)
+        else:
+            with timer("substrate setup"):
+                substrate = half_space_factory[periodic](
+                    nb_grid_pts, 1.0, physical_sizes
+                )
+        self.misses += 1
+
+        nbytes = _substrate_nbytes(substrate)
+        if nbytes <= self.max_nbytes:
+            _clear_solution(substrate)
+            self._substrates[key] = (substrate, nbytes)
+            self._nbytes += nbytes
+            while self._nbytes > self.max_nbytes:
+                _, (_, evicted_nbytes) = self._substrates.popitem(last=False)
+                self._nbytes -= evicted_nbytes
+        return substrate
+
+
+# Half-spaces of this (worker) process
+substrate_cache = SubstrateCache()
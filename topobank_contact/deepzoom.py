@@ -0,0 +1,417 @@
+"""
+Rendering of deep zoom images alongside the contact mechanics solver.
+"""
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import numpy as np
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from SurfaceTopography.Support.UnitConversion import (
+    get_unit_conversion_factor, suggest_length_unit_for_data)
+from topobank.manager.utils import render_deepzoom
+
+# Deep zoom images of a load step and the netCDF variables they show
+DEEPZOOM_FIELDS = {
+    "pressure": "pressure",
+    "contacting-points": "contacting_points",
+    "gap": "gap",
+    "displacement": "displacement",
+}
+
+# Time (in seconds) after which an image that is marked as requested may be
+# requested again, e.g. because the task rendering it was lost
+DEEPZOOM_RENDER_TIMEOUT = 600
+
+
+class DeepZoomInProgress(Exception):
+    """
+    The image has been requested and is being rendered.
+    """
+
+
+def _scaled(data, fac):
+    """Field in other units, without a copy if the units are the same."""
+    return data if fac == 1 else data * fac
+
+
+def render_field_deepzoom(
+    folder,
+    storage_path,
+    field,
+    data,
+    physical_sizes,
+    unit,
+    pressure_fac=1.0,
+    pressure_unit="E*",
+):
+    """
+    Make the Deep Zoom Image of a field of a load step.
+
+    Parameters
+    ----------
+    folder : topobank.files.models.Folder
+        Folder the image is saved to.
+    storage_path : str
+        Storage path of the load step, e.g. 'step-0'.
+    field : str
+        One of the keys of `DEEPZOOM_FIELDS`.
+    data : numpy.ndarray
+        Values of the field; pressures in units of E*, lengths in `unit`.
+    physical_sizes : tuple of float
+        Physical sizes of the topography in `unit`.
+    unit : str
+        Length unit of the topography.
+    pressure_fac : float, optional
+        Factor converting pressures to `pressure_unit`. (Default: 1.0)
+    pressure_unit : str, optional
+        Unit of the pressure axis. (Default: 'E*')
+
+    Returns
+    -------
+    storage_prefix : str
+        Storage prefix of the image.
+    """
+    storage_prefix = f"{storage_path}/dzi/{field}"
+    if field == "pressure":
+        render_deepzoom(
+            _scaled(data, pressure_fac),
+            folder,
+            storage_prefix=storage_prefix,
+            physical_sizes=physical_sizes,
+            unit=unit,
+            colorbar_title=f"Pressure ({pressure_unit})",
+        )
+    elif field == "contacting-points":
+        render_deepzoom(
+            # Reinterprets the mask as 0/1 without copying it
+            data.view(np.uint8) if data.dtype == bool else data,
+            folder,
+            storage_prefix=storage_prefix,
+            physical_sizes=physical_sizes,
+            unit=unit,
+            cmap="magma",
+        )
+    elif field in ["gap", "displacement"]:
+        data_unit = suggest_length_unit_for_data("linear", data, unit)
+        fac = get_unit_conversion_factor(unit, data_unit)
+        render_deepzoom(
+            _scaled(data, fac),
+            folder,
+            storage_prefix=storage_prefix,
+            physical_sizes=tuple(np.asarray(physical_sizes) * fac),
+            unit=data_unit,
+            colorbar_title=f"{field.capitalize()} ({data_unit})",
+        )
+    else:
+        raise ValueError(f"Unknown deep zoom field '{field}'.")
+    return storage_prefix
+
+
+def render_step_deepzoom(folder, storage_path, fields, physical_sizes, unit, **kwargs):
+    """
+    Make Deep Zoom Images of pressure, contacting points, gap and
+    displacement of a load step.
+
+    Parameters
+    ----------
+    folder : topobank.files.models.Folder
+        Folder the images are saved to.
+    storage_path : str
+        Storage path of the load step, e.g. 'step-0'.
+    fields : dict
+        Values of the fields, keyed by the names in `DEEPZOOM_FIELDS`.
+    physical_sizes : tuple of float
+        Physical sizes of the topography in `unit`.
+    unit : str
+        Length unit of the topography.
+    **kwargs
+        Passed on to `render_field_deepzoom`.
+    """
+    for field, data in fields.items():
+        render_field_deepzoom(
+            folder, storage_path, field, data, physical_sizes, unit, **kwargs
+        )
+
+
+def _on_demand_paths(folder, result, step, field):
+    """
+    Storage prefix of the Deep Zoom Image of a field of a load step, and
+    the path of the netCDF data it is rendered from.
+    """
+    if field not in DEEPZOOM_FIELDS:
+        raise ValueError(f"Unknown deep zoom field '{field}'.")
+    if not 0 <= step < len(result["data_paths"]):
+        raise ValueError(f"Analysis has no load step {step}.")
+    storage_path = f"step-{step}"
+    results_path = result.get("results_path")
+    if results_path is None:
+        results_path = f"{storage_path}/nc/results.nc"
+    return f"{storage_path}/dzi/{field}", results_path
+
+
+def _deepzoom_marker(lock_key, storage_prefix):
+    return f"topobank-contact-deepzoom/{lock_key}/{storage_prefix}"
+
+
+def request_deepzoom(folder, result, step, field, lock_key, render):
+    """
+    Return the Deep Zoom Image of a field of a load step of a finished
+    analysis if it exists. Otherwise, have it rendered by `render`, e.g. by
+    queueing a background task that calls `render_deepzoom_on_demand`,
+    unless it has been requested already.
+
+    Parameters
+    ----------
+    folder : topobank.files.models.Folder
+        Folder of the analysis.
+    result : dict
+        Result of the analysis.
+    step : int
+        Index of the load step, i.e. the image is stored under
+        `step-{step}`.
+    field : str
+        One of the keys of `DEEPZOOM_FIELDS`.
+    lock_key : str
+        Identifies the analysis across processes. Until the image is
+        rendered, it is marked as requested in Django's cache under this
+        key; the marker expires after `DEEPZOOM_RENDER_TIMEOUT` seconds.
+    render : callable
+        Called as `render(step, field)` to have the image rendered.
+
+    Returns
+    -------
+    storage_prefix : str
+        Storage prefix of the image.
+
+    Raises
+    ------
+    ValueError
+        If the field or load step does not exist.
+    FileNotFoundError
+        If the netCDF data of the load step was not stored.
+    DeepZoomInProgress
+        If the image has been requested and is not rendered yet.
+    """
+    storage_prefix, results_path = _on_demand_paths(folder, result, step, field)
+    if folder.exists(f"{storage_prefix}/dzi.json"):
+        return storage_prefix
+    if not folder.exists(results_path):
+        raise FileNotFoundError(
+            f"Analysis has no netCDF data of load step {step} to render "
+            "images from."
+        )
+
+    marker = _deepzoom_marker(lock_key, storage_prefix)
+    # Atomic if the cache is shared between the processes
+    if cache.add(marker, True, timeout=DEEPZOOM_RENDER_TIMEOUT):
+        try:
+            render(step, field)
+        except Exception:
+            cache.delete(marker)
+            raise
+    raise DeepZoomInProgress(
+        f"Image of field '{field}' of load step {step} is being rendered."
+    )
+
+
+def render_deepzoom_on_demand(folder, result, step, field, lock_key=None):
+    """
+    Make the Deep Zoom Image of a field of a load step of a finished
+    analysis from its netCDF data, unless the image exists.
+
+    Parameters
+    ----------
+    folder : topobank.files.models.Folder
+        Folder of the analysis.
+    result : dict
+        Result of the analysis.
+    step : int
+        Index of the load step, i.e. the image is stored under
+        `step-{step}`.
+    field : str
+        One of the keys of `DEEPZOOM_FIELDS`.
+    lock_key : str, optional
+        Identifies the analysis across processes. The marker set by
+        `request_deepzoom` under this key is removed once rendering has
+        finished or failed. (Default: None, i.e. no marker)
+
+    Returns
+    -------
+    storage_prefix : str
+        Storage prefix of the image.
+
+    Raises
+    ------
+    ValueError
+        If the field or load step does not exist.
+    FileNotFoundError
+        If the netCDF data of the load step was not stored.
+    """
+    storage_prefix, results_path = _on_demand_paths(folder, result, step, field)
+    try:
+        if folder.exists(f"{storage_prefix}/dzi.json"):
+            return storage_prefix
+        if not folder.exists(results_path):
+            raise FileNotFoundError(
+                f"Analysis has no netCDF data of load step {step} to render "
+                "images from."
+            )
+        dataset = folder.read_xarray(results_path)
+        if result.get("results_path") is not None:
+            dataset = dataset.isel(step=step)
+        return render_field_deepzoom(
+            folder,
+            f"step-{step}",
+            field,
+            dataset[DEEPZOOM_FIELDS[field]].values,
+            dataset.attrs["physical_sizes"],
+            dataset.attrs["length_unit"],
+            pressure_fac=dataset.attrs.get("elastic_modulus", 1.0),
+            pressure_unit=dataset.attrs.get("elastic_modulus_unit", "E*"),
+        )
+    finally:
+        if lock_key is not None:
+            cache.delete(_deepzoom_marker(lock_key, storage_prefix))
+
+
+class _BufferedFolder:
+    """
+    Collects the files saved by a renderer in memory, such that only the
+    main thread accesses the analysis folder (and hence the database).
+
+    `render_deepzoom` writes the tiles and the descriptor of an image
+    through `save_file` only; files are read as they are saved, since the
+    renderer closes them afterwards. Any other folder method fails with an
+    AttributeError, which is reraised in the main thread.
+    """
+
+    def __init__(self):
+        self.files = []
+
+    def save_file(self, filename, kind, file):
+        self.files.append((filename, kind, ContentFile(file.read())))
+
+
+class DeepZoomRenderer:
+    """
+    Renders the deep zoom images of load steps in a pool of threads while
+    the solver continues with the next step.
+
+    Renderers write into an in-memory buffer that is saved to the analysis
+    folder by the main thread once rendering has finished, in the order the
+    steps were submitted. At most `max_pending` steps are rendered or
+    buffered at any time; `submit` blocks until the oldest step is saved
+    if this limit is reached, which bounds the memory held by fields and
+    images awaiting rendering or saving. With zero threads, steps are
+    rendered synchronously into the analysis folder. Used as a context
+    manager, the threads are shut down on exit.
+    """
+
+    def __init__(self, folder, nb_threads=0, max_pending=None, timer=None, callback=None):
+        """
+        Parameters
+        ----------
+        folder : topobank.files.models.Folder
+            Analysis folder the images are saved to.
+        nb_threads : int, optional
+            Number of rendering threads. (Default: 0, i.e. render
+            synchronously)
+        max_pending : int, optional
+            Maximum number of steps submitted but not yet saved.
+            (Default: None, i.e. twice the number of threads)
+        timer : muTimer.Timer, optional
+            Time spent by the main thread on deep zoom images is recorded
+            in the section 'deep zoom'.
+        callback : callable, optional
+            Called without arguments after the images of a step have been
+            saved.
+        """
+        self._folder = folder
+        self._timer = timer
+        self._callback = callback
+        self._executor = None
+        if nb_threads > 0:
+            self._executor = ThreadPoolExecutor(
+                nb_threads, thread_name_prefix="deepzoom"
+            )
+        self._max_pending = 2 * nb_threads if max_pending is None else max_pending
+        self._pending = deque()
+        # Number of steps whose images have been saved
+        self.nb_saved = 0
+
+    def __len__(self):
+        """Number of steps submitted but not yet saved."""
+        return len(self._pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def _time(self):
+        if self._timer is None:
+            return nullcontext()
+        return self._timer("deep zoom")
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Render the images of a step.
+
+        Parameters
+        ----------
+        func : callable
+            Called as `func(folder, *args, **kwargs)`; renders the images
+            into `folder`. Arguments must not be modified after submission.
+        """
+        if self._executor is None:
+            with self._time():
+                func(self._folder, *args, **kwargs)
+            self.nb_saved += 1
+            if self._callback is not None:
+                self._callback()
+            return
+
+        while len(self._pending) >= max(self._max_pending, 1):
+            self._save_oldest()
+        buffered_folder = _BufferedFolder()
+        self._pending.append(
+            (
+                buffered_folder,
+                self._executor.submit(func, buffered_folder, *args, **kwargs),
+            )
+        )
+        while self._pending and self._pending[0][1].done():
+            self._save_oldest()
+
+    def _save_oldest(self):
+        buffered_folder, future = self._pending.popleft()
+        with self._time():
+            # Reraises exceptions of the renderer
+            future.result()
+            for filename, kind, file in buffered_folder.files:
+                self._folder.save_file(filename, kind, file)
+        self.nb_saved += 1
+        if self._callback is not None:
+            self._callback()
+
+    def finish(self):
+        """
+        Wait for all submitted steps and save their images.
+        """
+        try:
+            while self._pending:
+                self._save_oldest()
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        """
+        Stop the rendering threads, discarding steps not yet rendered.
+        """
+        self._pending.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
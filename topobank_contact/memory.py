@@ -0,0 +1,187 @@
+"""
+Memory model of contact mechanics calculations.
+
+The coefficients below are bytes per grid point of the topography (N
+points) or of the computational domain of the solver (M points; M = N for
+periodic and M = 4N for nonperiodic calculations, which are padded to twice
+the size in each direction). They were calibrated against the peak
+allocations of calculations on 128² to 256² grids.
+"""
+
+import os
+import resource
+
+import numpy as np
+
+# Python interpreter, Django and the numerical libraries
+INTERPRETER_NBYTES = 256 * 1024 * 1024
+
+# Height array of the topography
+TOPOGRAPHY_NBYTES_PER_PT = 8
+# Plastic displacements and masks of plastic topographies
+PLASTIC_NBYTES_PER_PT = 16
+# Green's function and FFT buffers of the elastic half-space
+SUBSTRATE_NBYTES_PER_PADDED_PT = 32
+# Work arrays of the constrained conjugate gradient solver
+SOLVER_NBYTES_PER_PADDED_PT = 80
+# Pressure, gap and displacement (float64) and contact mask of a step
+STEP_FIELDS_NBYTES_PER_PT = 25
+# The same, for single precision (float32) calculations
+SINGLE_PRECISION_STEP_FIELDS_NBYTES_PER_PT = 13
+# Temporaries of distributions, patch statistics and netCDF output
+POSTPROCESSING_NBYTES_PER_PT = 80
+# Scaled copy of a field and its color image, per deep zoom rendering
+DEEPZOOM_NBYTES_PER_PT = 48
+# Single precision forces of a step kept for warm starts
+WARM_START_NBYTES_PER_PT = 4
+
+
+def estimate_memory(
+    nb_grid_pts,
+    periodic,
+    plastic=False,
+    nsteps=1,
+    warm_start=False,
+    multigrid_levels=0,
+    precision="double",
+    nb_processes=1,
+    nb_deepzoom_threads=0,
+    lazy_deepzoom=False,
+    substrate_cache_nbytes=0,
+    out_of_core=False,
+    tile_nbytes=None,
+):
+    """
+    Predict the peak memory of a contact mechanics calculation.
+
+    Parameters
+    ----------
+    nb_grid_pts : tuple of int
+        Number of grid points of the topography.
+    periodic : bool
+        Periodic or free boundary conditions.
+    plastic : bool, optional
+        Whether the substrate has a finite hardness. (Default: False)
+    nsteps : int, optional
+        Number of load steps. (Default: 1)
+    warm_start : bool, optional
+        Whether solutions are kept to warm start the solver. (Default: False)
+    multigrid_levels : int, optional
+        Number of coarse levels initializing the solver. (Default: 0)
+    precision : str, optional
+        'double' or 'single'; floating point type of the fields of the
+        steps. (Default: 'double')
+    nb_processes : int, optional
+        Number of worker processes solving steps. (Default: 1)
+    nb_deepzoom_threads : int, optional
+        Number of threads rendering deep zoom images. (Default: 0)
+    lazy_deepzoom : bool, optional
+        Whether deep zoom images are rendered on demand. (Default: False)
+    substrate_cache_nbytes : int, optional
+        Memory reserved for the substrate cache. (Default: 0)
+    out_of_core : bool, optional
+        Whether the fields of the steps are kept in memory-mapped files and
+        post-processed tile by tile; deep zoom images are then rendered on
+        demand. (Default: False)
+    tile_nbytes : int, optional
+        Size of a tile of a (float64) field in bytes, for out-of-core
+        calculations. (Default: None, i.e. a single tile)
+
+    Returns
+    -------
+    estimate : dict
+        Bytes per component and their sum under the key 'total'.
+    """
+    nb_pts = int(np.prod(nb_grid_pts))
+    nb_padded_pts = nb_pts if periodic else 4 * nb_pts
+
+    topography = TOPOGRAPHY_NBYTES_PER_PT * nb_pts
+    if plastic:
+        topography += PLASTIC_NBYTES_PER_PT * nb_pts
+    # A system (and with it a solver) per process solving steps; the main
+    # process only sets up the substrate if steps are solved by workers
+    nb_solvers = min(nb_processes, nsteps) if nb_processes > 1 else 1
+    substrate = SUBSTRATE_NBYTES_PER_PADDED_PT * nb_padded_pts
+    solver = SOLVER_NBYTES_PER_PADDED_PT * nb_padded_pts
+    step_fields = nb_pts * (
+        SINGLE_PRECISION_STEP_FIELDS_NBYTES_PER_PT
+        if precision == "single"
+        else STEP_FIELDS_NBYTES_PER_PT
+    )
+    estimate = dict(
+        interpreter=INTERPRETER_NBYTES,
+        topography=topography,
+        substrate=substrate,
+        substrate_cache=substrate_cache_nbytes,
+        step_fields=step_fields,
+        postprocessing=POSTPROCESSING_NBYTES_PER_PT * nb_pts,
+    )
+    if out_of_core:
+        # Post-processing only holds the temporaries of a single tile
+        nb_tile_pts = nb_pts if tile_nbytes is None else min(nb_pts, tile_nbytes // 8)
+        estimate["postprocessing"] = POSTPROCESSING_NBYTES_PER_PT * nb_tile_pts
+        lazy_deepzoom = True
+    # Coarse level l has 4^-l as many points as the full resolution
+    multigrid = (topography + substrate + solver) * sum(
+        4.0**-level for level in range(1, multigrid_levels + 1)
+    )
+    if nb_processes > 1:
+        # Workers share the heights and write the fields of their steps into
+        # the slots of a shared arena (see `topobank_contact.arena`), where
+        # the main process post-processes them
+        del estimate["step_fields"]
+        nb_slots = min(2 * nb_processes, nsteps)
+        estimate["arena"] = TOPOGRAPHY_NBYTES_PER_PT * nb_pts + nb_slots * step_fields
+        estimate["workers"] = nb_solvers * int(
+            topography - TOPOGRAPHY_NBYTES_PER_PT * nb_pts + substrate + solver + multigrid
+        )
+    else:
+        estimate["solver"] = solver
+        if multigrid_levels > 0:
+            estimate["multigrid"] = int(multigrid)
+    if warm_start:
+        estimate["warm_start"] = WARM_START_NBYTES_PER_PT * nsteps * nb_pts
+    if not lazy_deepzoom:
+        # Steps waiting for rendering hold on to their fields
+        nb_renderings = max(nb_deepzoom_threads, 1)
+        estimate["deepzoom"] = (
+            nb_renderings * DEEPZOOM_NBYTES_PER_PT * nb_pts
+            + 2 * nb_deepzoom_threads * step_fields
+        )
+    estimate["total"] = sum(estimate.values())
+    return estimate
+
+
+def available_memory(nb_workers=1):
+    """
+    Physical memory of this machine, or the memory limit of the control
+    group (container) the process runs in if that is lower, divided among
+    `nb_workers` worker processes that run calculations at the same time.
+    """
+    nbytes = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    for filename in [
+        "/sys/fs/cgroup/memory.max",  # cgroup v2
+        "/sys/fs/cgroup/memory/memory.limit_in_bytes",  # cgroup v1
+    ]:
+        try:
+            with open(filename) as f:
+                limit = f.read().strip()
+        except OSError:
+            continue
+        if limit.isdigit():
+            nbytes = min(nbytes, int(limit))
+        break
+    return nbytes // max(nb_workers, 1)
+
+
+def peak_rss():
+    """
+    Peak resident memory (in bytes) of this process or of the largest of
+    its terminated child processes (e.g. workers solving steps), whichever
+    is higher.
+    """
+    # `ru_maxrss` is reported in kilobytes on Linux
+    return 1024 * max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
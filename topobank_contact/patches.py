@@ -0,0 +1,210 @@
+"""
+Statistics of the contact patches (connected regions of the contact mask)
+of a load step.
+
+Pixels are connected to their 8 neighbors, as in SurfaceTopography's
+`assign_patch_numbers_area`. The mask is labelled in strips of rows (tiles,
+see `topobank_contact.tiles.tile_slices`), which may be memory-mapped. The
+statistics of each label are accumulated while its tile is in memory;
+labels of adjacent tiles (and, for periodic masks, across the boundaries)
+that touch are then merged through the connected components of the graph
+of touching labels.
+"""
+
+import numpy as np
+from scipy import ndimage
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+# 8-connectivity, as in SurfaceTopography's `assign_patch_numbers_area`
+_PATCH_STRUCTURE = np.ones((3, 3), dtype=bool)
+
+
+def _neighbor_pairs(labels1, labels2, periodic):
+    """
+    Pairs of labels of two adjacent lines of pixels that touch (including
+    diagonally).
+    """
+    pairs = []
+    for shift in [-1, 0, 1]:
+        if periodic:
+            shifted = np.roll(labels2, shift)
+            pairs.append(np.stack([labels1, shifted], axis=-1))
+        elif shift == -1:
+            pairs.append(np.stack([labels1[1:], labels2[:-1]], axis=-1))
+        elif shift == 0:
+            pairs.append(np.stack([labels1, labels2], axis=-1))
+        else:
+            pairs.append(np.stack([labels1[:-1], labels2[1:]], axis=-1))
+    pairs = np.concatenate(pairs)
+    return pairs[np.all(pairs > 0, axis=1)]
+
+
+def _bincount(x, weights, minlength):
+    """
+    `numpy.bincount` that also accepts complex weights. Weighted counts are
+    floating point even if `x` is empty.
+    """
+    if np.iscomplexobj(weights):
+        return _bincount(x, weights.real, minlength) + 1j * _bincount(
+            x, weights.imag, minlength
+        )
+    counts = np.bincount(x, weights=weights, minlength=minlength)
+    if weights is not None:
+        # `numpy.bincount` returns integers for empty `x`
+        counts = counts.astype(np.float64, copy=False)
+    return counts
+
+
+def _padded_tile(mask, tile, periodic):
+    """
+    Tile of the mask with a border of one pixel holding its neighbors. The
+    border outside of nonperiodic masks counts as contact, such that the
+    boundary of the mask does not contribute to perimeters.
+    """
+    nx, ny = mask.shape
+    start, stop = tile.start, tile.stop
+    padded = np.ones((stop - start + 2, ny + 2), dtype=bool)
+    padded[1:-1, 1:-1] = mask[tile]
+    if start > 0 or periodic:
+        padded[0, 1:-1] = mask[(start - 1) % nx]
+    if stop < nx or periodic:
+        padded[-1, 1:-1] = mask[stop % nx]
+    if periodic:
+        padded[:, 0] = padded[:, -2]
+        padded[:, -1] = padded[:, 1]
+    return padded
+
+
+def patch_statistics(
+    mask, periodic, tiles=None, pressure=None, grid_spacing=(1.0, 1.0)
+):
+    """
+    Area, perimeter, load and centroid of each contact patch.
+
+    Parameters
+    ----------
+    mask : numpy.ndarray of bool
+        Contact mask (possibly memory-mapped).
+    periodic : bool
+        Whether patches wrap around the boundaries.
+    tiles : list of slice, optional
+        Tiles of the mask, see `topobank_contact.tiles.tile_slices`.
+        (Default: None, i.e. a single tile)
+    pressure : numpy.ndarray, optional
+        Pressure field; the load of a patch is the integral of the pressure
+        over the patch. (Default: None, i.e. no loads)
+    grid_spacing : tuple of float, optional
+        Distance of the grid points along x and y. (Default: (1.0, 1.0))
+
+    Returns
+    -------
+    statistics : dict
+        Arrays with an entry per patch (in no particular order):
+        'nb_pts' is the number of pixels and 'area' the area of each patch.
+        'perimeter' is the length of the edges between pixels of the patch
+        and pixels out of contact; the boundary of nonperiodic masks does
+        not count. 'centroid' holds the x and y position of the center of
+        each patch; for periodic masks, this is the circular mean of the
+        pixel positions. 'load' (only if `pressure` is given) is the
+        integral of the pressure.
+    """
+    nx, ny = mask.shape
+    dx, dy = grid_spacing
+    if tiles is None:
+        tiles = [slice(0, nx)]
+    if periodic:
+        # Positions on the unit circle, for circular means
+        phases = [
+            np.exp(2j * np.pi * np.arange(nx) / nx),
+            np.exp(2j * np.pi * np.arange(ny) / ny),
+        ]
+
+    nb_labels = 0
+    # Label 0 is the background
+    sums = {
+        name: [np.zeros(1)]
+        for name in ["nb_pts", "perimeter", "load", "position_x", "position_y"]
+    }
+    pairs = []
+    first_row = last_row = None
+    for tile in tiles:
+        tile = slice(*tile.indices(nx)[:2])
+        padded = _padded_tile(mask, tile, periodic)
+        contact = padded[1:-1, 1:-1]
+        labels, nb_tile_labels = ndimage.label(contact, structure=_PATCH_STRUCTURE)
+        nb_bins = nb_tile_labels + 1
+
+        # Only pixels in contact enter the sums, in row-major order
+        contact_labels = labels[contact]
+
+        def label_sum(weights=None, selection=None):
+            selected_labels = (
+                contact_labels if selection is None else labels[selection]
+            )
+            return _bincount(selected_labels, weights, nb_bins)[1:]
+
+        sums["nb_pts"].append(label_sum())
+        # Edges perpendicular to x have length dy, those perpendicular to y
+        # have length dx
+        sums["perimeter"].append(
+            dy * label_sum(selection=contact & ~padded[:-2, 1:-1])
+            + dy * label_sum(selection=contact & ~padded[2:, 1:-1])
+            + dx * label_sum(selection=contact & ~padded[1:-1, :-2])
+            + dx * label_sum(selection=contact & ~padded[1:-1, 2:])
+        )
+        if pressure is not None:
+            sums["load"].append(label_sum(np.asarray(pressure[tile])[contact]))
+        rows, columns = np.nonzero(contact)
+        rows += tile.start
+        if periodic:
+            rows, columns = phases[0][rows], phases[1][columns]
+        sums["position_x"].append(label_sum(rows))
+        sums["position_y"].append(label_sum(columns))
+        del rows, columns
+
+        labels[labels > 0] += nb_labels
+        if periodic:
+            # Patches wrapping around the boundary along y
+            pairs.append(_neighbor_pairs(labels[:, 0], labels[:, -1], False))
+        if last_row is not None:
+            pairs.append(_neighbor_pairs(last_row, labels[0], periodic))
+        if first_row is None:
+            first_row = labels[0].copy()
+        last_row = labels[-1].copy()
+        nb_labels += nb_tile_labels
+    if periodic and last_row is not None:
+        # Patches wrapping around the boundary along x
+        pairs.append(_neighbor_pairs(last_row, first_row, True))
+
+    pairs = np.concatenate(pairs) if pairs else np.zeros((0, 2), dtype=int)
+    graph = coo_matrix(
+        (np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])),
+        shape=(nb_labels + 1, nb_labels + 1),
+    )
+    _, patch_ids = connected_components(graph, directed=False)
+    # The background is its own component and comes first
+    nb_patches = patch_ids.max()
+
+    def patch_sum(name):
+        return _bincount(
+            patch_ids[1:] - 1, np.concatenate(sums[name])[1:], nb_patches
+        )
+
+    nb_pts = np.round(patch_sum("nb_pts")).astype(int)
+    if periodic:
+        # Circular mean, mapped back to [0, n)
+        centroid_x = np.angle(patch_sum("position_x")) % (2 * np.pi) * nx / (2 * np.pi)
+        centroid_y = np.angle(patch_sum("position_y")) % (2 * np.pi) * ny / (2 * np.pi)
+    else:
+        centroid_x = patch_sum("position_x") / nb_pts
+        centroid_y = patch_sum("position_y") / nb_pts
+    statistics = dict(
+        nb_pts=nb_pts,
+        area=nb_pts * dx * dy,
+        perimeter=patch_sum("perimeter"),
+        centroid=np.stack([centroid_x * dx, centroid_y * dy], axis=-1),
+    )
+    if pressure is not None:
+        statistics["load"] = patch_sum("load") * dx * dy
+    return statistics
@@ -0,0 +1,80 @@
+"""
+Opt-in profiling of contact mechanics calculations.
+
+Analyses are selected for profiling by the settings
+`CONTACT_MECHANICS_PROFILE_EVERY` (every n-th analysis run by a worker
+process) and `CONTACT_MECHANICS_PROFILE_TOPOGRAPHIES` (ids of topographies
+whose analyses are always profiled). The profile of the main process is
+stored in the analysis folder in the binary format of `pstats`, which is
+read by e.g. `snakeviz` or `gprof2dot`. Worker processes solving steps and
+threads rendering deep zoom images are not profiled.
+"""
+
+import cProfile
+import itertools
+import logging
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+
+PROFILE_FILENAME = "profile.pstats"
+
+_log = logging.getLogger(__name__)
+
+# Analyses run by this process
+_analysis_counter = itertools.count(1)
+
+
+def profile_requested(topography):
+    """
+    Whether the analysis of a topography should be profiled according to the
+    settings. Each call counts as one analysis.
+    """
+    nb_analyses = next(_analysis_counter)
+    every = getattr(settings, "CONTACT_MECHANICS_PROFILE_EVERY", 0)
+    topography_ids = getattr(settings, "CONTACT_MECHANICS_PROFILE_TOPOGRAPHIES", [])
+    return (every > 0 and nb_analyses % every == 0) or getattr(
+        topography, "id", None
+    ) in topography_ids
+
+
+def run_profiled(folder, func, *args, **kwargs):
+    """
+    Call `func(*args, **kwargs)` under `cProfile` and save the profile to
+    `PROFILE_FILENAME` in the analysis folder, also if `func` fails.
+
+    Returns
+    -------
+    result : object
+        Return value of `func`.
+    saved : bool
+        Whether the profile was saved. It is not if another profiler is
+        active or if saving it failed.
+    """
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is active in this thread
+        _log.warning("Cannot profile analysis, since another profiler is active.")
+        return func(*args, **kwargs), False
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        saved = _save_profile(folder, profiler)
+    return result, saved
+
+
+def _save_profile(folder, profiler):
+    # A profile that cannot be saved must not fail the analysis
+    try:
+        with tempfile.NamedTemporaryFile(prefix="profile-", suffix=".pstats") as f:
+            profiler.dump_stats(f.name)
+            f.seek(0)
+            folder.save_file(PROFILE_FILENAME, "der", File(f))
+    except Exception:
+        _log.exception("Cannot save profile of analysis.")
+        return False
+    return True
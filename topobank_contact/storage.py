@@ -0,0 +1,452 @@
+"""
+Output of contact mechanics calculations to the analysis folder.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+
+import netCDF4
+import numpy as np
+from django.core.files import File
+from django.core.files.base import ContentFile
+from topobank.supplib.json import ExtendedJSONEncoder
+
+# Attributes of the per-step datasets that vary from step to step; they
+# become coordinates along the step dimension of the consolidated file
+STEP_ATTRIBUTES = [
+    "mean_pressure",
+    "mean_displacement",
+    "converged",
+    "total_contact_area",
+    "residual",
+    "nb_iterations",
+    "solve_time",
+    "peak_rss",
+]
+
+# Storage type of the per-step attributes; all others are float64. (The
+# classic netCDF format has no 64-bit integers.)
+STEP_ATTRIBUTE_DTYPES = {
+    "converged": np.dtype(bool),
+    "nb_iterations": np.dtype(np.int32),
+}
+
+# The blosc filters of netCDF-C fail on chunks smaller than this
+BLOSC_MIN_CHUNK_NBYTES = 128
+
+CHECKPOINT_FILENAME = "checkpoint.json"
+
+# Curves of the steps completed so far, while the calculation is running
+PARTIAL_FILENAME = "partial.json"
+
+
+def netcdf_encoding(
+    dataset,
+    format="NETCDF3_64BIT",
+    dtype=None,
+    compression=None,
+    complevel=4,
+    chunk_size=None,
+):
+    """
+    Encoding of the fields of a load step in a netCDF file.
+
+    Parameters
+    ----------
+    dataset : xarray.Dataset
+        Fields of the load step.
+    format : str, optional
+        netCDF format. Compression and chunking require 'NETCDF4'.
+        (Default: 'NETCDF3_64BIT')
+    dtype : str, optional
+        Storage type of the floating point fields, e.g. 'float32'.
+        (Default: None, i.e. the type of the data)
+    compression : str, optional
+        Compression filter of the netCDF4 library, e.g. 'zlib' or
+        'blosc_lz4'. (Default: None)
+    complevel : int, optional
+        Compression level. (Default: 4)
+    chunk_size : int, optional
+        Edge length of the square chunks the fields are stored in. Use the
+        tile size of the deep zoom images to read tiles with a single
+        chunk access. (Default: None, i.e. netCDF's default chunking)
+
+    Returns
+    -------
+    encoding : dict
+        Encoding per variable, as understood by `xarray.Dataset.to_netcdf`
+        and (apart from `dtype`) by `netCDF4.Dataset.createVariable`.
+    """
+    encoding = {}
+    for name, data_array in dataset.data_vars.items():
+        variable_encoding = {}
+        storage_dtype = data_array.dtype
+        if dtype is not None and np.issubdtype(data_array.dtype, np.floating):
+            storage_dtype = np.dtype(dtype)
+            variable_encoding["dtype"] = storage_dtype
+        if format == "NETCDF4":
+            chunksizes = data_array.shape
+            if chunk_size is not None:
+                chunksizes = tuple(min(chunk_size, n) for n in data_array.shape)
+                variable_encoding["chunksizes"] = chunksizes
+            chunk_nbytes = np.prod(chunksizes) * storage_dtype.itemsize
+            if compression is not None and not (
+                compression.startswith("blosc")
+                and chunk_nbytes < BLOSC_MIN_CHUNK_NBYTES
+            ):
+                variable_encoding["compression"] = compression
+                variable_encoding["complevel"] = complevel
+                variable_encoding["shuffle"] = True
+        encoding[name] = variable_encoding
+    return encoding
+
+
+def _create_variable(dataset, name, dtype, dimensions, **kwargs):
+    if np.dtype(dtype) == bool:
+        # netCDF has no boolean type; xarray decodes this convention
+        variable = dataset.createVariable(name, "i1", dimensions, **kwargs)
+        variable.setncattr("dtype", "bool")
+    else:
+        variable = dataset.createVariable(name, dtype, dimensions, **kwargs)
+    return variable
+
+
+def _write_netcdf(nc, dataset, tiles, encoding):
+    for name, size in dataset.sizes.items():
+        nc.createDimension(name, size)
+    for name, data_array in dataset.data_vars.items():
+        variable_encoding = encoding[name].copy()
+        dtype = variable_encoding.pop("dtype", data_array.dtype)
+        variable = _create_variable(nc, name, dtype, data_array.dims, **variable_encoding)
+        variable.setncatts(data_array.attrs)
+        for tile in tiles:
+            variable[tile] = data_array.data[tile]
+    nc.setncatts(dataset.attrs)
+
+
+def save_netcdf(filename, dataset, tiles, format="NETCDF3_64BIT", **kwargs):
+    """
+    Write the fields of a load step to a netCDF file tile by tile, such
+    that fields held in memory-mapped files are never loaded at once. The
+    file is equivalent to the one written by `xarray.Dataset.to_netcdf`
+    with the encoding of `netcdf_encoding`.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the local file.
+    dataset : xarray.Dataset
+        Fields and attributes of the step.
+    tiles : list of slice
+        Tiles of the fields, see `topobank_contact.tiles.tile_slices`.
+    format : str, optional
+        netCDF format. (Default: 'NETCDF3_64BIT')
+    **kwargs
+        Passed on to `netcdf_encoding`.
+    """
+    encoding = netcdf_encoding(dataset, format=format, **kwargs)
+    with netCDF4.Dataset(filename, "w", format=format) as nc:
+        _write_netcdf(nc, dataset, tiles, encoding)
+
+
+def netcdf_bytes(dataset, tiles=None, format="NETCDF3_64BIT", **kwargs):
+    """
+    Serialize a dataset to netCDF in memory, without a local file. The
+    content is equivalent to the file written by `save_netcdf`; files in
+    the 'NETCDF4' format are padded to a multiple of 64 KiB by the HDF5
+    library.
+
+    Parameters
+    ----------
+    dataset : xarray.Dataset
+        Fields and attributes, e.g. of a load step.
+    tiles : list of slice, optional
+        Tiles of the fields, see `topobank_contact.tiles.tile_slices`.
+        (Default: None, i.e. write each field at once)
+    format : str, optional
+        netCDF format. (Default: 'NETCDF3_64BIT')
+    **kwargs
+        Passed on to `netcdf_encoding`.
+
+    Returns
+    -------
+    content : memoryview
+        Content of the netCDF file.
+    """
+    encoding = netcdf_encoding(dataset, format=format, **kwargs)
+    # The buffer grows as needed; a larger initial size would pad the file
+    nc = netCDF4.Dataset("inmemory.nc", "w", format=format, memory=1)
+    try:
+        _write_netcdf(
+            nc, dataset, [slice(None)] if tiles is None else tiles, encoding
+        )
+    finally:
+        content = nc.close()
+    return content
+
+
+class ConsolidatedNetCDFWriter:
+    """
+    Collects the fields of all load steps of a calculation in a single
+    netCDF file with a `step` dimension.
+
+    Steps are appended to a local file as they are computed, hence only a
+    single step needs to be held in memory. The file is uploaded to the
+    analysis folder with a single storage call once all steps are written.
+    Step `i` of the file corresponds to the per-step data path `step-{i}`.
+    Fields are stored with the encoding of `netcdf_encoding`, chunked per
+    step.
+    The per-step attributes (`mean_pressure`, `mean_displacement`,
+    `converged`, `total_contact_area`, `residual`, `nb_iterations`,
+    `solve_time`, `peak_rss`) are stored as coordinate variables along the
+    step dimension, such that readers can lazily select a single
+    step or field, e.g. with
+    `xarray.open_dataset(...).pressure.isel(step=i)`.
+    """
+
+    def __init__(self, format="NETCDF3_64BIT", **kwargs):
+        self._format = format
+        self._kwargs = kwargs
+        self._tmpfile = tempfile.NamedTemporaryFile(prefix="analysis-", suffix=".nc")
+        self._dataset = None
+        self._nb_steps = 0
+
+    def __len__(self):
+        return self._nb_steps
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _create(self, dataset):
+        self._dataset = netCDF4.Dataset(self._tmpfile.name, "w", format=self._format)
+        self._dataset.createDimension("step", None)
+        for name, size in dataset.sizes.items():
+            self._dataset.createDimension(name, size)
+
+        coordinates = " ".join(STEP_ATTRIBUTES)
+        encoding = netcdf_encoding(dataset, format=self._format, **self._kwargs)
+        for name, data_array in dataset.data_vars.items():
+            variable_encoding = encoding[name].copy()
+            dtype = variable_encoding.pop("dtype", data_array.dtype)
+            if "chunksizes" in variable_encoding:
+                variable_encoding["chunksizes"] = (1,) + variable_encoding[
+                    "chunksizes"
+                ]
+            variable = _create_variable(
+                self._dataset,
+                name,
+                dtype,
+                ("step",) + data_array.dims,
+                **variable_encoding,
+            )
+            variable.setncatts(data_array.attrs)
+            variable.setncattr("coordinates", coordinates)
+        for name in STEP_ATTRIBUTES:
+            _create_variable(
+                self._dataset,
+                name,
+                STEP_ATTRIBUTE_DTYPES.get(name, np.float64),
+                ("step",),
+            )
+
+        self._dataset.setncatts(
+            {
+                name: value
+                for name, value in dataset.attrs.items()
+                if name not in STEP_ATTRIBUTES
+            }
+        )
+
+    def write_step(self, dataset, tiles=None):
+        """
+        Append a load step.
+
+        Parameters
+        ----------
+        dataset : xarray.Dataset
+            Fields and attributes of the step, as stored in the per-step
+            netCDF files.
+        tiles : list of slice, optional
+            Write the fields tile by tile, see
+            `topobank_contact.tiles.tile_slices`. (Default: None, i.e.
+            write each field at once)
+        """
+        if self._dataset is None:
+            self._create(dataset)
+        i = self._nb_steps
+        for name, data_array in dataset.data_vars.items():
+            for tile in [slice(None)] if tiles is None else tiles:
+                self._dataset.variables[name][i, tile] = data_array.data[tile]
+        for name in STEP_ATTRIBUTES:
+            self._dataset.variables[name][i] = dataset.attrs[name]
+        self._nb_steps += 1
+
+    def save(self, folder, filename):
+        """
+        Close the file and upload it to the analysis folder.
+        """
+        if self._dataset is not None:
+            self._dataset.close()
+            self._dataset = None
+        self._tmpfile.seek(0)
+        folder.save_file(filename, "der", File(self._tmpfile))
+        self._tmpfile.close()
+
+    def close(self):
+        """
+        Discard the file, unless it has been saved.
+        """
+        if self._dataset is not None:
+            self._dataset.close()
+            self._dataset = None
+        self._tmpfile.close()
+
+
+class CountingFolder:
+    """
+    Analysis folder that counts the files and bytes saved through it and
+    times the storage calls, including those of deep zoom images rendered
+    in background threads. All other attributes are those of the wrapped
+    folder.
+    """
+
+    def __init__(self, folder):
+        self._folder = folder
+        self._lock = threading.Lock()
+        self.nb_files_written = 0
+        self.nb_bytes_written = 0
+        # Storage calls by file extension, e.g. '.nc'
+        self.storage_calls = {}
+
+    def __getattr__(self, name):
+        return getattr(self._folder, name)
+
+    def save_file(self, filename, kind, file):
+        nb_bytes = file.size
+        start = time.perf_counter()
+        manifest = self._folder.save_file(filename, kind, file)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.nb_files_written += 1
+            self.nb_bytes_written += nb_bytes
+            calls = self.storage_calls.setdefault(
+                os.path.splitext(filename)[1], dict(calls=0, nb_bytes=0, time=0.0)
+            )
+            calls["calls"] += 1
+            calls["nb_bytes"] += nb_bytes
+            calls["time"] += elapsed
+        return manifest
+
+
+def save_checkpoint(folder, key, nb_steps, history, **steps):
+    """
+    Record the load steps of a calculation that are completely stored in
+    the analysis folder.
+
+    Parameters
+    ----------
+    folder : topobank.files.models.Folder
+        Analysis folder.
+    key : str
+        Key identifying the calculation, see
+        `topobank_contact.cache.result_cache_key`.
+    nb_steps : int
+        Number of completed steps; only the first `nb_steps` entries of the
+        history and of the per-step lists are stored.
+    history : tuple of lists
+        History of the calculation (mean displacements, mean gaps, mean
+        pressures, total contact areas, convergence).
+    **steps : list
+        Further per-step quantities, e.g. the number of solver iterations
+        or the storage paths of the steps.
+    """
+    checkpoint = dict(
+        key=key,
+        nb_steps=nb_steps,
+        history=[list(entries[:nb_steps]) for entries in history],
+        **{name: list(values[:nb_steps]) for name, values in steps.items()},
+    )
+    folder.save_file(
+        CHECKPOINT_FILENAME,
+        "der",
+        ContentFile(json.dumps(checkpoint, cls=ExtendedJSONEncoder).encode("utf-8")),
+    )
+
+
+def save_partial_result(folder, history, rms_height, nb_steps):
+    """
+    Publish the curves of the load steps completed so far, such that they
+    can be plotted while the calculation is running. The curves carry the
+    names, units and order (by mean pressure) of those in the result of
+    the analysis.
+
+    Parameters
+    ----------
+    folder : topobank.files.models.Folder
+        Analysis folder.
+    history : tuple of lists
+        History of the calculation (mean displacements, mean gaps, mean
+        pressures, total contact areas, convergence).
+    rms_height : float
+        Rms height of the topography; displacements and gaps are given in
+        units of it.
+    nb_steps : int
+        Total number of steps of the calculation.
+    """
+    mean_displacement, mean_gap, mean_pressure, total_contact_area, converged = (
+        np.asarray(entries) for entries in history
+    )
+    sort_order = np.argsort(mean_pressure)
+    partial_result = dict(
+        nb_steps_completed=len(mean_pressure),
+        nb_steps=nb_steps,
+        mean_pressures=mean_pressure[sort_order],
+        total_contact_areas=total_contact_area[sort_order],
+        mean_displacements=mean_displacement[sort_order] / rms_height,
+        mean_gaps=mean_gap[sort_order] / rms_height,
+        converged=converged[sort_order],
+    )
+    folder.save_file(
+        PARTIAL_FILENAME,
+        "der",
+        ContentFile(
+            json.dumps(partial_result, cls=ExtendedJSONEncoder).encode("utf-8")
+        ),
+    )
+
+
+def remove_partial_result(folder):
+    """
+    Remove the curves published by `save_partial_result` once the
+    calculation has completed and its result supersedes them.
+    """
+    if folder.exists(PARTIAL_FILENAME):
+        folder.find_file(PARTIAL_FILENAME).delete()
+
+
+def remove_checkpoint(folder):
+    """
+    Remove the checkpoint written by `save_checkpoint` once the calculation
+    has completed and there is nothing left to resume.
+    """
+    if folder.exists(CHECKPOINT_FILENAME):
+        folder.find_file(CHECKPOINT_FILENAME).delete()
+
+
+def load_checkpoint(folder, key):
+    """
+    Return the checkpoint of a calculation written by `save_checkpoint`, or
+    None if the analysis folder holds no checkpoint of this calculation.
+    """
+    if not folder.exists(CHECKPOINT_FILENAME):
+        return None
+    checkpoint = folder.read_json(CHECKPOINT_FILENAME)
+    if checkpoint.get("key") != key:
+        return None
+    return checkpoint
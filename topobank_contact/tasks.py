@@ -0,0 +1,20 @@
+"""
+Background tasks of the contact mechanics plugin.
+"""
+
+from celery import shared_task
+from topobank.analysis.models import WorkflowResult
+
+from .deepzoom import render_deepzoom_on_demand
+
+
+@shared_task
+def render_deepzoom_task(analysis_id, step, field):
+    """
+    Render the Deep Zoom Image of a field of a load step of a finished
+    analysis, as requested through `contact_mechanics_deepzoom_view`.
+    """
+    analysis = WorkflowResult.objects.get(pk=analysis_id)
+    render_deepzoom_on_demand(
+        analysis.folder, analysis.result, step, field, lock_key=analysis_id
+    )
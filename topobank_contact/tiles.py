@@ -0,0 +1,140 @@
+"""
+Out-of-core storage and tile-wise post-processing of the fields of load
+steps.
+
+Tiles are strips of consecutive rows (along x) spanning the full width of
+the topography, such that each tile is a contiguous block of the
+(C-ordered) memory-mapped files.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+
+# Fields of a load step; all but the contact mask are stored in the
+# floating point type of the calculation
+STEP_FIELDS = ["pressure", "contacting_points", "gap", "displacement"]
+
+
+def tile_slices(nb_grid_pts, tile_nbytes, itemsize=8):
+    """
+    Split a field into strips of rows of at most `tile_nbytes` bytes (but
+    at least one row).
+
+    Parameters
+    ----------
+    nb_grid_pts : tuple of int
+        Number of grid points of the field.
+    tile_nbytes : int
+        Maximum size of a tile in bytes.
+    itemsize : int, optional
+        Bytes per grid point. (Default: 8)
+
+    Returns
+    -------
+    tiles : list of slice
+        Slices along the first axis.
+    """
+    nx, ny = nb_grid_pts
+    nb_rows = max(1, int(tile_nbytes) // (ny * itemsize))
+    return [slice(i, min(i + nb_rows, nx)) for i in range(0, nx, nb_rows)]
+
+
+def _field_dtype(name, precision):
+    if name == "contacting_points":
+        return np.dtype(bool)
+    return np.dtype(np.float32 if precision == "single" else np.float64)
+
+
+def step_fields_nbytes(nb_grid_pts, precision="double"):
+    """
+    Size of the fields of a load step in bytes.
+    """
+    return int(np.prod(nb_grid_pts)) * sum(
+        _field_dtype(name, precision).itemsize for name in STEP_FIELDS
+    )
+
+
+class StepFields:
+    """
+    Fields of a load step in memory-mapped files on local disk.
+
+    The files are reused for consecutive steps and removed on `close`, or
+    on exit if used as a context manager.
+    """
+
+    def __init__(self, nb_grid_pts, precision="double", directory=None):
+        """
+        Parameters
+        ----------
+        nb_grid_pts : tuple of int
+            Number of grid points of the topography.
+        precision : str, optional
+            'double' or 'single'; floating point type of the fields.
+            (Default: 'double')
+        directory : str, optional
+            Directory the files are created in. (Default: None, i.e. the
+            default directory for temporary files)
+        """
+        self._tmpdir = tempfile.TemporaryDirectory(prefix="contact-", dir=directory)
+        self._fields = {
+            name: np.lib.format.open_memmap(
+                os.path.join(self._tmpdir.name, f"{name}.npy"),
+                mode="w+",
+                dtype=_field_dtype(name, precision),
+                shape=tuple(nb_grid_pts),
+            )
+            for name in STEP_FIELDS
+        }
+
+    def __getitem__(self, name):
+        return self._fields[name]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self._fields.clear()
+        self._tmpdir.cleanup()
+
+
+def tiled_histogram(data, tiles, bins=50, fac=1.0):
+    """
+    Probability density of the values of a field, accumulated tile by tile.
+    Equivalent to `numpy.histogram(data * fac, bins=bins, density=True)`,
+    but without temporary copies of the field.
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        Values of the field (possibly memory-mapped).
+    tiles : list of slice
+        Tiles of the field, see `tile_slices`.
+    bins : int, optional
+        Number of bins. (Default: 50)
+    fac : float, optional
+        Positive factor applied to the values. (Default: 1.0)
+
+    Returns
+    -------
+    hist : numpy.ndarray
+        Probability density of each bin.
+    edges : numpy.ndarray
+        Bin edges.
+    """
+    min_value = min(np.min(data[tile]) for tile in tiles)
+    max_value = max(np.max(data[tile]) for tile in tiles)
+    # Values are binned unscaled, which saves a scaled copy of the field.
+    # Rounding preserves order, hence min(fac * data) = fac * min(data) and
+    # the edges are those of the scaled values.
+    edges = np.histogram_bin_edges(
+        np.array([fac * min_value, fac * max_value]), bins=bins
+    )
+    counts = np.zeros(bins, dtype=np.intp)
+    for tile in tiles:
+        counts += np.histogram(data[tile], bins=bins, range=(min_value, max_value))[0]
+    return counts / np.diff(edges) / counts.sum(), edges
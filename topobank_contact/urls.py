@@ -1,6 +1,7 @@
 from django.urls import path
 
-from .views import contact_mechanics_card_view
+from .views import (contact_mechanics_card_view,
+                    contact_mechanics_deepzoom_view)
 from .workflows import APP_NAME, VIZ_CONTACT_MECHANICS
 
 # App name determines the internal name space, e.g. example can be references
@@ -18,4 +19,13 @@ urlpatterns = [
         view=contact_mechanics_card_view,
         name=f'card-{VIZ_CONTACT_MECHANICS}'
     ),
+    # GET
+    # * Renders the deep zoom image of a field of a load step if it does
+    #   not exist yet
+    # * Returns the URL of the image
+    path(
+        'deepzoom/<int:analysis_id>/<int:step>/<field>',
+        view=contact_mechanics_deepzoom_view,
+        name='deepzoom'
+    ),
 ]
@@ -1,12 +1,19 @@
 import pydantic
 from django.conf import settings
-from django.http import HttpResponseBadRequest
+from django.http import HttpResponseBadRequest, HttpResponseNotFound
+from django.shortcuts import get_object_or_404
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
+from topobank.analysis.models import WorkflowResult
 from topobank.analysis.utils import filter_and_order_analyses
 from topobank_rest_api.analysis.v1.controller import AnalysisController
 from topobank_rest_api.files.serializers import ManifestSerializer
 
+from .deepzoom import DEEPZOOM_FIELDS, DeepZoomInProgress, request_deepzoom
+from .storage import PARTIAL_FILENAME
+from .tasks import render_deepzoom_task
+from .workflows import BoundaryElementMethod
+
 
 @api_view(["GET"])
 def contact_mechanics_card_view(request, **kwargs):
@@ -28,22 +35,29 @@ def contact_mechanics_card_view(request, **kwargs):
     context = controller.get_context(request=request)
 
     #
-    # Filter only successful ones
+    # Successful analyses, and running ones that have published the curves
+    # of the load steps completed so far
     #
     analyses_success = controller.get(["su"], True)
+    analyses_running = [
+        analysis
+        for analysis in controller.get(["pe", "st"], False)
+        if analysis.folder.exists(PARTIAL_FILENAME)
+    ]
 
-    if len(analyses_success) > 0:
+    if len(analyses_success) + len(analyses_running) > 0:
         #
         # order analyses such that surface analyses are coming last (plotted on top)
         #
-        analyses_success = filter_and_order_analyses(analyses_success)
+        analyses = filter_and_order_analyses(analyses_success + analyses_running)
         data_sources_dict = []
 
         #
         # Generate two plots in two tabs based on same data sources
         #
-        for a_index, analysis in enumerate(analyses_success):
+        for a_index, analysis in enumerate(analyses):
             subject_name = analysis.subject.name
+            running = analysis.task_state != "su"
 
             #
             # Context information for this data source
@@ -54,9 +68,13 @@ def contact_mechanics_card_view(request, **kwargs):
                     "subjectName": subject_name,
                     "subjectNameIndex": a_index,
                     "url": ManifestSerializer(
-                        analysis.folder.find_file("result.json"),
+                        analysis.folder.find_file(
+                            PARTIAL_FILENAME if running else "result.json"
+                        ),
                         context={"request": request},
                     ).data["file"],
+                    # Partial curves of a running analysis; poll to update
+                    "running": running,
                     "showSymbols": True,  # otherwise symbols do not appear in legend
                     "width": 1.0,
                 }
@@ -70,3 +88,49 @@ def contact_mechanics_card_view(request, **kwargs):
     context["limitsToFunctionKwargs"] = settings.CONTACT_MECHANICS_KWARGS_LIMITS
 
     return Response(context)
+
+
+@api_view(["GET"])
+def contact_mechanics_deepzoom_view(request, analysis_id, step, field):
+    """
+    Return the URL of the Deep Zoom Image of a field of a load step of a
+    finished contact mechanics analysis. The first request queues a
+    background task rendering the image, which is then kept in the folder
+    of the analysis. Until it exists, requests receive status 202 (without
+    URL) and should retry.
+    """
+    if field not in DEEPZOOM_FIELDS:
+        return HttpResponseBadRequest(f"Unknown deep zoom field '{field}'")
+    analysis = get_object_or_404(WorkflowResult, pk=analysis_id)
+    analysis.authorize_user(request.user, "view")
+    if analysis.function.name != BoundaryElementMethod.Meta.name:
+        return HttpResponseBadRequest("Not a contact mechanics analysis")
+    if analysis.task_state != "su":
+        return HttpResponseBadRequest("Analysis has not finished successfully")
+
+    try:
+        storage_prefix = request_deepzoom(
+            analysis.folder,
+            analysis.result,
+            step,
+            field,
+            lock_key=analysis.id,
+            render=lambda step, field: render_deepzoom_task.delay(
+                analysis.id, step, field
+            ),
+        )
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    except FileNotFoundError as exc:
+        return HttpResponseNotFound(str(exc))
+    except DeepZoomInProgress:
+        return Response({"url": None}, status=202, headers={"Retry-After": "5"})
+
+    return Response(
+        {
+            "url": ManifestSerializer(
+                analysis.folder.find_file(f"{storage_prefix}/dzi.json"),
+                context={"request": request},
+            ).data["file"]
+        }
+    )
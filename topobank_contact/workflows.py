@@ -1,14 +1,19 @@
 import json
 import logging
+import multiprocessing
+import shutil
 import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import ExitStack, closing, nullcontext
 from typing import Literal, Union
 
 import numpy as np
 import xarray as xr
 from muTimer import Timer
 from pydantic import field_validator
-from ContactMechanics import (FreeFFTElasticHalfSpace,
-                              PeriodicFFTElasticHalfSpace)
+from scipy import ndimage
+from scipy.optimize import OptimizeResult
 from ContactMechanics.PlasticSystemSpecialisations import \
     PlasticNonSmoothContactSystem
 from ContactMechanics.Systems import NonSmoothContactSystem
@@ -16,22 +21,30 @@ from django.conf import settings
 from django.core.files import File
 from django.core.files.base import ContentFile
 from SurfaceTopography import PlasticTopography
-from SurfaceTopography.Support.UnitConversion import (
-    get_unit_conversion_factor, suggest_length_unit_for_data)
-from SurfaceTopography.Uniform.GeometryAnalysis import (
-    assign_patch_numbers_area, patch_areas)
+from SurfaceTopography import Topography as STTopography
+from SurfaceTopography.Support.UnitConversion import \
+    get_unit_conversion_factor
 from topobank.analysis.registry import register_implementation
 from topobank.analysis.workflows import WorkflowImplementation
 from topobank.manager.models import Topography
-from topobank.manager.utils import render_deepzoom
 from topobank.supplib.json import ExtendedJSONEncoder
 
+from .arena import SharedArena
+from .cache import ResultCache, result_cache_key, substrate_cache
+from .deepzoom import DeepZoomRenderer, render_step_deepzoom
+from .memory import available_memory, estimate_memory, peak_rss
+from .patches import patch_statistics
+from .profiling import PROFILE_FILENAME, profile_requested, run_profiled
+from .storage import (ConsolidatedNetCDFWriter, CountingFolder,
+                      load_checkpoint, netcdf_bytes, remove_checkpoint,
+                      remove_partial_result, save_checkpoint, save_netcdf,
+                      save_partial_result)
+from .tiles import (StepFields, step_fields_nbytes, tile_slices,
+                    tiled_histogram)
+
 APP_NAME = "topobank_contact"
 VIZ_CONTACT_MECHANICS = "contact-mechanics"
 
-CONTACT_MECHANICS_MAX_MB_GRID_PTS_PRODUCT = 100000000
-CONTACT_MECHANICS_MAX_MB_GRID_PTS_PER_DIM = 10000
-
 _log = logging.getLogger(__name__)
 
 
@@ -59,7 +72,770 @@ def _extract_contacting_points(opt, force_xy):
     )
 
 
-def _next_contact_step(system, history=None, pentol=None, maxiter=None):
+class _TopographyContext:
+    """
+    Quantities of the topography of a contact system that are the same for
+    all load steps of an analysis: the (undeformed) heights, materialized
+    once and read-only, their statistics and the grid constants.
+    """
+
+    def __init__(self, topography):
+        """
+        Parameters
+        ----------
+        topography : SurfaceTopography.Topography
+            Topography of the contact system. For a `PlasticTopography`,
+            the heights are those without plastic displacement.
+        """
+        try:
+            heights = topography.undeformed_profile()
+        except AttributeError:
+            heights = topography.heights()
+        # A read-only view, leaving the topography's own array writeable
+        self.heights = heights.view()
+        self.heights.flags.writeable = False
+        self.top = np.max(heights)
+        self.middle = np.mean(heights)
+        self.bot = np.min(heights)
+        self.nb_pts = np.prod(topography.nb_grid_pts)
+        self.total_area = np.prod(topography.physical_sizes)
+        self.area_per_pt = self.total_area / self.nb_pts
+
+
+def _step_fields(
+    context, force_xy, displacement_xy, offset, plastic_displ=None,
+    precision="double", out=None
+):
+    """
+    Pressure, gap and displacement fields of a solved load step.
+
+    The fields are computed with in-place operations, such that each field
+    allocates a single array in its final type (the gap of single precision
+    steps is computed in float64 first).
+
+    Parameters
+    ----------
+    context : _TopographyContext
+        Heights and grid constants of the topography.
+    force_xy : numpy.ndarray
+        Forces on the topography grid.
+    displacement_xy : numpy.ndarray
+        Displacements on the topography grid.
+    offset : float
+        Rigid body displacement of the step.
+    plastic_displ : numpy.ndarray, optional
+        Plastic displacement of the topography in this step.
+    precision : str, optional
+        'double' or 'single'; floating point type of the fields.
+        (Default: 'double')
+    out : dict of numpy.ndarray, optional
+        Arrays of the floating point type of the fields that receive the
+        'pressure', 'gap' and 'displacement' fields, e.g. a slot of a
+        `topobank_contact.arena.SharedArena`. (Default: None, i.e. the
+        fields are allocated)
+
+    Returns
+    -------
+    pressure_xy, gap_xy, displacement_xy : numpy.ndarray
+        Fields of the step.
+    """
+    dtype = np.float32 if precision == "single" else np.float64
+    if out is None:
+        out = {}
+
+    def field(name, data):
+        if name not in out:
+            return data.astype(dtype, copy=False)
+        if data is not out[name]:
+            out[name][...] = data
+        return out[name]
+
+    pressure_xy = np.divide(
+        force_xy, context.area_per_pt, out=out.get("pressure"), dtype=dtype
+    )
+    gap_xy = np.subtract(
+        displacement_xy,
+        context.heights,
+        out=out.get("gap") if dtype == np.float64 else None,
+    )
+    if plastic_displ is not None:
+        gap_xy -= plastic_displ
+    gap_xy -= offset
+    np.maximum(gap_xy, 0.0, out=gap_xy)
+    return (
+        pressure_xy,
+        field("gap", gap_xy),
+        field("displacement", displacement_xy),
+    )
+
+
+class _WarmStart:
+    """
+    Solutions of already solved load steps, used to seed the solver for
+    subsequent steps.
+
+    The solution is stored as the force field on the topography grid. Forces
+    determine the displacement field uniquely and vanish in the padding region
+    of nonperiodic calculations, hence they are a compact representation of
+    the full solution. Fields are stored in single precision; they only serve
+    as initial guess.
+    """
+
+    def __init__(self):
+        self._values = []
+        self._forces = []
+
+    def __len__(self):
+        return len(self._values)
+
+    def append(self, value, force_xy):
+        """
+        Store the solution of a step.
+
+        Parameters
+        ----------
+        value : float
+            Control value of the step, i.e. the rigid body displacement for
+            displacement-controlled and the external force for
+            load-controlled calculations.
+        force_xy : numpy.ndarray
+            Force field on the topography grid.
+        """
+        self._values.append(value)
+        self._forces.append(np.asarray(force_xy, dtype=np.float32))
+
+    def initial_forces(self, value, substrate):
+        """
+        Initial guess for the (internal) force field of the solver.
+
+        The guess is interpolated linearly between the two stored solutions
+        that bracket `value`. Steps outside of the range of solved steps are
+        solved from scratch: the closest solution is a poor guess there,
+        e.g. it is in contact where a step at smaller displacement is not.
+
+        Parameters
+        ----------
+        value : float
+            Control value of the step to be solved.
+        substrate : ContactMechanics.Substrates.ElasticSubstrate
+            Substrate of the contact system; determines the shape of the
+            computational domain.
+
+        Returns
+        -------
+        initial_forces : numpy.ndarray or None
+            Initial forces on the computational domain, or None if `value`
+            is not bracketed by stored solutions.
+        """
+        values = np.array(self._values)
+        below = np.nonzero(values <= value)[0]
+        above = np.nonzero(values >= value)[0]
+        if len(below) == 0 or len(above) == 0:
+            return None
+        i = below[np.argmax(values[below])]
+        j = above[np.argmin(values[above])]
+
+        if values[i] == values[j]:
+            force_xy = self._forces[i]
+        else:
+            w = (value - values[i]) / (values[j] - values[i])
+            force_xy = (1 - w) * self._forces[i] + w * self._forces[j]
+
+        # The solver works with forces of opposite sign on the (possibly
+        # padded) computational domain
+        initial_forces = np.zeros(substrate.nb_subdomain_grid_pts)
+        initial_forces[: force_xy.shape[0], : force_xy.shape[1]] = -force_xy
+        return initial_forces
+
+
+# Adaptive tolerances: the tolerances of a load step (on penetration, on
+# forces outside of the contact area and on the relative change of the total
+# force) grow with the square root of its predicted fractional contact area
+# above the reference area, by at most the maximum factor. The pressures of
+# the large contact patches of such steps are insensitive to small
+# penetrations. Steps with smaller contact areas keep the base tolerances.
+ADAPTIVE_TOLERANCE_REFERENCE_AREA = 0.01
+ADAPTIVE_TOLERANCE_MAX_FAC = 10
+# The iteration budget of a load step is this multiple of the iterations
+# that converged steps of similar contact area needed, but at least the
+# minimum budget
+ADAPTIVE_BUDGET_FAC = 2
+ADAPTIVE_MIN_BUDGET = 20
+# Beyond its budget, a load step stops as stalled once the largest relative
+# violation of the convergence criteria improved by less than this fraction
+# within the last `budget` iterations
+STALL_IMPROVEMENT = 0.1
+
+
+class _ToleranceSchedule:
+    """
+    Tolerances and iteration budget of each load step, chosen from the
+    contact area predicted by the history of the calculation and the
+    iterations of the converged steps.
+
+    Steps are not cut off at their budget; beyond it, a step stops early
+    once the solver stalls (see `_minimize`), and at `maxiter` at the
+    latest.
+    """
+
+    def __init__(self, maxiter):
+        """
+        Parameters
+        ----------
+        maxiter : int
+            Maximum number of iterations of any step.
+        """
+        self.maxiter = maxiter
+        self._contact_areas = []
+        self._nb_iterations = []
+
+    def append(self, contact_area, nb_iterations):
+        """
+        Record the iterations of a step that converged without stalling.
+        """
+        self._contact_areas.append(contact_area)
+        self._nb_iterations.append(nb_iterations)
+
+    def tolerances(self, history, value, values):
+        """
+        Tolerances and iteration budget of a step.
+
+        Parameters
+        ----------
+        history : tuple or None
+            History of the calculation.
+        value : float
+            Control value of the step, i.e. its rigid body displacement or
+            mean pressure.
+        values : str
+            Entry of the history holding the control values of the steps,
+            'mean_displacements' or 'mean_pressures'.
+
+        Returns
+        -------
+        tolerance_fac : float
+            Factor relaxing the tolerances of the step, see `_minimize`.
+        budget : int
+            Iteration budget of the step.
+        """
+        contact_area = None
+        if history is not None and len(history[0]) >= 2:
+            # Interpolated between the bracketing steps; outside of the
+            # solved range, the area of the closest step
+            control = np.asarray(history[0 if values == "mean_displacements" else 2])
+            sort_order = np.argsort(control)
+            contact_area = np.interp(
+                value, control[sort_order], np.asarray(history[3])[sort_order]
+            )
+
+        tolerance_fac = 1.0
+        budget = max(ADAPTIVE_MIN_BUDGET, self.maxiter // 4)
+        if contact_area is not None:
+            tolerance_fac = np.clip(
+                np.sqrt(contact_area / ADAPTIVE_TOLERANCE_REFERENCE_AREA),
+                1,
+                ADAPTIVE_TOLERANCE_MAX_FAC,
+            )
+            if len(self._contact_areas) > 0:
+                sort_order = np.argsort(self._contact_areas)
+                nb_iterations = np.interp(
+                    contact_area,
+                    np.asarray(self._contact_areas)[sort_order],
+                    np.asarray(self._nb_iterations)[sort_order],
+                )
+                budget = max(
+                    ADAPTIVE_MIN_BUDGET,
+                    int(np.ceil(ADAPTIVE_BUDGET_FAC * nb_iterations)),
+                )
+        return float(tolerance_fac), min(budget, self.maxiter)
+
+
+def _multigrid_factors(nb_grid_pts, nb_levels, min_nb_grid_pts=16):
+    """
+    Coarsening factors of the coarse levels, coarsest first. Each level
+    halves the number of grid points in each direction; levels are only
+    used if the grid is divisible and keeps at least `min_nb_grid_pts`
+    points in each direction.
+    """
+    factors = []
+    for level in range(1, nb_levels + 1):
+        factor = 2**level
+        if any(n % factor != 0 or n // factor < min_nb_grid_pts for n in nb_grid_pts):
+            break
+        factors.insert(0, factor)
+    return factors
+
+
+class _Multigrid:
+    """
+    Coarse-to-fine initialization of the solver.
+
+    A load step is first solved on coarsened copies of the topography
+    (block averages of 2^level × 2^level pixels), coarsest first. The
+    displacement field of each level is linearly interpolated to the next
+    finer level and serves as initial guess there. The displacement field
+    interpolated to the full resolution is the initial guess of the actual
+    calculation. Displacements are smooth and interpolate well, unlike the
+    forces, which concentrate at the edges of the contact patches.
+    """
+
+    def __init__(self, topography, substrate_str, hardness, nb_levels, timer=None):
+        """
+        Parameters
+        ----------
+        topography : SurfaceTopography.Topography
+            Topography of the rigid counterbody (at full resolution).
+        substrate_str : str
+            Boundary conditions, 'periodic' or 'nonperiodic'.
+        hardness : float or None
+            Hardness of the substrate in units of E*.
+        nb_levels : int
+            Maximum number of coarse levels.
+        timer : muTimer.Timer, optional
+            The solution of each level is timed in the section 'multigrid
+            level {level}'. The solver iterations of the levels are returned
+            by `initial_displacements`.
+        """
+        self._timer = timer
+        self._periodic = topography.is_periodic
+        heights = topography.heights()
+        self._levels = []
+        for factor in _multigrid_factors(topography.nb_grid_pts, nb_levels):
+            nx, ny = topography.nb_grid_pts
+            coarse_topography = STTopography(
+                heights.reshape(nx // factor, factor, ny // factor, factor).mean(
+                    axis=(1, 3)
+                ),
+                topography.physical_sizes,
+                periodic=topography.is_periodic,
+                unit=topography.unit,
+            )
+            self._levels.append(
+                (
+                    int(np.log2(factor)),
+                    _make_system(coarse_topography, substrate_str, hardness),
+                )
+            )
+
+    @property
+    def nb_levels(self):
+        """Number of coarse levels actually used."""
+        return len(self._levels)
+
+    def _time(self, name):
+        if self._timer is None:
+            return nullcontext()
+        return self._timer(name)
+
+    def initial_displacements(self, pentol=None, maxiter=None, **kwargs):
+        """
+        Initial guess for the displacement field of the solver.
+
+        Parameters
+        ----------
+        **kwargs
+            Control value of the step, i.e. `offset` or `external_force`,
+            passed on to `minimize_proxy`.
+
+        Returns
+        -------
+        initial_displacements : numpy.ndarray or None
+            Initial displacements on the computational domain, or None if
+            there are no coarse levels.
+        nb_iterations : list of int
+            Number of solver iterations on each level, coarsest first.
+        """
+        displacements = None
+        nb_iterations = []
+        for level, system in self._levels:
+            try:
+                system.surface.plastic_displ = np.zeros_like(
+                    system.surface.plastic_displ
+                )
+            except AttributeError:
+                pass
+            with self._time(f"multigrid level {level}"):
+                opt = system.minimize_proxy(
+                    pentol=pentol,
+                    maxiter=maxiter,
+                    initial_displacements=self._prolong(displacements),
+                    **kwargs,
+                )
+            nb_iterations.append(opt.nit)
+            displacements = opt.x
+
+        return self._prolong(displacements), nb_iterations
+
+    def _prolong(self, displacements):
+        if displacements is None:
+            return None
+        # Displacements cover the (possibly padded) computational domain,
+        # which doubles in size with each level
+        return ndimage.zoom(
+            displacements,
+            2,
+            order=1,
+            mode="grid-wrap" if self._periodic else "nearest",
+            grid_mode=True,
+        )
+
+
+# Tolerances of double precision calculations on the forces outside of the
+# contact area and on the relative change of the total force; these are the
+# defaults of the solver
+FORCETOL = 1e-5
+THERMOTOL = 1e-6
+
+# Relaxed tolerances of calculations that first solve each step to lower
+# accuracy. On random rough topographies, this saved 15-40% of the
+# iterations at fractional contact areas that differ by about 1e-4 from
+# those at the default tolerances.
+RELAXED_PENTOL_FAC = 10
+RELAXED_FORCETOL = 1e-3
+RELAXED_THERMOTOL = 1e-4
+
+
+class _Stalled(Exception):
+    pass
+
+
+class _StallMonitor:
+    """
+    Solver callback that raises `_Stalled` once the solver makes no
+    progress. The progress is measured by the largest relative violation of
+    the convergence criteria on penetration and pressure; the solver stalls
+    if, beyond `budget` iterations, its best value improved by less than
+    `STALL_IMPROVEMENT` within the last `budget` iterations. Plastic
+    calculations converge on the change of the displacements, which the
+    solver does not report; they stall once they exceed twice their budget.
+    """
+
+    def __init__(self, budget, plastic=False):
+        self.budget = budget
+        self.plastic = plastic
+        self.nb_iterations = 0
+        self.forces = None
+        self._violations = []
+
+    def _stall(self, forces):
+        # The solver's internal forces, i.e. of opposite sign
+        self.forces = forces.copy()
+        raise _Stalled
+
+    def __call__(self, it, forces, values):
+        self.nb_iterations = it
+        if self.plastic:
+            if it > 2 * self.budget:
+                self._stall(forces)
+            return
+        self._violations.append(
+            max(
+                values["max_penetration"] / values["penetration_tol"],
+                values["max_pressure"] / values["pressure_tol"],
+                values["pad_pressure"] / values["pressure_tol"],
+            )
+        )
+        if it > self.budget:
+            best_before = min(self._violations[: -self.budget])
+            best_recently = min(self._violations[-self.budget:])
+            if best_recently > (1 - STALL_IMPROVEMENT) * best_before:
+                self._stall(forces)
+
+
+def _minimize(
+    system,
+    pentol=None,
+    maxiter=None,
+    relaxed_tolerances=False,
+    refinement_maxiter=0,
+    initial_forces=None,
+    initial_displacements=None,
+    tolerance_fac=1.0,
+    budget=None,
+    **kwargs,
+):
+    """
+    Solve the contact problem of a load step.
+
+    With relaxed tolerances, the solver stops at the tolerances above. The
+    solution is then optionally refined by at most `refinement_maxiter`
+    further iterations at the default tolerances. The solver always
+    computes in double precision, since the FFT engine of the elastic
+    half-space supports no other; the floating point type of the fields
+    kept by the step functions is independent of the tolerances.
+
+    Parameters
+    ----------
+    system : ContactMechanics.Systems.SystemBase
+        The contact mechanical system.
+    pentol : float, optional
+        Penetration tolerance at the default tolerances. (Default: None,
+        i.e. the default of the solver, which is not relaxed)
+    maxiter : int, optional
+        Maximum number of iterations.
+    relaxed_tolerances : bool, optional
+        Solve to the relaxed tolerances `RELAXED_PENTOL_FAC`,
+        `RELAXED_FORCETOL` and `RELAXED_THERMOTOL`. (Default: False)
+    refinement_maxiter : int, optional
+        Maximum number of iterations refining solutions at relaxed
+        tolerances. (Default: 0, i.e. no refinement)
+    initial_forces : numpy.ndarray, optional
+        Initial guess of the forces.
+    initial_displacements : numpy.ndarray, optional
+        Initial guess of the displacements.
+    tolerance_fac : float, optional
+        Factor relaxing all tolerances. (Default: 1.0)
+    budget : int, optional
+        Iteration budget; beyond it, the solver stops early once it stalls,
+        see `_StallMonitor`. (Default: None, i.e. the solver runs until
+        convergence or `maxiter`)
+    **kwargs
+        Control value of the step, i.e. `offset` or `external_force`,
+        passed on to `minimize_proxy`.
+
+    Returns
+    -------
+    opt : scipy.optimize.OptimizeResult
+        Result of the optimizer. `nit` counts the iterations of the solution
+        and its refinement, and `success` reports whether the refinement
+        (if any) converged at the default tolerances. In addition, the
+        result reports whether the solution at relaxed tolerances converged
+        (`relaxed_success`, False without relaxed tolerances), the maximum
+        penetration of the solution (`residual`), the iterations of the
+        refinement (`refinement_nb_iterations`) and the change of the
+        fractional contact area by the refinement
+        (`refinement_contact_area_difference`), the wall time of the
+        solver in seconds (`solve_time`), the penetration tolerance of the
+        solution (`pentol`) and whether the solver stopped because it stalled
+        (`stalled`).
+    """
+    start_time = time.perf_counter()
+    default_tolerances = dict(
+        forcetol=tolerance_fac * FORCETOL,
+        thermotol=tolerance_fac * THERMOTOL,
+    )
+    tolerances = default_tolerances
+    if relaxed_tolerances:
+        tolerances = dict(
+            forcetol=tolerance_fac * RELAXED_FORCETOL,
+            thermotol=tolerance_fac * RELAXED_THERMOTOL,
+        )
+    if pentol is not None:
+        default_tolerances["pentol"] = tolerance_fac * pentol
+        if relaxed_tolerances:
+            tolerances["pentol"] = tolerance_fac * RELAXED_PENTOL_FAC * pentol
+    monitor = None
+    if budget is not None:
+        monitor = _StallMonitor(
+            budget, plastic=isinstance(system, PlasticNonSmoothContactSystem)
+        )
+    stalled = False
+    try:
+        opt = system.minimize_proxy(
+            maxiter=maxiter,
+            initial_forces=initial_forces,
+            initial_displacements=initial_displacements,
+            callback=monitor,
+            **tolerances,
+            **kwargs,
+        )
+    except _Stalled:
+        # A single iteration from the forces at which the solver stalled
+        # yields the fields of the (unconverged) solution
+        stalled = True
+        try:
+            system.surface.plastic_displ = np.zeros_like(system.surface.plastic_displ)
+        except AttributeError:
+            pass
+        opt = system.minimize_proxy(
+            maxiter=1, initial_forces=monitor.forces, **tolerances, **kwargs
+        )
+        opt.nit += monitor.nb_iterations
+    refinement_nb_iterations = 0
+    refinement_contact_area_difference = 0.0
+    if relaxed_tolerances and refinement_maxiter > 0:
+        contact_area = np.mean(_extract_contacting_points(opt, opt.jac))
+        # The refinement is seeded with the forces of the solution, like a
+        # warm start, and hence starts from a fresh plastic displacement
+        try:
+            system.surface.plastic_displ = np.zeros_like(system.surface.plastic_displ)
+        except AttributeError:
+            pass
+        initial_forces = np.zeros(system.substrate.nb_subdomain_grid_pts)
+        initial_forces[: opt.jac.shape[0], : opt.jac.shape[1]] = -opt.jac
+        refined_opt = system.minimize_proxy(
+            maxiter=refinement_maxiter,
+            initial_forces=initial_forces,
+            **default_tolerances,
+            **kwargs,
+        )
+        refinement_nb_iterations = refined_opt.nit
+        refinement_contact_area_difference = (
+            np.mean(_extract_contacting_points(refined_opt, refined_opt.jac))
+            - contact_area
+        )
+        refined_opt.nit += opt.nit
+        refined_opt.relaxed_success = opt.success
+        opt = refined_opt
+    elif relaxed_tolerances:
+        opt.relaxed_success = opt.success
+    else:
+        opt.relaxed_success = False
+    opt.residual = float(opt.maxcv["max_pen"])
+    opt.refinement_nb_iterations = refinement_nb_iterations
+    opt.refinement_contact_area_difference = float(refinement_contact_area_difference)
+    opt.solve_time = time.perf_counter() - start_time
+    opt.pentol = tolerances.get("pentol")
+    opt.stalled = stalled
+    return opt
+
+
+def _propose_mean_displacements(history, top, middle, bot, nb_pts, nb_proposals=1):
+    """
+    Propose rigid body displacements for the next load steps, such that
+    contact areas are approximately equally spaced on a log scale.
+
+    The widest gap in (log) contact area is filled first. For more than one
+    proposal, the contact area at each proposed displacement is estimated by
+    interpolating the log contact area, and the next proposal fills the
+    widest remaining gap. A wide gap can hence receive several proposals.
+
+    Parameters
+    ----------
+    history : tuple
+        History returned by past calls to next_step
+    top : float
+        Maximum height of the topography.
+    middle : float
+        Mean height of the topography.
+    bot : float
+        Minimum height of the topography.
+    nb_pts : int
+        Total number of grid points of the topography.
+    nb_proposals : int, optional
+        Number of displacements to propose. (Default: 1)
+
+    Returns
+    -------
+    mean_displacements : list of float
+        Proposed rigid body displacements. Fewer than `nb_proposals` values
+        are returned while the first two (initial) steps are proposed.
+    """
+    step = 0 if history is None else len(history[0])
+
+    if step < 2:
+        initial_displacements = [-middle, -top + 0.01 * (top - middle)]
+        return initial_displacements[step: step + nb_proposals]
+
+    mean_displacements, _, _, total_contact_areas, _ = history
+
+    # Intermediate sort by area
+    sorted_disp, sorted_area = np.transpose(
+        sorted(zip(mean_displacements, total_contact_areas), key=lambda x: x[1])
+    )
+    sorted_disp = list(sorted_disp)
+    ref_area = list(np.log10(np.array(sorted_area + 1 / nb_pts)))
+
+    proposals = []
+    for _ in range(nb_proposals):
+        darea = np.append(np.diff(ref_area), -ref_area[-1])
+        i = np.argmax(darea)
+        if i == len(ref_area) - 1:
+            mean_displacement = bot + 2 * (sorted_disp[-1] - bot)
+            sorted_disp.append(mean_displacement)
+            ref_area.append(ref_area[-1] / 2)
+        else:
+            mean_displacement = (sorted_disp[i] + sorted_disp[i + 1]) / 2
+            sorted_disp.insert(i + 1, mean_displacement)
+            ref_area.insert(i + 1, (ref_area[i] + ref_area[i + 1]) / 2)
+        proposals.append(mean_displacement)
+
+    return proposals
+
+
+# Searches for a target fractional contact area stop once the area is within
+# this relative tolerance of the target (or within one grid point), or after
+# this number of solves, keeping the solve closest to the target
+CONTACT_AREA_RTOL = 0.05
+CONTACT_AREA_MAXSOLVES = 8
+
+
+def _propose_contact_area_displacement(contact_area, solves, context):
+    """
+    Propose the rigid body displacement of the next solve searching a target
+    fractional contact area.
+
+    If previous solves bracket the target, the displacement is found by
+    secant interpolation of the log contact area between the closest solves
+    below and above it, and otherwise by secant extrapolation from the two
+    solves closest to the target. With fewer than two solves in contact,
+    the displacement is chosen such that the geometric overlap of the
+    undeformed heights (the fraction of heights above minus the
+    displacement) matches the target, corrected by the ratio of geometric
+    overlap and contact area of the previous solve.
+
+    Parameters
+    ----------
+    contact_area : float
+        Target fractional contact area.
+    solves : list of tuple
+        Rigid body displacement and fractional contact area of each
+        previous solve.
+    context : _TopographyContext
+        Heights and grid constants of the topography.
+
+    Returns
+    -------
+    mean_displacement : float
+        Proposed rigid body displacement.
+    """
+
+    def log_area(area):
+        return np.log(area + 1 / context.nb_pts)
+
+    def secant(solve1, solve2):
+        (d1, a1), (d2, a2) = solve1, solve2
+        w = (log_area(contact_area) - log_area(a1)) / (log_area(a2) - log_area(a1))
+        return d1 + w * (d2 - d1)
+
+    below = [(d, a) for d, a in solves if a < contact_area]
+    above = [(d, a) for d, a in solves if a >= contact_area]
+    if below and above:
+        return secant(
+            max(below, key=lambda solve: solve[1]),
+            min(above, key=lambda solve: solve[1]),
+        )
+
+    # Solves without contact carry no information on the displacement
+    solves = sorted(
+        [(d, a) for d, a in solves if a > 0],
+        key=lambda solve: abs(log_area(solve[1]) - log_area(contact_area)),
+    )
+    if solves:
+        closest = [solves[0]] + [
+            solve for solve in solves[1:] if solve[1] != solves[0][1]
+        ][:1]
+        if len(closest) == 2:
+            return secant(*closest)
+
+    # The contact area of an elastic solid is smaller than the geometric
+    # overlap, by a ratio that changes slowly with the displacement
+    ratio = 1
+    if solves:
+        d, a = solves[0]
+        overlap = np.mean(context.heights > -d)
+        if overlap > 0:
+            ratio = overlap / a
+    overlap = min(ratio * contact_area, 1 - 1 / context.nb_pts)
+    return -np.quantile(context.heights, 1 - overlap)
+
+
+def _next_contact_step(
+    system, history=None, pentol=None, maxiter=None, warm_start=None,
+    mean_displacement=None, multigrid=None, precision="double",
+    relaxed_tolerances=False, refinement_maxiter=0, context=None,
+    tolerance_schedule=None, out=None
+):
     """
     Run a full contact calculation. Try to guess displacement such that areas
     are equally spaced on a log scale.
@@ -70,6 +846,30 @@ def _next_contact_step(system, history=None, pentol=None, maxiter=None):
         The contact mechanical system.
     history : tuple
         History returned by past calls to next_step
+    warm_start : _WarmStart, optional
+        Solutions of previous steps. If given, the solver is seeded with an
+        interpolation of the solutions bracketing this step in rigid body
+        displacement, and the solution of this step is added to it.
+    mean_displacement : float, optional
+        Rigid body displacement of this step. If None, the displacement is
+        chosen from the history by `_propose_mean_displacements`.
+    multigrid : _Multigrid, optional
+        Coarse levels used to initialize the solver if there is no warm
+        start solution.
+    precision : str, optional
+        'double' or 'single'; fields of single precision steps are returned
+        as float32. (Default: 'double')
+    relaxed_tolerances : bool, optional
+        Solve to relaxed tolerances, see `_minimize`. (Default: False)
+    refinement_maxiter : int, optional
+        Maximum number of iterations refining solutions at relaxed
+        tolerances. (Default: 0)
+    tolerance_schedule : _ToleranceSchedule, optional
+        If given, the penetration tolerance and iteration budget of this
+        step are chosen by the schedule, and the step is recorded in it.
+    out : dict of numpy.ndarray, optional
+        Arrays receiving the fields of the step, see `_step_fields`; the
+        contact mask is written to 'contacting_points'.
 
     Returns
     -------
@@ -85,6 +885,8 @@ def _next_contact_step(system, history=None, pentol=None, maxiter=None):
         Current fractional contact area.
     history : tuple
         History of contact calculations.
+    opt : scipy.optimize.OptimizeResult
+        Result of the optimizer, reporting e.g. the number of iterations.
     """
 
     # Get topography object from contact system
@@ -101,13 +903,9 @@ def _next_contact_step(system, history=None, pentol=None, maxiter=None):
     # Get substrate object from contact system
     substrate = system.substrate
 
-    # Get the profile as a numpy array
-    heights = topography.heights()
-
-    # Find max, min and mean heights
-    top = np.max(heights)
-    middle = np.mean(heights)
-    bot = np.min(heights)
+    # Heights, their statistics and grid constants
+    if context is None:
+        context = _TopographyContext(topography)
 
     if history is None:
         step = 0
@@ -121,6 +919,11 @@ def _next_contact_step(system, history=None, pentol=None, maxiter=None):
         ) = history
         step = len(mean_displacements)
 
+    if mean_displacement is None:
+        (mean_displacement,) = _propose_mean_displacements(
+            history, context.top, context.middle, context.bot, context.nb_pts
+        )
+
     if step == 0:
         mean_displacements = []
         mean_gaps = []
@@ -128,26 +931,33 @@ def _next_contact_step(system, history=None, pentol=None, maxiter=None):
         total_contact_areas = []
         converged = np.array([], dtype=bool)
 
-        mean_displacement = -middle
-    elif step == 1:
-        mean_displacement = -top + 0.01 * (top - middle)
-    else:
-        # Intermediate sort by area
-        sorted_disp, sorted_area = np.transpose(
-            sorted(zip(mean_displacements, total_contact_areas), key=lambda x: x[1])
+    tolerance_fac, budget = 1.0, None
+    if tolerance_schedule is not None:
+        tolerance_fac, budget = tolerance_schedule.tolerances(
+            history, mean_displacement, "mean_displacements"
         )
 
-        ref_area = np.log10(np.array(sorted_area + 1 / np.prod(topography.nb_grid_pts)))
-        darea = np.append(ref_area[1:] - ref_area[:-1], -ref_area[-1])
-        i = np.argmax(darea)
-        if i == step - 1:
-            mean_displacement = bot + 2 * (sorted_disp[-1] - bot)
-        else:
-            mean_displacement = (sorted_disp[i] + sorted_disp[i + 1]) / 2
-
-    opt = system.minimize_proxy(
-        offset=mean_displacement, pentol=pentol, maxiter=maxiter
+    initial_forces = None
+    if warm_start is not None:
+        initial_forces = warm_start.initial_forces(mean_displacement, substrate)
+    initial_displacements = None
+    multigrid_nb_iterations = []
+    if initial_forces is None and multigrid is not None:
+        initial_displacements, multigrid_nb_iterations = (
+            multigrid.initial_displacements(
+                pentol=pentol, maxiter=maxiter, offset=mean_displacement
+            )
+        )
+    opt = _minimize(
+        system, pentol=pentol, maxiter=maxiter,
+        relaxed_tolerances=relaxed_tolerances,
+        refinement_maxiter=refinement_maxiter, initial_forces=initial_forces,
+        initial_displacements=initial_displacements,
+        tolerance_fac=tolerance_fac, budget=budget,
+        offset=mean_displacement
     )
+    opt.multigrid_nb_iterations = multigrid_nb_iterations
+    opt.warm_started = initial_forces is not None
     force_xy = opt.jac
     displacement_xy = opt.x[: force_xy.shape[0], : force_xy.shape[1]]
     contacting_points_xy = _extract_contacting_points(opt, force_xy)
@@ -155,31 +965,36 @@ def _next_contact_step(system, history=None, pentol=None, maxiter=None):
     # Use list append for efficiency, convert to arrays only when needed
     if isinstance(mean_displacements, list):
         mean_displacements.append(mean_displacement)
-        mean_gaps.append(np.mean(displacement_xy) - middle - mean_displacement)
-        mean_load = force_xy.sum() / np.prod(topography.physical_sizes)
+        mean_gaps.append(np.mean(displacement_xy) - context.middle - mean_displacement)
+        mean_load = force_xy.sum() / context.total_area
         mean_pressures.append(mean_load)
-        total_contact_area = contacting_points_xy.sum() / np.prod(
-            topography.nb_grid_pts
-        )
+        total_contact_area = contacting_points_xy.sum() / context.nb_pts
         total_contact_areas.append(total_contact_area)
         converged = np.append(converged, np.array([opt.success], dtype=bool))
     else:
         mean_displacements = np.append(mean_displacements, [mean_displacement])
         mean_gaps = np.append(
-            mean_gaps, [np.mean(displacement_xy) - middle - mean_displacement]
+            mean_gaps, [np.mean(displacement_xy) - context.middle - mean_displacement]
         )
-        mean_load = force_xy.sum() / np.prod(topography.physical_sizes)
+        mean_load = force_xy.sum() / context.total_area
         mean_pressures = np.append(mean_pressures, [mean_load])
-        total_contact_area = contacting_points_xy.sum() / np.prod(
-            topography.nb_grid_pts
-        )
+        total_contact_area = contacting_points_xy.sum() / context.nb_pts
         total_contact_areas = np.append(total_contact_areas, [total_contact_area])
         converged = np.append(converged, np.array([opt.success], dtype=bool))
 
-    area_per_pt = substrate.area_per_pt
-    pressure_xy = force_xy / area_per_pt
-    gap_xy = displacement_xy - topography.heights() - opt.offset
-    gap_xy[gap_xy < 0.0] = 0.0
+    if warm_start is not None:
+        warm_start.append(mean_displacement, force_xy)
+    if tolerance_schedule is not None and opt.success and not opt.stalled:
+        tolerance_schedule.append(total_contact_area, opt.nit)
+
+    pressure_xy, gap_xy, displacement_xy = _step_fields(
+        context, force_xy, displacement_xy, opt.offset,
+        plastic_displ=getattr(topography, "plastic_displ", None),
+        precision=precision, out=out
+    )
+    if out is not None:
+        out["contacting_points"][...] = contacting_points_xy
+        contacting_points_xy = out["contacting_points"]
 
     return (
         displacement_xy,
@@ -190,11 +1005,15 @@ def _next_contact_step(system, history=None, pentol=None, maxiter=None):
         mean_load,
         total_contact_area,
         (mean_displacements, mean_gaps, mean_pressures, total_contact_areas, converged),
+        opt,
     )
 
 
 def _contact_at_given_load(
-    system, external_force, history=None, pentol=None, maxiter=None
+    system, external_force, history=None, pentol=None, maxiter=None,
+    warm_start=None, multigrid=None, precision="double",
+    relaxed_tolerances=False, refinement_maxiter=0, context=None,
+    tolerance_schedule=None, out=None
 ):
     """
     Run a full contact calculation at a given external load.
@@ -207,6 +1026,27 @@ def _contact_at_given_load(
         The force pushing the surfaces together.
     history : tuple
         History returned by past calls to next_step
+    warm_start : _WarmStart, optional
+        Solutions of previous steps. If given, the solver is seeded with an
+        interpolation of the solutions bracketing this step in external
+        force, and the solution of this step is added to it.
+    multigrid : _Multigrid, optional
+        Coarse levels used to initialize the solver if there is no warm
+        start solution.
+    precision : str, optional
+        'double' or 'single'; fields of single precision steps are returned
+        as float32. (Default: 'double')
+    relaxed_tolerances : bool, optional
+        Solve to relaxed tolerances, see `_minimize`. (Default: False)
+    refinement_maxiter : int, optional
+        Maximum number of iterations refining solutions at relaxed
+        tolerances. (Default: 0)
+    tolerance_schedule : _ToleranceSchedule, optional
+        If given, the penetration tolerance and iteration budget of this
+        step are chosen by the schedule, and the step is recorded in it.
+    out : dict of numpy.ndarray, optional
+        Arrays receiving the fields of the step, see `_step_fields`; the
+        contact mask is written to 'contacting_points'.
 
     Returns
     -------
@@ -222,6 +1062,8 @@ def _contact_at_given_load(
         Current fractional contact area.
     history : tuple
         History of contact calculations.
+    opt : scipy.optimize.OptimizeResult
+        Result of the optimizer, reporting e.g. the number of iterations.
     """
 
     # Get topography object from contact system
@@ -238,11 +1080,9 @@ def _contact_at_given_load(
     # Get substrate object from contact system
     substrate = system.substrate
 
-    # Get the profile as a numpy array
-    heights = topography.heights()
-
-    # Find max, min and mean heights
-    middle = np.mean(heights)
+    # Heights, their statistics and grid constants
+    if context is None:
+        context = _TopographyContext(topography)
 
     if history is None:
         mean_displacements = []
@@ -259,9 +1099,33 @@ def _contact_at_given_load(
             converged,
         ) = history
 
-    opt = system.minimize_proxy(
-        external_force=external_force, pentol=pentol, maxiter=maxiter
+    tolerance_fac, budget = 1.0, None
+    if tolerance_schedule is not None:
+        tolerance_fac, budget = tolerance_schedule.tolerances(
+            history, external_force / context.total_area, "mean_pressures"
+        )
+
+    initial_forces = None
+    if warm_start is not None:
+        initial_forces = warm_start.initial_forces(external_force, substrate)
+    initial_displacements = None
+    multigrid_nb_iterations = []
+    if initial_forces is None and multigrid is not None:
+        initial_displacements, multigrid_nb_iterations = (
+            multigrid.initial_displacements(
+                pentol=pentol, maxiter=maxiter, external_force=external_force
+            )
+        )
+    opt = _minimize(
+        system, pentol=pentol, maxiter=maxiter,
+        relaxed_tolerances=relaxed_tolerances,
+        refinement_maxiter=refinement_maxiter, initial_forces=initial_forces,
+        initial_displacements=initial_displacements,
+        tolerance_fac=tolerance_fac, budget=budget,
+        external_force=external_force
     )
+    opt.multigrid_nb_iterations = multigrid_nb_iterations
+    opt.warm_started = initial_forces is not None
     force_xy = opt.jac
     displacement_xy = opt.x[: force_xy.shape[0], : force_xy.shape[1]]
     contacting_points_xy = _extract_contacting_points(opt, force_xy)
@@ -269,29 +1133,34 @@ def _contact_at_given_load(
     # Use list append for efficiency, convert to arrays only when needed
     if isinstance(mean_displacements, list):
         mean_displacements.append(opt.offset)
-        mean_gaps.append(np.mean(displacement_xy) - middle - opt.offset)
-        mean_load = force_xy.sum() / np.prod(topography.physical_sizes)
+        mean_gaps.append(np.mean(displacement_xy) - context.middle - opt.offset)
+        mean_load = force_xy.sum() / context.total_area
         mean_pressures.append(mean_load)
-        total_contact_area = contacting_points_xy.sum() / np.prod(
-            topography.nb_grid_pts
-        )
+        total_contact_area = contacting_points_xy.sum() / context.nb_pts
         total_contact_areas.append(total_contact_area)
         converged = np.append(converged, np.array([opt.success], dtype=bool))
     else:
         mean_displacements = np.append(mean_displacements, [opt.offset])
-        mean_gaps = np.append(mean_gaps, [np.mean(displacement_xy) - middle - opt.offset])
-        mean_load = force_xy.sum() / np.prod(topography.physical_sizes)
+        mean_gaps = np.append(mean_gaps, [np.mean(displacement_xy) - context.middle - opt.offset])
+        mean_load = force_xy.sum() / context.total_area
         mean_pressures = np.append(mean_pressures, [mean_load])
-        total_contact_area = contacting_points_xy.sum() / np.prod(
-            topography.nb_grid_pts
-        )
+        total_contact_area = contacting_points_xy.sum() / context.nb_pts
         total_contact_areas = np.append(total_contact_areas, [total_contact_area])
         converged = np.append(converged, np.array([opt.success], dtype=bool))
 
-    area_per_pt = substrate.area_per_pt
-    pressure_xy = force_xy / area_per_pt
-    gap_xy = displacement_xy - topography.heights() - opt.offset
-    gap_xy[gap_xy < 0.0] = 0.0
+    if warm_start is not None:
+        warm_start.append(external_force, force_xy)
+    if tolerance_schedule is not None and opt.success and not opt.stalled:
+        tolerance_schedule.append(total_contact_area, opt.nit)
+
+    pressure_xy, gap_xy, displacement_xy = _step_fields(
+        context, force_xy, displacement_xy, opt.offset,
+        plastic_displ=getattr(topography, "plastic_displ", None),
+        precision=precision, out=out
+    )
+    if out is not None:
+        out["contacting_points"][...] = contacting_points_xy
+        contacting_points_xy = out["contacting_points"]
 
     return (
         displacement_xy,
@@ -302,8 +1171,706 @@ def _contact_at_given_load(
         mean_load,
         total_contact_area,
         (mean_displacements, mean_gaps, mean_pressures, total_contact_areas, converged),
+        opt,
+    )
+
+
+def _make_system(topography, substrate_str, hardness, timer=None):
+    """
+    Set up the contact mechanical system for a topography.
+
+    Parameters
+    ----------
+    topography : SurfaceTopography.Topography
+        Topography of the rigid counterbody.
+    substrate_str : str
+        Boundary conditions, 'periodic' or 'nonperiodic'.
+    hardness : float or None
+        Hardness of the substrate in units of E*. The calculation is purely
+        elastic if this is None or zero.
+    timer : muTimer.Timer, optional
+        Timer for the setup of the substrate.
+
+    Returns
+    -------
+    system : ContactMechanics.Systems.SystemBase
+        The contact mechanical system.
+    """
+    if (hardness is not None) and (hardness > 0):
+        topography = PlasticTopography(topography, hardness)
+
+    # Half-spaces of equal grids are reused within a worker process, up to
+    # the configured memory
+    substrate_cache.max_nbytes = (
+        getattr(settings, "CONTACT_MECHANICS_SUBSTRATE_CACHE_MB", 0) * 1024 * 1024
+    )
+    substrate = substrate_cache.get(
+        topography.nb_grid_pts,
+        topography.physical_sizes,
+        substrate_str == "periodic",
+        timer=timer,
     )
 
+    if (hardness is not None) and (hardness > 0):
+        return PlasticNonSmoothContactSystem(substrate=substrate, surface=topography)
+    else:
+        return NonSmoothContactSystem(substrate=substrate, surface=topography)
+
+
+def _append_history(history, step_history):
+    """
+    Append the entries of a (single step) history to a history.
+    """
+    if history is None:
+        return step_history
+    return tuple(
+        np.append(entries, step_entries)
+        if isinstance(entries, np.ndarray)
+        else list(entries) + list(step_entries)
+        for entries, step_entries in zip(history, step_history)
+    )
+
+
+def _strip_optimize_result(opt):
+    """
+    Remove all fields from an optimization result, leaving only scalars that
+    are cheap to pass between processes.
+    """
+    return OptimizeResult(
+        {key: value for key, value in opt.items() if not isinstance(value, np.ndarray)}
+    )
+
+
+def _contact_steps(
+    system,
+    nsteps,
+    external_forces=None,
+    pentol=None,
+    maxiter=None,
+    warm_start=None,
+    multigrid=None,
+    precision="double",
+    relaxed_tolerances=False,
+    refinement_maxiter=0,
+    context=None,
+    tolerance_schedule=None,
+    history=None,
+    start=0,
+    progress_recorder=None,
+    timer=None,
+):
+    """
+    Run contact calculations for all load steps, one after the other.
+
+    Parameters
+    ----------
+    system : ContactMechanics.Systems.SystemBase
+        The contact mechanical system.
+    nsteps : int
+        Number of load steps.
+    external_forces : list of float, optional
+        External forces of the steps. If None, the calculation is
+        displacement controlled and displacements are chosen by
+        `_next_contact_step`.
+    warm_start : _WarmStart, optional
+        Solutions of previous steps used to seed the solver.
+    multigrid : _Multigrid, optional
+        Coarse levels used to initialize the solver.
+    precision : str, optional
+        'double' or 'single'; floating point type of the fields of the
+        steps. (Default: 'double')
+    relaxed_tolerances : bool, optional
+        Solve to relaxed tolerances, see `_minimize`. (Default: False)
+    refinement_maxiter : int, optional
+        Maximum number of iterations refining solutions at relaxed
+        tolerances. (Default: 0)
+    context : _TopographyContext, optional
+        Heights and grid constants of the topography of the system.
+        (Default: None, i.e. computed once for all steps)
+    tolerance_schedule : _ToleranceSchedule, optional
+        Adaptive penetration tolerances and iteration budgets of the steps.
+    history : tuple, optional
+        History of the steps before `start`.
+    start : int, optional
+        First step to calculate. (Default: 0)
+    progress_recorder : ProgressRecorder, optional
+        Progress is reported after each step has been processed by the
+        caller.
+    timer : muTimer.Timer, optional
+        Timer for the solver.
+
+    Yields
+    ------
+    results : tuple
+        Results of `_next_contact_step` or `_contact_at_given_load` for each
+        step.
+    """
+    if context is None:
+        context = _TopographyContext(system.surface)
+    for i in range(start, nsteps):
+        with timer("contact step"):
+            if external_forces is None:
+                results = _next_contact_step(
+                    system, history=history, pentol=pentol, maxiter=maxiter,
+                    warm_start=warm_start, multigrid=multigrid,
+                    precision=precision, relaxed_tolerances=relaxed_tolerances,
+                    refinement_maxiter=refinement_maxiter,
+                    context=context, tolerance_schedule=tolerance_schedule
+                )
+            else:
+                results = _contact_at_given_load(
+                    system,
+                    external_forces[i],
+                    history=history,
+                    pentol=pentol,
+                    maxiter=maxiter,
+                    warm_start=warm_start,
+                    multigrid=multigrid,
+                    precision=precision,
+                    relaxed_tolerances=relaxed_tolerances,
+                    refinement_maxiter=refinement_maxiter,
+                    context=context,
+                    tolerance_schedule=tolerance_schedule,
+                )
+        history = results[7]
+        yield results
+        progress_recorder.set_progress(i + 1, nsteps)
+
+
+def _contact_area_steps(
+    system,
+    contact_areas,
+    pentol=None,
+    maxiter=None,
+    warm_start=None,
+    multigrid=None,
+    precision="double",
+    relaxed_tolerances=False,
+    refinement_maxiter=0,
+    context=None,
+    tolerance_schedule=None,
+    history=None,
+    start=0,
+    progress_recorder=None,
+    timer=None,
+):
+    """
+    Run displacement controlled contact calculations that reach given
+    fractional contact areas, one after the other. The rigid body
+    displacement of each step is searched by solves at the displacements
+    proposed by `_propose_contact_area_displacement`, using all solves so
+    far (including those of previous steps).
+
+    Parameters
+    ----------
+    system : ContactMechanics.Systems.SystemBase
+        The contact mechanical system.
+    contact_areas : list of float
+        Target fractional contact areas of the steps.
+    warm_start : _WarmStart, optional
+        Solutions of previous solves used to seed the solver.
+    multigrid : _Multigrid, optional
+        Coarse levels used to initialize the solver.
+    precision : str, optional
+        'double' or 'single'; floating point type of the fields of the
+        steps. (Default: 'double')
+    relaxed_tolerances : bool, optional
+        Solve to relaxed tolerances, see `_minimize`. (Default: False)
+    refinement_maxiter : int, optional
+        Maximum number of iterations refining solutions at relaxed
+        tolerances. (Default: 0)
+    context : _TopographyContext, optional
+        Heights and grid constants of the topography of the system.
+        (Default: None, i.e. computed once for all steps)
+    tolerance_schedule : _ToleranceSchedule, optional
+        Adaptive penetration tolerances and iteration budgets of the solves.
+    history : tuple, optional
+        History of the steps before `start`.
+    start : int, optional
+        First step to calculate. (Default: 0)
+    progress_recorder : ProgressRecorder, optional
+        Progress is reported after each step has been processed by the
+        caller.
+    timer : muTimer.Timer, optional
+        Timer for the solver.
+
+    Yields
+    ------
+    results : tuple
+        Results of `_next_contact_step` for the solve of each step that came
+        closest to its target. The optimization result reports the number
+        of solves of the step ('nb_solves'), and the solver iterations and
+        wall time summed over them.
+    """
+    if context is None:
+        context = _TopographyContext(system.surface)
+    nsteps = len(contact_areas)
+    # Rigid body displacements and contact areas of all solves
+    solves = [] if history is None else list(zip(history[0], history[3]))
+    for i in range(start, nsteps):
+        contact_area = contact_areas[i]
+        tolerance = max(CONTACT_AREA_RTOL * contact_area, 1 / context.nb_pts)
+        results = None
+        nb_iterations = 0
+        solve_time = 0
+        with timer("contact step"):
+            for nb_solves in range(1, CONTACT_AREA_MAXSOLVES + 1):
+                mean_displacement = _propose_contact_area_displacement(
+                    contact_area, solves, context
+                )
+                # Each solve extends a copy of the history of the steps
+                solve_results = _next_contact_step(
+                    system,
+                    history=(
+                        None
+                        if history is None
+                        else tuple(entries.copy() for entries in history)
+                    ),
+                    pentol=pentol,
+                    maxiter=maxiter,
+                    warm_start=warm_start,
+                    mean_displacement=mean_displacement,
+                    multigrid=multigrid,
+                    precision=precision,
+                    relaxed_tolerances=relaxed_tolerances,
+                    refinement_maxiter=refinement_maxiter,
+                    context=context,
+                    tolerance_schedule=tolerance_schedule,
+                )
+                opt = solve_results[8]
+                nb_iterations += opt.nit
+                solve_time += opt.solve_time
+                solves.append((mean_displacement, solve_results[6]))
+                error = abs(solve_results[6] - contact_area)
+                if results is None or error < abs(results[6] - contact_area):
+                    results = solve_results
+                del solve_results
+                if error <= tolerance:
+                    break
+        opt = results[8]
+        opt.nit = nb_iterations
+        opt.solve_time = solve_time
+        opt.nb_solves = nb_solves
+        history = results[7]
+        yield results
+        results = None
+        progress_recorder.set_progress(i + 1, nsteps)
+
+
+def _process_pool(nb_processes):
+    """
+    Pool of worker processes for contact calculations.
+    """
+    # Worker processes are forked, since the Django application cannot be
+    # set up again in a freshly spawned interpreter
+    return ProcessPoolExecutor(
+        max_workers=nb_processes, mp_context=multiprocessing.get_context("fork")
+    )
+
+
+def _contact_step_in_worker(
+    arena,
+    slot,
+    physical_sizes,
+    periodic,
+    unit,
+    substrate_str,
+    hardness,
+    pentol,
+    maxiter,
+    external_force=None,
+    mean_displacement=None,
+    multigrid_levels=0,
+    precision="double",
+    relaxed_tolerances=False,
+    refinement_maxiter=0,
+):
+    """
+    Run a contact calculation at a given external load or at a given rigid
+    body displacement in a worker process. The worker sets up its own contact
+    system (and coarse levels) on the heights in the shared arena and writes
+    the fields of the step into the given slot of the arena. Returns the
+    remaining results of `_contact_at_given_load` or `_next_contact_step`
+    (without the fields), with the fields removed from the optimization
+    result.
+    """
+    topography = STTopography(arena.heights, physical_sizes, periodic=periodic, unit=unit)
+    system = _make_system(topography, substrate_str, hardness)
+    multigrid = None
+    if multigrid_levels > 0:
+        multigrid = _Multigrid(topography, substrate_str, hardness, multigrid_levels)
+    if external_force is None:
+        *results, opt = _next_contact_step(
+            system, pentol=pentol, maxiter=maxiter, mean_displacement=mean_displacement,
+            multigrid=multigrid, precision=precision,
+            relaxed_tolerances=relaxed_tolerances,
+            refinement_maxiter=refinement_maxiter, out=arena.slot(slot)
+        )
+    else:
+        *results, opt = _contact_at_given_load(
+            system, external_force, pentol=pentol, maxiter=maxiter, multigrid=multigrid,
+            precision=precision, relaxed_tolerances=relaxed_tolerances,
+            refinement_maxiter=refinement_maxiter, out=arena.slot(slot)
+        )
+    return (*results[4:], _strip_optimize_result(opt))
+
+
+def _slot_fields(arena, slot):
+    """
+    Fields of a step in a slot of an arena, in the order of the results of
+    `_next_contact_step`.
+    """
+    fields = arena.slot(slot)
+    return (
+        fields["displacement"],
+        fields["gap"],
+        fields["pressure"],
+        fields["contacting_points"],
+    )
+
+
+def _contact_at_given_loads_in_parallel(
+    topography,
+    arena,
+    substrate_str,
+    hardness,
+    external_forces,
+    pentol=None,
+    maxiter=None,
+    nb_processes=2,
+    multigrid_levels=0,
+    precision="double",
+    relaxed_tolerances=False,
+    refinement_maxiter=0,
+    history=None,
+    start=0,
+    progress_recorder=None,
+    timer=None,
+):
+    """
+    Run contact calculations at given external loads in a pool of worker
+    processes. The calculations are independent of each other; each worker
+    sets up its own contact system. Steps are submitted in order while
+    slots of the arena are free; the slot of a step is reused once the step
+    has been processed by the caller.
+
+    Parameters
+    ----------
+    topography : SurfaceTopography.Topography
+        Topography of the rigid counterbody.
+    arena : topobank_contact.arena.SharedArena
+        Heights of the topography and slots for the fields of the steps;
+        closed once all steps are done.
+    substrate_str : str
+        Boundary conditions, 'periodic' or 'nonperiodic'.
+    hardness : float or None
+        Hardness of the substrate in units of E*.
+    external_forces : list of float
+        External forces of the steps.
+    nb_processes : int, optional
+        Number of worker processes. (Default: 2)
+    multigrid_levels : int, optional
+        Number of coarse levels initializing the solver. (Default: 0)
+    precision : str, optional
+        'double' or 'single'; floating point type of the fields of the
+        steps. (Default: 'double')
+    relaxed_tolerances : bool, optional
+        Solve to relaxed tolerances, see `_minimize`. (Default: False)
+    refinement_maxiter : int, optional
+        Maximum number of iterations refining solutions at relaxed
+        tolerances. (Default: 0)
+    history : tuple, optional
+        History of the steps before `start`.
+    start : int, optional
+        First step to calculate. (Default: 0)
+    progress_recorder : ProgressRecorder, optional
+        Progress is reported whenever a step has finished.
+    timer : muTimer.Timer, optional
+        Timer for time spent waiting for the workers.
+
+    Yields
+    ------
+    results : tuple
+        Results of `_contact_at_given_load` for each step, in the order of
+        `external_forces`; the fields are those in the slot of the step. The
+        history accumulates all steps yielded so far.
+    """
+    nsteps = len(external_forces)
+    executor = _process_pool(nb_processes)
+    try:
+        futures = {}
+        finished = {}
+        next_submitted = next_step = start
+        nb_finished = start
+        while next_step < nsteps:
+            while next_submitted < nsteps:
+                slot = arena.acquire()
+                if slot is None:
+                    break
+                future = arena.submit(
+                    executor,
+                    _contact_step_in_worker,
+                    slot,
+                    topography.physical_sizes,
+                    topography.is_periodic,
+                    topography.unit,
+                    substrate_str,
+                    hardness,
+                    pentol,
+                    maxiter,
+                    external_force=external_forces[next_submitted],
+                    multigrid_levels=multigrid_levels,
+                    precision=precision,
+                    relaxed_tolerances=relaxed_tolerances,
+                    refinement_maxiter=refinement_maxiter,
+                )
+                futures[future] = (next_submitted, slot)
+                next_submitted += 1
+            with timer("contact step"):
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                i, slot = futures.pop(future)
+                finished[i] = (slot, arena.result(future))
+                nb_finished += 1
+                progress_recorder.set_progress(nb_finished, nsteps)
+            # Hand out results in order
+            while next_step in finished:
+                slot, (*results, step_history, opt) = finished.pop(next_step)
+                history = _append_history(history, step_history)
+                yield (*_slot_fields(arena, slot), *results, history, opt)
+                arena.release(slot)
+                next_step += 1
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        arena.close()
+
+
+def _next_contact_steps_in_parallel(
+    topography,
+    arena,
+    substrate_str,
+    hardness,
+    nsteps,
+    pentol=None,
+    maxiter=None,
+    nb_processes=2,
+    multigrid_levels=0,
+    precision="double",
+    relaxed_tolerances=False,
+    refinement_maxiter=0,
+    context=None,
+    history=None,
+    start=0,
+    progress_recorder=None,
+    timer=None,
+):
+    """
+    Run displacement-controlled contact calculations in a pool of worker
+    processes. Each round, `_propose_mean_displacements` proposes one
+    displacement per worker process from the history of all previous rounds;
+    the proposed steps are then solved concurrently.
+
+    Parameters
+    ----------
+    topography : SurfaceTopography.Topography
+        Topography of the rigid counterbody.
+    arena : topobank_contact.arena.SharedArena
+        Heights of the topography and (at least `nb_processes`) slots for
+        the fields of the steps; closed once all steps are done.
+    substrate_str : str
+        Boundary conditions, 'periodic' or 'nonperiodic'.
+    hardness : float or None
+        Hardness of the substrate in units of E*.
+    nsteps : int
+        Number of load steps.
+    nb_processes : int, optional
+        Number of worker processes, i.e. steps solved per round. (Default: 2)
+    multigrid_levels : int, optional
+        Number of coarse levels initializing the solver. (Default: 0)
+    precision : str, optional
+        'double' or 'single'; floating point type of the fields of the
+        steps. (Default: 'double')
+    relaxed_tolerances : bool, optional
+        Solve to relaxed tolerances, see `_minimize`. (Default: False)
+    refinement_maxiter : int, optional
+        Maximum number of iterations refining solutions at relaxed
+        tolerances. (Default: 0)
+    context : _TopographyContext, optional
+        Height statistics of the topography. (Default: None, i.e. computed
+        from `topography`)
+    history : tuple, optional
+        History of the steps before `start`.
+    start : int, optional
+        First step to calculate. (Default: 0)
+    progress_recorder : ProgressRecorder, optional
+        Progress is reported whenever a step has finished.
+    timer : muTimer.Timer, optional
+        Timer for time spent waiting for the workers.
+
+    Yields
+    ------
+    results : tuple
+        Results of `_next_contact_step` for each step; the fields are those
+        in the slot of the step. The history accumulates all steps yielded
+        so far.
+    """
+    if context is None:
+        context = _TopographyContext(topography)
+
+    executor = _process_pool(nb_processes)
+    try:
+        step = start
+        while step < nsteps:
+            mean_displacements = _propose_mean_displacements(
+                history,
+                context.top,
+                context.middle,
+                context.bot,
+                context.nb_pts,
+                min(nb_processes, nsteps - step),
+            )
+            futures = []
+            for mean_displacement in mean_displacements:
+                slot = arena.acquire()
+                futures.append(
+                    (
+                        slot,
+                        arena.submit(
+                            executor,
+                            _contact_step_in_worker,
+                            slot,
+                            topography.physical_sizes,
+                            topography.is_periodic,
+                            topography.unit,
+                            substrate_str,
+                            hardness,
+                            pentol,
+                            maxiter,
+                            mean_displacement=mean_displacement,
+                            multigrid_levels=multigrid_levels,
+                            precision=precision,
+                            relaxed_tolerances=relaxed_tolerances,
+                            refinement_maxiter=refinement_maxiter,
+                        ),
+                    )
+                )
+            for slot, future in futures:
+                with timer("contact step"):
+                    *results, step_history, opt = arena.result(future)
+                history = _append_history(history, step_history)
+                step += 1
+                progress_recorder.set_progress(step, nsteps)
+                yield (*_slot_fields(arena, slot), *results, history, opt)
+                arena.release(slot)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        arena.close()
+
+
+def _cached_steps(result_cache, index, progress_recorder=None):
+    """
+    Load the results of all load steps of a calculation from the result
+    cache.
+
+    Parameters
+    ----------
+    result_cache : topobank_contact.cache.ResultCache
+        Cache entry of the calculation.
+    index : dict
+        Index of the cache entry.
+    progress_recorder : ProgressRecorder, optional
+        Progress is reported after each step has been processed by the
+        caller.
+
+    Yields
+    ------
+    results : tuple
+        Results for each step, in the same form as yielded by
+        `_contact_steps`.
+    """
+    mean_displacements, mean_gaps, mean_pressures, total_contact_areas, converged = (
+        index["history"]
+    )
+    converged = np.array(converged, dtype=bool)
+    nb_iterations = index["nb_iterations"]
+    multigrid_nb_iterations = index["multigrid_nb_iterations"]
+    residuals = index["residuals"]
+    relaxed_converged = index["relaxed_converged"]
+    refinement_nb_iterations = index["refinement_nb_iterations"]
+    refinement_contact_area_differences = index["refinement_contact_area_differences"]
+    solve_times = index["solve_times"]
+    pentols = index["pentols"]
+    stalled = index["stalled"]
+    nb_solves = index["nb_solves"]
+    warm_started = index["warm_started"]
+    nsteps = len(nb_iterations)
+    for i in range(nsteps):
+        dataset = result_cache.load_step(i)
+        history = (
+            mean_displacements[: i + 1],
+            mean_gaps[: i + 1],
+            mean_pressures[: i + 1],
+            total_contact_areas[: i + 1],
+            converged[: i + 1],
+        )
+        yield (
+            dataset.displacement.data,
+            dataset.gap.data,
+            dataset.pressure.data,
+            dataset.contacting_points.data,
+            dataset.attrs["mean_displacement"],
+            dataset.attrs["mean_pressure"],
+            dataset.attrs["total_contact_area"],
+            history,
+            OptimizeResult(
+                nit=nb_iterations[i],
+                success=converged[i],
+                multigrid_nb_iterations=multigrid_nb_iterations[i],
+                residual=residuals[i],
+                relaxed_success=relaxed_converged[i],
+                refinement_nb_iterations=refinement_nb_iterations[i],
+                refinement_contact_area_difference=refinement_contact_area_differences[
+                    i
+                ],
+                solve_time=solve_times[i],
+                pentol=pentols[i],
+                stalled=stalled[i],
+                nb_solves=nb_solves[i],
+                warm_started=warm_started[i],
+            ),
+        )
+        progress_recorder.set_progress(i + 1, nsteps)
+
+
+class _SolveAndRenderProgress:
+    """
+    Reports the progress of solving and of rendering deep zoom images
+    separately, when images are rendered alongside the solver.
+    """
+
+    def __init__(self, progress_recorder, nsteps):
+        self._progress_recorder = progress_recorder
+        self._nsteps = nsteps
+        self.nb_solved = 0
+        self.nb_rendered = 0
+
+    def _report(self):
+        self._progress_recorder.set_progress(
+            self.nb_solved + self.nb_rendered,
+            2 * self._nsteps,
+            description=f"Solved {self.nb_solved} of {self._nsteps} steps, "
+            f"rendered images of {self.nb_rendered}",
+        )
+
+    def set_progress(self, current, total, description=None):
+        # Called by the solver
+        self.nb_solved = current
+        self._report()
+
+    def rendered(self):
+        self.nb_rendered += 1
+        self._report()
+
 
 class BoundaryElementMethod(WorkflowImplementation):
     class Meta:
@@ -326,8 +1893,36 @@ class BoundaryElementMethod(WorkflowImplementation):
         # Explicit pressure values; if None, choose pressures automatically by using
         # given number of steps (nsteps)
         pressures: Union[list[float], None] = None
+        # Target fractional contact areas; if given (and nsteps is None), the
+        # rigid body displacement of each load step is searched such that
+        # its contact area matches the target
+        contact_areas: Union[list[float], None] = None
         # Maximum number of iterations unless convergence
         maxiter: int = 100
+        # Seed the solver of each load step that lies between two already
+        # solved steps with an interpolation between their solutions instead
+        # of starting from scratch
+        warm_start: bool = False
+        # Number of coarse levels (each halving the number of grid points
+        # in each direction) on which each load step is solved first; the
+        # solution is prolonged from level to level and initializes the
+        # solver at full resolution. Levels that would not divide the grid
+        # evenly or leave fewer than 16 points per direction are skipped.
+        multigrid_levels: int = 0
+        # Choose the penetration tolerance and iteration budget of each load
+        # step from its contact area predicted by the previous steps, and
+        # stop steps early once the solver stalls beyond their budget
+        adaptive_tolerances: bool = False
+        # Floating point precision of the fields of the load steps kept in
+        # memory and stored: 'single' keeps them in float32. The solver
+        # always computes in double precision.
+        precision: Literal["double", "single"] = "double"
+        # Solve each load step to relaxed tolerances (a cheaper, less
+        # accurate solution)
+        relaxed_tolerances: bool = False
+        # Maximum number of iterations refining each solution at relaxed
+        # tolerances at the default tolerances of the solver
+        refinement_maxiter: int = 0
         # Contact modulus E* in physical units of pressure (given by
         # elastic_modulus_unit); if provided, pressure axes of the derived
         # plots (distributions, deep zoom images) are rendered in physical
@@ -349,6 +1944,20 @@ class BoundaryElementMethod(WorkflowImplementation):
                 raise ValueError("'nsteps' must be at least 1.")
             return value
 
+        @field_validator("multigrid_levels")
+        @classmethod
+        def _validate_multigrid_levels(cls, value):
+            if value < 0:
+                raise ValueError("'multigrid_levels' must not be negative.")
+            return value
+
+        @field_validator("refinement_maxiter")
+        @classmethod
+        def _validate_refinement_maxiter(cls, value):
+            if value < 0:
+                raise ValueError("'refinement_maxiter' must not be negative.")
+            return value
+
         @field_validator("elastic_modulus")
         @classmethod
         def _validate_elastic_modulus(cls, value):
@@ -368,8 +1977,39 @@ class BoundaryElementMethod(WorkflowImplementation):
                     raise ValueError("All 'pressures' must be positive.")
             return value
 
+        @field_validator("contact_areas")
+        @classmethod
+        def _validate_contact_areas(cls, value):
+            if value is not None:
+                if len(value) < 1:
+                    raise ValueError("'contact_areas' must not be empty.")
+                if any(a <= 0 or a >= 1 for a in value):
+                    raise ValueError(
+                        "All 'contact_areas' must be between 0 and 1 (exclusive)."
+                    )
+            return value
+
     def topography_implementation(
         self, analysis, progress_recorder=None, timer=None
+    ):
+        if not profile_requested(analysis.subject):
+            return self._topography_implementation(
+                analysis, progress_recorder=progress_recorder, timer=timer
+            )
+        result, profile_saved = run_profiled(
+            analysis.folder,
+            self._topography_implementation,
+            analysis,
+            progress_recorder=progress_recorder,
+            timer=timer,
+        )
+        if profile_saved:
+            # Profile of the calculation in the analysis folder (pstats format)
+            result["profile_path"] = PROFILE_FILENAME
+        return result
+
+    def _topography_implementation(
+        self, analysis, progress_recorder=None, timer=None
     ):
         if timer is None:
             timer = Timer()
@@ -378,7 +2018,13 @@ class BoundaryElementMethod(WorkflowImplementation):
         hardness = self.kwargs.hardness
         nsteps = self.kwargs.nsteps
         pressures = self.kwargs.pressures
+        contact_areas = self.kwargs.contact_areas
         maxiter = self.kwargs.maxiter
+        warm_start = _WarmStart() if self.kwargs.warm_start else None
+        multigrid_levels = self.kwargs.multigrid_levels
+        precision = self.kwargs.precision
+        relaxed_tolerances = self.kwargs.relaxed_tolerances
+        refinement_maxiter = self.kwargs.refinement_maxiter
         elastic_modulus = self.kwargs.elastic_modulus
         elastic_modulus_unit = self.kwargs.elastic_modulus_unit
 
@@ -393,7 +2039,8 @@ class BoundaryElementMethod(WorkflowImplementation):
             pressure_unit = elastic_modulus_unit
 
         topography = analysis.subject
-        folder = analysis.folder
+        # Bytes saved to the folder are reported with the results
+        folder = CountingFolder(analysis.folder)
 
         # Check whether function is called with the right substrate_str and issue a warning if not
         alerts = []  # list of dicts with keys 'alert_class', 'message'
@@ -419,25 +2066,6 @@ class BoundaryElementMethod(WorkflowImplementation):
                 "Contact mechanics not implemented for line scans."
             )
 
-        # Limit size of topographies for which this calculation is possible
-        nb_grid_pts_x, nb_grid_pts_y = topography.nb_grid_pts
-        if nb_grid_pts_x * nb_grid_pts_y > CONTACT_MECHANICS_MAX_MB_GRID_PTS_PRODUCT:
-            raise IncompatibleTopographyException(
-                f"Topography has ({nb_grid_pts_x}, {nb_grid_pts_y}) points, "
-                f"which are more than {CONTACT_MECHANICS_MAX_MB_GRID_PTS_PRODUCT} - "
-                "this is currently too large for a Contact mechanics calculation."
-            )
-        if (
-            max(nb_grid_pts_x, nb_grid_pts_y)
-            > CONTACT_MECHANICS_MAX_MB_GRID_PTS_PER_DIM
-        ):
-            raise IncompatibleTopographyException(
-                f"Topography has ({nb_grid_pts_x}, {nb_grid_pts_y}) points, "
-                f"so more than {CONTACT_MECHANICS_MAX_MB_GRID_PTS_PER_DIM} points "
-                "in one direction - this is currently too large for a "
-                "Contact mechanics calculation."
-            )
-
         #
         # Choose substrate str from 'is_periodic' flag, if not given
         #
@@ -445,11 +2073,13 @@ class BoundaryElementMethod(WorkflowImplementation):
             substrate_str = "periodic" if topography.is_periodic else "nonperiodic"
 
         #
-        # Check whether either loads or nsteps is given, but not both
+        # Check whether either loads, contact areas or nsteps is given, but
+        # only one of them
         #
-        if (nsteps is None) and (pressures is None):
+        if (nsteps is None) and (pressures is None) and (contact_areas is None):
             raise ValueError(
-                "Either 'nsteps' or 'pressures' must be given for contact mechanics calculation."
+                "Either 'nsteps', 'pressures' or 'contact_areas' must be given for "
+                "contact mechanics calculation."
             )
 
         if (nsteps is not None) and (pressures is not None):
@@ -457,6 +2087,14 @@ class BoundaryElementMethod(WorkflowImplementation):
                 "Both 'nsteps' and 'pressures' are given. One must be None."
             )
 
+        if (contact_areas is not None) and (
+            (nsteps is not None) or (pressures is not None)
+        ):
+            raise ValueError(
+                "'contact_areas' are given together with 'nsteps' or 'pressures'. "
+                "Both of these must be None."
+            )
+
         kwargs_limits = settings.CONTACT_MECHANICS_KWARGS_LIMITS
         #
         # Check some limits for number of pressures, maxiter, and nsteps
@@ -472,38 +2110,178 @@ class BoundaryElementMethod(WorkflowImplementation):
             or (len(pressures) > kwargs_limits["pressures"]["maxlen"])
         ):
             raise ValueError(f"Invalid number of pressures given: {len(pressures)}")
+        # Target contact areas are limited like pressures
+        if contact_areas and (
+            len(contact_areas) > kwargs_limits["pressures"]["maxlen"]
+        ):
+            raise ValueError(
+                f"Invalid number of contact areas given: {len(contact_areas)}"
+            )
         if (maxiter < kwargs_limits["maxiter"]["min"]) or (
             maxiter > kwargs_limits["maxiter"]["max"]
         ):
             raise ValueError(f"Invalid value for 'maxiter': {maxiter}")
 
-        # Conversion of force units
-        force_conv = np.prod(topography.physical_sizes)
+        if pressures is not None:
+            nsteps = len(pressures)
+        elif contact_areas is not None:
+            nsteps = len(contact_areas)
+
+        # Load steps at given pressures are independent of each other and can
+        # be distributed over a pool of worker processes; displacement
+        # controlled steps are solved in rounds of one step per process
+        nb_processes = getattr(settings, "CONTACT_MECHANICS_NB_PROCESSES", 1)
+        # The solves searching target contact areas depend on each other
+        solve_in_workers = nb_processes > 1 and nsteps > 1 and contact_areas is None
+        if not solve_in_workers:
+            nb_processes = 1
+
+        # Deep zoom images are optionally rendered in threads while the
+        # solver continues with the next step, or only once requested
+        lazy_deepzoom = getattr(settings, "CONTACT_MECHANICS_LAZY_DEEPZOOM", False)
+        nb_deepzoom_threads = getattr(settings, "CONTACT_MECHANICS_DEEPZOOM_THREADS", 0)
+        if lazy_deepzoom or solve_in_workers:
+            # Workers write the fields of their steps into slots of a shared
+            # arena, which are reused once a step has been processed; images
+            # are then rendered while the workers continue solving
+            nb_deepzoom_threads = 0
+
+        # Fields of the steps are optionally kept in memory-mapped files on
+        # local disk and post-processed tile by tile ("out of core"), either
+        # always or only if they would not fit into memory otherwise
+        out_of_core = getattr(settings, "CONTACT_MECHANICS_OUT_OF_CORE", False)
+        tile_nbytes = getattr(settings, "CONTACT_MECHANICS_TILE_MB", 64) * 1024 * 1024
 
         #
-        # Some constants
+        # Limit size of topographies to what fits into the memory of the
+        # worker
         #
-        min_pentol = 1e-12  # lower bound for the penetration tolerance
-
-        if (hardness is not None) and (hardness > 0):
-            topography = PlasticTopography(topography, hardness)
+        memory_kwargs = dict(
+            plastic=bool(hardness),
+            nsteps=nsteps,
+            warm_start=warm_start is not None,
+            multigrid_levels=multigrid_levels,
+            precision=precision,
+            nb_processes=nb_processes,
+            nb_deepzoom_threads=nb_deepzoom_threads,
+            lazy_deepzoom=lazy_deepzoom,
+            substrate_cache_nbytes=getattr(
+                settings, "CONTACT_MECHANICS_SUBSTRATE_CACHE_MB", 0
+            )
+            * 1024
+            * 1024,
+            tile_nbytes=tile_nbytes,
+        )
+        memory_estimate = estimate_memory(
+            topography.nb_grid_pts,
+            substrate_str == "periodic",
+            out_of_core=out_of_core is True,
+            **memory_kwargs,
+        )
+        memory_budget = getattr(settings, "CONTACT_MECHANICS_MEMORY_BUDGET_MB", None)
+        if memory_budget is None:
+            # The memory of this machine is shared among the worker processes
+            # configured to run calculations at the same time
+            memory_budget = available_memory(
+                getattr(settings, "CONTACT_MECHANICS_WORKER_CONCURRENCY", 1)
+            )
+        else:
+            memory_budget *= 1024 * 1024
+        if out_of_core == "auto":
+            out_of_core = memory_estimate["total"] > memory_budget
+            if out_of_core:
+                memory_estimate = estimate_memory(
+                    topography.nb_grid_pts,
+                    substrate_str == "periodic",
+                    out_of_core=True,
+                    **memory_kwargs,
+                )
+        out_of_core = bool(out_of_core)
+        if out_of_core:
+            # Rendering deep zoom images needs the full fields in memory; they
+            # are rendered on demand by a background task, one field at a
+            # time, instead of tile by tile
+            lazy_deepzoom = True
+            nb_deepzoom_threads = 0
+        if memory_estimate["total"] > memory_budget:
+            nb_grid_pts_x, nb_grid_pts_y = topography.nb_grid_pts
+            raise IncompatibleTopographyException(
+                f"Topography has ({nb_grid_pts_x}, {nb_grid_pts_y}) points; "
+                f"the calculation would need about "
+                f"{memory_estimate['total'] / 1024**3:.1f} GB of memory, but only "
+                f"{memory_budget / 1024**3:.1f} GB are available - this is "
+                "currently too large for a Contact mechanics calculation."
+            )
+        out_of_core_dir = getattr(settings, "CONTACT_MECHANICS_OUT_OF_CORE_DIR", None)
+        if out_of_core:
+            fields_nbytes = step_fields_nbytes(topography.nb_grid_pts, precision)
+            free_nbytes = shutil.disk_usage(
+                tempfile.gettempdir() if out_of_core_dir is None else out_of_core_dir
+            ).free
+            if fields_nbytes > free_nbytes:
+                raise IncompatibleTopographyException(
+                    f"The fields of a load step need "
+                    f"{fields_nbytes / 1024**3:.1f} GB of local disk space, but "
+                    f"only {free_nbytes / 1024**3:.1f} GB are available."
+                )
 
-        half_space_factory = dict(
-            periodic=PeriodicFFTElasticHalfSpace, nonperiodic=FreeFFTElasticHalfSpace
+        #
+        # Results of identical calculations are reused, and interrupted
+        # calculations are resumed from a checkpoint. The contact modulus
+        # only rescales derived plots and hence does not enter the key
+        # identifying a calculation.
+        #
+        use_result_cache = getattr(settings, "CONTACT_MECHANICS_RESULT_CACHE", False)
+        per_step_netcdf = getattr(settings, "CONTACT_MECHANICS_PER_STEP_NETCDF", True)
+        # Resuming reads completed steps back from the per-step files
+        use_checkpoint = per_step_netcdf and getattr(
+            settings, "CONTACT_MECHANICS_CHECKPOINT", True
         )
+        calculation_key = None
+        if use_result_cache or use_checkpoint:
+            calculation_parameters = self.kwargs.model_dump(
+                exclude={"elastic_modulus", "elastic_modulus_unit"}
+            )
+            calculation_parameters["substrate"] = substrate_str
+            if pressures is None and contact_areas is None:
+                # Displacements are chosen in rounds of one step per process
+                calculation_parameters["nb_processes"] = nb_processes
+            with timer("calculation key"):
+                calculation_key = result_cache_key(
+                    topography.heights(),
+                    topography.physical_sizes,
+                    calculation_parameters,
+                )
+        result_cache = None
+        result_cache_index = None
+        if use_result_cache:
+            with timer("result cache"):
+                result_cache = ResultCache(calculation_key)
+                result_cache_index = result_cache.load_index()
+        checkpoint = None
+        if use_checkpoint and result_cache_index is None:
+            with timer("checkpoint"):
+                checkpoint = load_checkpoint(folder, calculation_key)
 
-        half_space_kwargs = {}
+        # Conversion of force units
+        force_conv = np.prod(topography.physical_sizes)
 
-        substrate = half_space_factory[substrate_str](
-            topography.nb_grid_pts, 1.0, topography.physical_sizes, **half_space_kwargs
-        )
+        #
+        # Some constants
+        #
+        min_pentol = 1e-12  # lower bound for the penetration tolerance
 
-        if (hardness is not None) and (hardness > 0):
-            system = PlasticNonSmoothContactSystem(
-                substrate=substrate, surface=topography
+        # Lookups of the half-spaces of this process before the calculation
+        substrate_cache_lookups = (substrate_cache.hits, substrate_cache.misses)
+        system = _make_system(topography, substrate_str, hardness, timer=timer)
+        substrate = system.substrate
+        # Heights and grid constants shared by all steps
+        context = _TopographyContext(system.surface)
+        multigrid = None
+        if multigrid_levels > 0 and result_cache_index is None:
+            multigrid = _Multigrid(
+                topography, substrate_str, hardness, multigrid_levels, timer=timer
             )
-        else:
-            system = NonSmoothContactSystem(substrate=substrate, surface=topography)
 
         # Heuristics for the possible tolerance on penetration.
         # This is necessary because numbers can vary greatly
@@ -516,213 +2294,539 @@ class BoundaryElementMethod(WorkflowImplementation):
             )
         pentol = rms_height / (10 * np.mean(topography.nb_grid_pts))
         pentol = max(pentol, min_pentol)
+        tolerance_schedule = None
+        if self.kwargs.adaptive_tolerances:
+            tolerance_schedule = _ToleranceSchedule(maxiter)
+
+        # Rendering threads, temporary files and worker processes are released
+        # also if the calculation fails
+        with ExitStack() as resources:
+            netcdf_options = {
+                "format": "NETCDF3_64BIT",
+                **getattr(settings, "CONTACT_MECHANICS_NETCDF_OPTIONS", {}),
+            }
+            consolidated_netcdf = None
+            if getattr(settings, "CONTACT_MECHANICS_CONSOLIDATED_NETCDF", False):
+                consolidated_netcdf = resources.enter_context(
+                    ConsolidatedNetCDFWriter(**netcdf_options)
+                )
 
-        netcdf_format = "NETCDF3_64BIT"
-
-        data_paths = []
-
-        if pressures is not None:
-            nsteps = len(pressures)
+            if checkpoint is None:
+                start = 0
+                history = None
+                nb_iterations = []
+                multigrid_nb_iterations = []
+                residuals = []
+                relaxed_converged = []
+                refinement_nb_iterations = []
+                refinement_contact_area_differences = []
+                solve_times = []
+                pentols = []
+                stalled = []
+                nb_solves = []
+                warm_started = []
+                data_paths = []
+            else:
+                start = checkpoint["nb_steps"]
+                _log.info(f"Resuming calculation {calculation_key} at step {start}.")
+                history = tuple(checkpoint["history"])
+                nb_iterations = checkpoint["nb_iterations"]
+                multigrid_nb_iterations = checkpoint["multigrid_nb_iterations"]
+                residuals = checkpoint["residuals"]
+                relaxed_converged = checkpoint["relaxed_converged"]
+                refinement_nb_iterations = checkpoint["refinement_nb_iterations"]
+                refinement_contact_area_differences = checkpoint[
+                    "refinement_contact_area_differences"
+                ]
+                solve_times = checkpoint["solve_times"]
+                pentols = checkpoint["pentols"]
+                stalled = checkpoint["stalled"]
+                nb_solves = checkpoint["nb_solves"]
+                warm_started = checkpoint["warm_started"]
+                data_paths = checkpoint["data_paths"]
+                if tolerance_schedule is not None:
+                    for contact_area, nb_step_iterations, step_converged, step_stalled in zip(
+                        history[3], nb_iterations, history[4], stalled
+                    ):
+                        if step_converged and not step_stalled:
+                            tolerance_schedule.append(contact_area, nb_step_iterations)
+
+            deepzoom_callback = None
+            if nb_deepzoom_threads > 0 and progress_recorder is not None:
+                progress_recorder = _SolveAndRenderProgress(progress_recorder, nsteps)
+                deepzoom_callback = progress_recorder.rendered
+            deepzoom_renderer = resources.enter_context(
+                DeepZoomRenderer(
+                    folder,
+                    nb_threads=nb_deepzoom_threads,
+                    timer=timer,
+                    callback=deepzoom_callback,
+                )
+            )
 
-        history = None
-        for i in range(nsteps):
-            if pressures is None:
-                with timer("contact step"):
-                    (
-                        displacement_xy,
-                        gap_xy,
-                        pressure_xy,
-                        contacting_points_xy,
-                        mean_displacement,
-                        mean_pressure,
-                        total_contact_area,
-                        history,
-                    ) = _next_contact_step(
-                        system, history=history, pentol=pentol, maxiter=maxiter
+            # Shared memory of steps solved in worker processes
+            arena = None
+            if result_cache_index is not None:
+                _log.info(f"Reusing cached results {result_cache.key}.")
+                steps = _cached_steps(
+                    result_cache, result_cache_index, progress_recorder=progress_recorder
+                )
+            elif contact_areas is not None:
+                # The solves searching the contact areas depend on each other and
+                # run in this process
+                steps = _contact_area_steps(
+                    system,
+                    contact_areas,
+                    pentol=pentol,
+                    maxiter=maxiter,
+                    warm_start=warm_start,
+                    multigrid=multigrid,
+                    precision=precision,
+                    relaxed_tolerances=relaxed_tolerances,
+                    refinement_maxiter=refinement_maxiter,
+                    context=context,
+                    tolerance_schedule=tolerance_schedule,
+                    history=history,
+                    start=start,
+                    progress_recorder=progress_recorder,
+                    timer=timer,
+                )
+            elif pressures is None:
+                if solve_in_workers:
+                    # Steps solved in separate processes cannot be seeded with
+                    # each other's solutions or iteration counts
+                    warm_start = None
+                    tolerance_schedule = None
+                    # A slot per step of a round
+                    arena = SharedArena(context.heights, nb_processes, precision=precision)
+                    steps = _next_contact_steps_in_parallel(
+                        topography,
+                        arena,
+                        substrate_str,
+                        hardness,
+                        nsteps,
+                        pentol=pentol,
+                        maxiter=maxiter,
+                        nb_processes=nb_processes,
+                        multigrid_levels=multigrid_levels,
+                        precision=precision,
+                        relaxed_tolerances=relaxed_tolerances,
+                        refinement_maxiter=refinement_maxiter,
+                        context=context,
+                        history=history,
+                        start=start,
+                        progress_recorder=progress_recorder,
+                        timer=timer,
                     )
-            else:
-                with timer("contact step"):
-                    (
-                        displacement_xy,
-                        gap_xy,
-                        pressure_xy,
-                        contacting_points_xy,
-                        mean_displacement,
-                        mean_pressure,
-                        total_contact_area,
-                        history,
-                    ) = _contact_at_given_load(
+                else:
+                    steps = _contact_steps(
                         system,
-                        pressures[i] * force_conv,
+                        nsteps,
+                        pentol=pentol,
+                        maxiter=maxiter,
+                        warm_start=warm_start,
+                        multigrid=multigrid,
+                        precision=precision,
+                        relaxed_tolerances=relaxed_tolerances,
+                        refinement_maxiter=refinement_maxiter,
+                        context=context,
+                        tolerance_schedule=tolerance_schedule,
+                        history=history,
+                        start=start,
+                        progress_recorder=progress_recorder,
+                        timer=timer,
+                    )
+            else:
+                external_forces = [pressure * force_conv for pressure in pressures]
+                if solve_in_workers:
+                    # Steps solved in separate processes cannot be seeded with
+                    # each other's solutions or iteration counts
+                    warm_start = None
+                    tolerance_schedule = None
+                    # Slots for the steps being solved and for as many finished
+                    # steps waiting to be handed out in order
+                    arena = SharedArena(
+                        context.heights,
+                        min(2 * nb_processes, nsteps - start),
+                        precision=precision,
+                    )
+                    steps = _contact_at_given_loads_in_parallel(
+                        topography,
+                        arena,
+                        substrate_str,
+                        hardness,
+                        external_forces,
+                        pentol=pentol,
+                        maxiter=maxiter,
+                        nb_processes=nb_processes,
+                        multigrid_levels=multigrid_levels,
+                        precision=precision,
+                        relaxed_tolerances=relaxed_tolerances,
+                        refinement_maxiter=refinement_maxiter,
                         history=history,
+                        start=start,
+                        progress_recorder=progress_recorder,
+                        timer=timer,
+                    )
+                else:
+                    steps = _contact_steps(
+                        system,
+                        nsteps,
+                        external_forces=external_forces,
                         pentol=pentol,
                         maxiter=maxiter,
+                        warm_start=warm_start,
+                        multigrid=multigrid,
+                        precision=precision,
+                        relaxed_tolerances=relaxed_tolerances,
+                        refinement_maxiter=refinement_maxiter,
+                        context=context,
+                        tolerance_schedule=tolerance_schedule,
+                        history=history,
+                        start=start,
+                        progress_recorder=progress_recorder,
+                        timer=timer,
                     )
 
-            #
-            # Save displacement_xy, gap_xy, pressure_xy and contacting_points_xy to a NetCDF file
-            #
-
-            pressure_xy = xr.DataArray(
-                pressure_xy, dims=("x", "y")
-            )  # maybe define coordinates
-            pressure_xy.attrs["units"] = "E*"
-            gap_xy = xr.DataArray(gap_xy, dims=("x", "y"))
-            gap_xy.attrs["units"] = topography.unit
-            displacement_xy = xr.DataArray(displacement_xy, dims=("x", "y"))
-            displacement_xy.attrs["units"] = topography.unit
-            contacting_points_xy = xr.DataArray(contacting_points_xy, dims=("x", "y"))
-            contacting_points_xy.attrs["units"] = "1"  # dimensionless contact mask
-
-            # one dataset per analysis step: smallest unit to retrieve
-            dataset = xr.Dataset(
-                {
-                    "pressure": pressure_xy,
-                    "contacting_points": contacting_points_xy,
-                    "gap": gap_xy,
-                    "displacement": displacement_xy,
-                }
-            )
-            dataset.attrs["mean_pressure"] = mean_pressure  # units of E*
-            # Rigid body displacement (offset) of this step, in units of
-            # `length_unit`; negative values indicate deeper penetration
-            dataset.attrs["mean_displacement"] = mean_displacement
-            dataset.attrs["total_contact_area"] = total_contact_area  # fractional
-            # Whether the optimizer converged in this step; netCDF has no
-            # boolean attributes, hence stored as 0/1
-            dataset.attrs["converged"] = int(bool(history[4][-1]))
-            dataset.attrs["length_unit"] = topography.unit
-            if elastic_modulus is not None:
-                # Physical value of the contact modulus E*; multiply
-                # pressures (stored in units of E*) by this value to obtain
-                # physical pressures
-                dataset.attrs["elastic_modulus"] = elastic_modulus
-                dataset.attrs["elastic_modulus_unit"] = elastic_modulus_unit
-            dataset.attrs["type"] = substrate_str
-            if hardness:
-                dataset.attrs["hardness"] = (
-                    hardness  # TODO how to save hardness=None? Not possible in netCDF
+            # Shuts down the worker processes of the steps and releases their arena
+            steps = resources.enter_context(closing(steps))
+
+            if start > 0 and (consolidated_netcdf is not None or result_cache is not None):
+                # Steps completed before the calculation was interrupted
+                for i in range(start):
+                    dataset = folder.read_xarray(f"{data_paths[i]}/nc/results.nc")
+                    if consolidated_netcdf is not None:
+                        with timer("save results"):
+                            consolidated_netcdf.write_step(dataset)
+                    if result_cache is not None:
+                        with timer("result cache"):
+                            result_cache.save_step(i, dataset)
+
+            step_fields = None
+            tiles = [slice(None)]
+            if out_of_core:
+                step_fields = resources.enter_context(
+                    StepFields(
+                        topography.nb_grid_pts, precision=precision, directory=out_of_core_dir
+                    )
                 )
+                tiles = tile_slices(topography.nb_grid_pts, tile_nbytes)
 
-            storage_path = f"step-{i}"
-            data_paths.append(storage_path)
-            with timer("save results"), tempfile.NamedTemporaryFile(
-                prefix="analysis-"
-            ) as tmpfile:
-                dataset.to_netcdf(tmpfile.name, format=netcdf_format)
-                tmpfile.seek(0)
-                folder.save_file(f"{storage_path}/nc/results.nc", "der", File(tmpfile))
-
-            #
-            # Pressure and gap distribution
-            #
-
-            fac = get_unit_conversion_factor(topography.unit, "m")
-
-            hist, edges = np.histogram(
-                pressure_xy.data * pressure_fac, density=True, bins=50
-            )
-            data_dict = {
-                "pressure": (edges[1:-1] + edges[2:]) / 2,
-                "pressureProbabilityDensity": hist[1:],
-                "pressureLabel": "Pressure p",
-                "pressureUnit": pressure_unit,
-                "pressureProbabilityDensityLabel": "Probability density P(p)",
-                "pressureProbabilityDensityUnit": f"{pressure_unit}⁻¹",
-            }
-
-            hist, edges = np.histogram(gap_xy, density=True, bins=50)
-            data_dict.update(
-                {
-                    "gap": (edges[1:-1] + edges[2:]) / 2,
-                    "gapProbabilityDensity": hist[1:],
-                    "gapLabel": "Gap g",
-                    "gapUnit": topography.unit,
-                    "gapSIScaleFactor": fac,
-                    "gapProbabilityDensityLabel": "Probability density P(p)",
-                    "gapProbabilityDensityUnit": f"{topography.unit}⁻¹",
-                    "gapProbabilityDensitySIScaleFactor": 1 / fac,
-                }
+            # Curves of the completed steps for clients polling a running analysis
+            publish_partial_results = getattr(
+                settings, "CONTACT_MECHANICS_PARTIAL_RESULTS", True
             )
+            nb_checkpointed = start
+            for i, (
+                displacement_xy,
+                gap_xy,
+                pressure_xy,
+                contacting_points_xy,
+                mean_displacement,
+                mean_pressure,
+                total_contact_area,
+                history,
+                opt,
+            ) in enumerate(steps, start=start):
+                warm_started.append(bool(opt.get("warm_started", False)))
+                nb_iterations.append(opt.nit)
+                multigrid_nb_iterations.append(list(opt.get("multigrid_nb_iterations", [])))
+                residuals.append(opt.residual)
+                relaxed_converged.append(bool(opt.relaxed_success))
+                refinement_nb_iterations.append(opt.refinement_nb_iterations)
+                refinement_contact_area_differences.append(
+                    opt.refinement_contact_area_difference
+                )
+                solve_times.append(opt.solve_time)
+                pentols.append(opt.pentol)
+                stalled.append(bool(opt.stalled))
+                nb_solves.append(int(opt.get("nb_solves", 1)))
+
+                if step_fields is not None:
+                    # Move the fields to local disk, releasing their memory
+                    # before the next step is solved
+                    with timer("out of core"):
+                        for name, data in [
+                            ("pressure", pressure_xy),
+                            ("contacting_points", contacting_points_xy),
+                            ("gap", gap_xy),
+                            ("displacement", displacement_xy),
+                        ]:
+                            step_fields[name][...] = data
+                    pressure_xy = step_fields["pressure"]
+                    contacting_points_xy = step_fields["contacting_points"]
+                    gap_xy = step_fields["gap"]
+                    displacement_xy = step_fields["displacement"]
+
+                #
+                # Save displacement_xy, gap_xy, pressure_xy and contacting_points_xy to a NetCDF file
+                #
+
+                pressure_xy = xr.DataArray(
+                    pressure_xy, dims=("x", "y")
+                )  # maybe define coordinates
+                pressure_xy.attrs["units"] = "E*"
+                gap_xy = xr.DataArray(gap_xy, dims=("x", "y"))
+                gap_xy.attrs["units"] = topography.unit
+                displacement_xy = xr.DataArray(displacement_xy, dims=("x", "y"))
+                displacement_xy.attrs["units"] = topography.unit
+                contacting_points_xy = xr.DataArray(contacting_points_xy, dims=("x", "y"))
+                contacting_points_xy.attrs["units"] = "1"  # dimensionless contact mask
+
+                # one dataset per analysis step: smallest unit to retrieve
+                dataset = xr.Dataset(
+                    {
+                        "pressure": pressure_xy,
+                        "contacting_points": contacting_points_xy,
+                        "gap": gap_xy,
+                        "displacement": displacement_xy,
+                    }
+                )
+                dataset.attrs["mean_pressure"] = mean_pressure  # units of E*
+                # Rigid body displacement (offset) of this step, in units of
+                # `length_unit`; negative values indicate deeper penetration
+                dataset.attrs["mean_displacement"] = mean_displacement
+                dataset.attrs["total_contact_area"] = total_contact_area  # fractional
+                # Whether the optimizer converged in this step; netCDF has no
+                # boolean attributes, hence stored as 0/1
+                dataset.attrs["converged"] = int(bool(history[4][-1]))
+                # Maximum penetration of the solution, in units of `length_unit`
+                dataset.attrs["residual"] = opt.residual
+                # Solver iterations and wall time (in seconds) of this step, and
+                # the peak resident memory (in bytes) of the calculation so far;
+                # stored as float, since netCDF3 has no 64-bit integers
+                dataset.attrs["nb_iterations"] = int(opt.nit)
+                dataset.attrs["solve_time"] = opt.solve_time
+                dataset.attrs["peak_rss"] = float(peak_rss())
+                dataset.attrs["length_unit"] = topography.unit
+                # Physical sizes in units of `length_unit`
+                dataset.attrs["physical_sizes"] = topography.physical_sizes
+                if elastic_modulus is not None:
+                    # Physical value of the contact modulus E*; multiply
+                    # pressures (stored in units of E*) by this value to obtain
+                    # physical pressures
+                    dataset.attrs["elastic_modulus"] = elastic_modulus
+                    dataset.attrs["elastic_modulus_unit"] = elastic_modulus_unit
+                dataset.attrs["type"] = substrate_str
+                if hardness:
+                    dataset.attrs["hardness"] = (
+                        hardness  # TODO how to save hardness=None? Not possible in netCDF
+                    )
 
-            #
-            # Patch size distribution
-            #
-
-            patch_ids = assign_patch_numbers_area(
-                np.ascontiguousarray(contacting_points_xy.data), substrate_str == "periodic"
-            )[1]
-            cluster_areas = patch_areas(patch_ids) * substrate.area_per_pt
-            hist, edges = np.histogram(cluster_areas, density=True, bins=50)
-            data_dict.update(
-                {
-                    "clusterArea": (edges[1:-1] + edges[2:]) / 2,
-                    "clusterAreaProbabilityDensity": hist[1:],
-                    "clusterAreaLabel": "Cluster area A",
-                    "clusterAreaUnit": f"{topography.unit}²",
-                    "clusterAreaSIScaleFactor": fac * fac,
-                    "clusterAreaProbabilityDensityLabel": "Probability density P(A)",
-                    "clusterAreaProbabilityDensityUnit": f"{topography.unit}⁻²",
-                    "clusterAreaProbabilityDensitySIScaleFactor": 1 / (fac * fac),
+                storage_path = f"step-{i}"
+                data_paths.append(storage_path)
+                if per_step_netcdf:
+                    if out_of_core:
+                        # Memory-mapped fields are streamed through a local file
+                        with timer("save results"), tempfile.NamedTemporaryFile(
+                            prefix="analysis-"
+                        ) as tmpfile:
+                            save_netcdf(tmpfile.name, dataset, tiles, **netcdf_options)
+                            tmpfile.seek(0)
+                            folder.save_file(
+                                f"{storage_path}/nc/results.nc", "der", File(tmpfile)
+                            )
+                    else:
+                        with timer("save results"):
+                            folder.save_file(
+                                f"{storage_path}/nc/results.nc",
+                                "der",
+                                ContentFile(netcdf_bytes(dataset, **netcdf_options)),
+                            )
+                if consolidated_netcdf is not None:
+                    with timer("save results"):
+                        consolidated_netcdf.write_step(dataset, tiles=tiles)
+                if result_cache is not None and result_cache_index is None:
+                    with timer("result cache"):
+                        result_cache.save_step(
+                            i, dataset, tiles=tiles if out_of_core else None
+                        )
+
+                #
+                # Pressure and gap distribution
+                #
+
+                fac = get_unit_conversion_factor(topography.unit, "m")
+
+                with timer("distributions"):
+                    hist, edges = tiled_histogram(pressure_xy.data, tiles, fac=pressure_fac)
+                data_dict = {
+                    "pressure": (edges[1:-1] + edges[2:]) / 2,
+                    "pressureProbabilityDensity": hist[1:],
+                    "pressureLabel": "Pressure p",
+                    "pressureUnit": pressure_unit,
+                    "pressureProbabilityDensityLabel": "Probability density P(p)",
+                    "pressureProbabilityDensityUnit": f"{pressure_unit}⁻¹",
                 }
-            )
 
-            #
-            # Write to storage
-            #
-            folder.save_file(
-                f"{storage_path}/json/distributions.json",
-                "der",
-                ContentFile(
-                    json.dumps(data_dict, cls=ExtendedJSONEncoder).encode("utf-8")
-                ),
-            )
+                with timer("distributions"):
+                    hist, edges = tiled_histogram(gap_xy.data, tiles)
+                data_dict.update(
+                    {
+                        "gap": (edges[1:-1] + edges[2:]) / 2,
+                        "gapProbabilityDensity": hist[1:],
+                        "gapLabel": "Gap g",
+                        "gapUnit": topography.unit,
+                        "gapSIScaleFactor": fac,
+                        "gapProbabilityDensityLabel": "Probability density P(p)",
+                        "gapProbabilityDensityUnit": f"{topography.unit}⁻¹",
+                        "gapProbabilityDensitySIScaleFactor": 1 / fac,
+                    }
+                )
 
-            #
-            # Make Deep Zoom Images of pressure, contacting points, gap and displacement
-            #
+                #
+                # Patch size distribution
+                #
+
+                with timer("patch areas"):
+                    patches = patch_statistics(
+                        contacting_points_xy.data,
+                        substrate_str == "periodic",
+                        tiles=tiles,
+                        pressure=pressure_xy.data,
+                        grid_spacing=np.divide(
+                            topography.physical_sizes, topography.nb_grid_pts
+                        ),
+                    )
+                    hist, edges = np.histogram(patches["area"], density=True, bins=50)
+                data_dict.update(
+                    {
+                        "clusterArea": (edges[1:-1] + edges[2:]) / 2,
+                        "clusterAreaProbabilityDensity": hist[1:],
+                        "clusterAreaLabel": "Cluster area A",
+                        "clusterAreaUnit": f"{topography.unit}²",
+                        "clusterAreaSIScaleFactor": fac * fac,
+                        "clusterAreaProbabilityDensityLabel": "Probability density P(A)",
+                        "clusterAreaProbabilityDensityUnit": f"{topography.unit}⁻²",
+                        "clusterAreaProbabilityDensitySIScaleFactor": 1 / (fac * fac),
+                    }
+                )
 
-            render_deepzoom(
-                pressure_xy.data * pressure_fac,
-                folder,
-                storage_prefix=f"{storage_path}/dzi/pressure",
-                physical_sizes=topography.physical_sizes,
-                unit=topography.unit,
-                colorbar_title=f"Pressure ({pressure_unit})",
-            )
-            render_deepzoom(
-                contacting_points_xy.data.astype(int),
-                folder,
-                storage_prefix=f"{storage_path}/dzi/contacting-points",
-                physical_sizes=topography.physical_sizes,
-                unit=topography.unit,
-                cmap="magma",
-            )
+                #
+                # Write to storage
+                #
+                # Statistics of the individual contact patches
+                unit = topography.unit
+                patches_dataset = xr.Dataset(
+                    {
+                        "area": ("patch", patches["area"], dict(units=f"{unit}²")),
+                        "perimeter": ("patch", patches["perimeter"], dict(units=unit)),
+                        # Load, i.e. integral of the pressure over the patch
+                        "force": ("patch", patches["load"], dict(units=f"E*·{unit}²")),
+                        "centroid_x": (
+                            "patch", patches["centroid"][:, 0], dict(units=unit)
+                        ),
+                        "centroid_y": (
+                            "patch", patches["centroid"][:, 1], dict(units=unit)
+                        ),
+                    }
+                )
+                with timer("save results"):
+                    folder.save_file(
+                        f"{storage_path}/nc/patches.nc",
+                        "der",
+                        ContentFile(netcdf_bytes(patches_dataset)),
+                    )
+                    folder.save_file(
+                        f"{storage_path}/json/distributions.json",
+                        "der",
+                        ContentFile(
+                            json.dumps(data_dict, cls=ExtendedJSONEncoder).encode("utf-8")
+                        ),
+                    )
 
-            unit = suggest_length_unit_for_data("linear", gap_xy.data, topography.unit)
-            render_deepzoom(
-                gap_xy.data * get_unit_conversion_factor(topography.unit, unit),
-                folder,
-                storage_prefix=f"{storage_path}/dzi/gap",
-                physical_sizes=topography.to_unit(unit).physical_sizes,
-                unit=unit,
-                colorbar_title=f"Gap ({unit})",
-            )
+                #
+                # Make Deep Zoom Images of pressure, contacting points, gap and displacement
+                #
+
+                if not lazy_deepzoom:
+                    deepzoom_renderer.submit(
+                        render_step_deepzoom,
+                        storage_path,
+                        {
+                            "pressure": pressure_xy.data,
+                            "contacting-points": contacting_points_xy.data,
+                            "gap": gap_xy.data,
+                            "displacement": displacement_xy.data,
+                        },
+                        topography.physical_sizes,
+                        topography.unit,
+                        pressure_fac=pressure_fac,
+                        pressure_unit=pressure_unit,
+                    )
 
-            unit = suggest_length_unit_for_data(
-                "linear", displacement_xy.data, topography.unit
-            )
-            render_deepzoom(
-                displacement_xy.data
-                * get_unit_conversion_factor(topography.unit, unit),
-                folder,
-                storage_prefix=f"{storage_path}/dzi/displacement",
-                physical_sizes=topography.to_unit(unit).physical_sizes,
-                unit=unit,
-                colorbar_title=f"Displacement ({unit})",
-            )
+                if publish_partial_results:
+                    with timer("save results"):
+                        save_partial_result(folder, history, rms_height, nsteps)
+
+                if use_checkpoint:
+                    # Steps are complete once their images have been saved
+                    nb_completed = i + 1 if lazy_deepzoom else start + deepzoom_renderer.nb_saved
+                    if nb_completed > nb_checkpointed:
+                        with timer("checkpoint"):
+                            save_checkpoint(
+                                folder,
+                                calculation_key,
+                                nb_completed,
+                                history,
+                                nb_iterations=nb_iterations,
+                                multigrid_nb_iterations=multigrid_nb_iterations,
+                                residuals=residuals,
+                                relaxed_converged=relaxed_converged,
+                                refinement_nb_iterations=refinement_nb_iterations,
+                                refinement_contact_area_differences=(
+                                    refinement_contact_area_differences
+                                ),
+                                solve_times=solve_times,
+                                pentols=pentols,
+                                stalled=stalled,
+                                nb_solves=nb_solves,
+                                warm_started=warm_started,
+                                data_paths=data_paths,
+                            )
+                        nb_checkpointed = nb_completed
+
+            deepzoom_renderer.finish()
+            if step_fields is not None:
+                step_fields.close()
+
+            results_path = None
+            if consolidated_netcdf is not None:
+                results_path = "nc/results.nc"
+                with timer("save results"):
+                    consolidated_netcdf.save(folder, results_path)
+
+        if result_cache is not None and result_cache_index is None:
+            with timer("result cache"):
+                result_cache.save_index(
+                    dict(
+                        history=history,
+                        nb_iterations=nb_iterations,
+                        multigrid_nb_iterations=multigrid_nb_iterations,
+                        residuals=residuals,
+                        relaxed_converged=relaxed_converged,
+                        refinement_nb_iterations=refinement_nb_iterations,
+                        refinement_contact_area_differences=(
+                            refinement_contact_area_differences
+                        ),
+                        solve_times=solve_times,
+                        pentols=pentols,
+                        stalled=stalled,
+                        nb_solves=nb_solves,
+                        warm_started=warm_started,
+                    )
+                )
+                max_entries = getattr(
+                    settings, "CONTACT_MECHANICS_RESULT_CACHE_MAX_ENTRIES", 1000
+                )
+                if max_entries is not None:
+                    ResultCache.evict(max_entries)
 
-            progress_recorder.set_progress(i + 1, nsteps)
+        # The curves published while running are part of the result returned
+        # below, and the completed calculation need not be resumed
+        with timer("save results"):
+            remove_partial_result(folder)
+            remove_checkpoint(folder)
 
         mean_displacement, mean_gap, mean_pressure, total_contact_area, converged = (
             history
@@ -733,8 +2837,43 @@ class BoundaryElementMethod(WorkflowImplementation):
         mean_displacement = np.array(mean_displacement)
         mean_gap = np.array(mean_gap)
         converged = np.array(converged)
+        nb_iterations = np.array(nb_iterations)
+        residuals = np.array(residuals)
+        relaxed_converged = np.array(relaxed_converged, dtype=bool)
+        refinement_nb_iterations = np.array(refinement_nb_iterations, dtype=int)
+        refinement_contact_area_differences = np.array(
+            refinement_contact_area_differences
+        )
+        solve_times = np.array(solve_times)
+        pentols = np.array(pentols)
+        stalled = np.array(stalled, dtype=bool)
+        nb_solves = np.array(nb_solves, dtype=int)
+        # Iterations on the coarse levels (coarsest first) of each step;
+        # zero for steps that were warm started instead
+        nb_multigrid_levels = max(len(n) for n in multigrid_nb_iterations)
+        multigrid_nb_iterations = np.array(
+            [n + [0] * (nb_multigrid_levels - len(n)) for n in multigrid_nb_iterations],
+            dtype=int,
+        ).reshape(len(nb_iterations), nb_multigrid_levels)
+
+        # Estimate the number of iterations saved by warm starting a step from
+        # the iterations of the steps solved from scratch, interpolated at its
+        # contact area; negative if warm starting took more iterations
+        warm_started = np.array(warm_started, dtype=bool)
+        nb_iterations_saved = np.zeros(len(nb_iterations))
+        if np.any(warm_started) and not np.all(warm_started):
+            cold_order = np.argsort(total_contact_area[~warm_started])
+            nb_iterations_saved[warm_started] = (
+                np.interp(
+                    total_contact_area[warm_started],
+                    total_contact_area[~warm_started][cold_order],
+                    nb_iterations[~warm_started][cold_order],
+                )
+                - nb_iterations[warm_started]
+            )
 
         data_paths = np.array(data_paths, dtype='str')
+        fields_dtype = np.dtype(np.float32 if precision == "single" else np.float64)
         sort_order = np.argsort(mean_pressure)
 
         return dict(
@@ -762,7 +2901,95 @@ class BoundaryElementMethod(WorkflowImplementation):
             mean_displacements=mean_displacement[sort_order] / rms_height,
             mean_gaps=mean_gap[sort_order] / rms_height,
             converged=converged[sort_order],
+            # Number of solver iterations of each step (summed over the
+            # solves searching its contact area, see `nb_solves`)
+            nb_iterations=nb_iterations[sort_order],
+            multigrid_nb_iterations=multigrid_nb_iterations[sort_order],
+            # Floating point types the solver computed in, the fields of the
+            # steps were kept in and the fields were stored in, and whether
+            # the steps were solved to relaxed tolerances (and refined for at
+            # most `refinement_maxiter` iterations)
+            accuracy=dict(
+                solver_dtype="float64",
+                fields_dtype=str(fields_dtype),
+                stored_dtype=str(np.dtype(netcdf_options.get("dtype") or fields_dtype)),
+                relaxed_tolerances=relaxed_tolerances,
+                refinement_maxiter=refinement_maxiter if relaxed_tolerances else 0,
+            ),
+            # Maximum penetration of the solution of each step, in units of
+            # `unit`
+            residuals=residuals[sort_order],
+            # Whether each step converged at relaxed tolerances (False unless
+            # `accuracy['relaxed_tolerances']`); `converged` reports whether
+            # the refinement at the default tolerances converged, if any
+            relaxed_converged=relaxed_converged[sort_order],
+            # Iterations refining solutions at relaxed tolerances, and the
+            # change of the fractional contact area by the refinement
+            refinement_nb_iterations=refinement_nb_iterations[sort_order],
+            refinement_contact_area_differences=refinement_contact_area_differences[
+                sort_order
+            ],
+            # Wall time of the solver of each step, in seconds
+            solve_times=solve_times[sort_order],
+            # Penetration tolerance of each step, in units of `unit` (relaxed
+            # by relaxed and adaptive tolerances), and
+            # whether its solver stopped early because it stalled
+            pentols=pentols[sort_order],
+            stalled=stalled[sort_order],
+            # Number of solves of each step; steps at given target contact
+            # areas take several solves to find their rigid body displacement
+            nb_solves=nb_solves[sort_order],
+            warm_start=warm_start is not None,
+            # Whether the solver of each step was seeded with the solution
+            # of a previous step
+            warm_started=warm_started[sort_order],
+            # Estimated number of iterations saved by warm starting each step
+            # (zero for steps solved from scratch)
+            nb_iterations_saved=nb_iterations_saved[sort_order],
+            # Whether the steps were reused from an identical calculation
+            result_cache_hit=result_cache_index is not None,
+            # Half-spaces (of this calculation and its coarse grids) that were
+            # reused from or set up for the substrate cache of this process
+            substrate_cache=dict(
+                hits=substrate_cache.hits - substrate_cache_lookups[0],
+                misses=substrate_cache.misses - substrate_cache_lookups[1],
+            ),
+            # Deep zoom images are rendered once requested through the
+            # 'deepzoom' endpoint rather than stored with the analysis
+            lazy_deepzoom=lazy_deepzoom,
+            # Whether the fields of the steps were kept on local disk and
+            # post-processed tile by tile
+            out_of_core=out_of_core,
+            # Predicted peak memory (in bytes) per component and in total,
+            # and the memory budget of the worker it was checked against
+            memory_estimate=memory_estimate,
+            memory_budget=memory_budget,
+            # Peak resident memory (in bytes) of this process or of the
+            # largest worker process, whichever is higher
+            peak_rss=peak_rss(),
+            # Files and bytes saved to the analysis folder
+            nb_files_written=folder.nb_files_written,
+            nb_bytes_written=folder.nb_bytes_written,
+            # Number of storage calls, bytes and wall time (in seconds) spent
+            # in them, by file extension (e.g. '.nc', '.json')
+            storage_calls=folder.storage_calls,
+            # Size of the shared memory of steps solved in worker processes,
+            # and the bytes and fields pickled to pass tasks and their
+            # results between the processes (or None if the steps were
+            # solved in this process)
+            arena=None if arena is None else arena.statistics(),
+            # Total wall time (in seconds) and number of calls of each timed
+            # stage; nested stages are named 'parent/child'
+            timings={
+                name: dict(total=entry["total"], calls=entry["calls"])
+                for name, entry in timer.summary_dict().items()
+            },
             data_paths=data_paths[sort_order],
+            # Single netCDF file holding all steps (or None); entry `i` of
+            # `steps` is the index along its step dimension for the i-th
+            # (sorted) load
+            results_path=results_path,
+            steps=np.arange(len(data_paths))[sort_order],
             alerts=alerts,
         )
 